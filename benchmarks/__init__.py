@@ -0,0 +1 @@
+"""Benchmark suite for the Everything Search MCP server."""
@@ -0,0 +1,90 @@
+"""Synthetic path corpora and locate databases for benchmarks."""
+
+import os
+import random
+from typing import Iterator, List, Optional
+
+# Directory names weighted roughly like a developer workstation
+PROJECT_DIRS = ['src', 'lib', 'tests', 'docs', 'scripts', 'build', 'assets', 'config']
+VENDORED_DIRS = ['node_modules', '.git', '__pycache__', 'target', '.venv']
+TOP_LEVEL = ['home/user/projects', 'home/user/Documents', 'srv/data', 'var/log', 'usr/share/doc', 'opt']
+EXTENSIONS = ['py', 'js', 'ts', 'json', 'md', 'txt', 'log', 'c', 'h', 'rs', 'toml', 'yaml', 'pdf', 'png']
+WORDS = [
+    'server', 'client', 'config', 'index', 'utils', 'search', 'report', 'build', 'main', 'test',
+    'model', 'schema', 'handler', 'parser', 'cache', 'worker', 'query', 'result', 'export', 'data'
+]
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mcp-everything-search-bench')
+
+def _segment(rng: random.Random) -> str:
+    return f"{rng.choice(WORDS)}{rng.choice(['', '_', '-'])}{rng.choice(WORDS)}"
+
+def iter_paths(count: int, root: str = '/bench', seed: int = 0) -> Iterator[str]:
+    """Yield count unique absolute paths in depth-first (locate database) order.
+
+    The tree mixes project sources with vendored directories so that queries
+    like "server.py" have both relevant and noisy matches.
+    """
+    rng = random.Random(seed)
+    emitted = 0
+    project = 0
+    while emitted < count:
+        base = f"{root}/{TOP_LEVEL[project % len(TOP_LEVEL)]}/{_segment(rng)}{project}"
+        project += 1
+        yield base
+        emitted += 1
+        for subdir in PROJECT_DIRS + VENDORED_DIRS:
+            if emitted >= count:
+                return
+            vendored = subdir in VENDORED_DIRS
+            depth = rng.randint(2, 5) if vendored else rng.randint(0, 2)
+            directory = f"{base}/{subdir}"
+            for _ in range(depth):
+                directory = f"{directory}/{_segment(rng)}"
+            yield directory
+            emitted += 1
+            for index in range(rng.randint(5, 60 if vendored else 25)):
+                if emitted >= count:
+                    return
+                yield f"{directory}/{rng.choice(WORDS)}_{index}.{rng.choice(EXTENSIONS)}"
+                emitted += 1
+
+def generate_paths(count: int, root: str = '/bench', seed: int = 0) -> List[str]:
+    """Return a list of count synthetic paths."""
+    return list(iter_paths(count, root, seed))
+
+def write_locate_db(
+    count: int,
+    root: str = '/bench',
+    seed: int = 0,
+    cache_dir: str = DEFAULT_CACHE_DIR
+) -> str:
+    """Write (or reuse) a newline-separated path database for the fake locate."""
+    os.makedirs(cache_dir, exist_ok=True)
+    safe_root = root.strip('/').replace('/', '_') or 'root'
+    db_path = os.path.join(cache_dir, f"locate-{safe_root}-{count}-{seed}.db")
+    if not os.path.exists(db_path):
+        tmp_path = f"{db_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for path in iter_paths(count, root, seed):
+                f.write(path)
+                f.write('\n')
+        os.replace(tmp_path, db_path)
+    return db_path
+
+def materialize(paths: List[str], limit: Optional[int] = None) -> int:
+    """Create the first limit paths on disk so stat() calls hit real files.
+
+    Paths with an extension become small files, the rest directories.
+    Returns the number of entries created.
+    """
+    created = 0
+    for path in paths[:limit]:
+        if os.path.splitext(path)[1]:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'x' * (len(path) % 512))
+        else:
+            os.makedirs(path, exist_ok=True)
+        created += 1
+    return created
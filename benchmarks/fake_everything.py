@@ -0,0 +1,187 @@
+"""Fake Everything DLL exposing the same ctypes call surface as Everything64.dll.
+
+EverythingSDK configures argtypes and restype on each function exactly as it
+would for the real library. The fake validates every call against those
+argtypes with ctypes' own from_param conversion, so signature mistakes in the
+wrapper fail here the same way they would on Windows.
+"""
+
+import ctypes
+import fnmatch
+import ntpath
+import re
+from typing import Callable, List
+
+# One search term: optional negation, wfn: and path: modifiers, then a word or quoted text
+SEARCH_TERM = re.compile(r'(!)?((?:wfn:|path:)*)("[^"]*"|\S+)')
+
+# FILETIME for 2024-01-01T00:00:00Z
+BASE_FILETIME = 133485408000000000
+
+class _Function:
+    """Callable standing in for a ctypes foreign function."""
+
+    def __init__(self, impl: Callable):
+        self.impl = impl
+        self.argtypes = None
+        self.restype = ctypes.c_int
+
+    def __call__(self, *args):
+        if self.argtypes is not None:
+            if len(args) != len(self.argtypes):
+                raise TypeError(f"{self.impl.__name__} takes {len(self.argtypes)} arguments ({len(args)} given)")
+            for argtype, arg in zip(self.argtypes, args):
+                argtype.from_param(arg)
+        return self.impl(*args)
+
+class FakeEverythingDLL:
+    """In-memory Everything index answering queries over a list of Windows paths."""
+
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+        self._reset_state()
+        for name in dir(self):
+            if name.startswith('_Everything_'):
+                setattr(self, name[1:], _Function(getattr(self, name)))
+
+    def _reset_state(self):
+        self.search = ''
+        self.match_path = False
+        self.match_case = False
+        self.match_whole_word = False
+        self.regex = False
+        self.max = 0xFFFFFFFF
+        self.sort = 1
+        self.request_flags = 0
+        self.results: List[int] = []
+        self.last_error = 0
+        self.queries = 0
+
+    def _compile(self) -> Callable[[str], bool]:
+        """Compile the search into a predicate over full paths.
+
+        Understands space-separated terms, quoting, '!' negation, the
+        'path:' modifier, which matches a term against the full path, and the
+        'wfn:' modifier, which matches it against the whole name or path
+        rather than a part of it.
+        """
+        flags = 0 if self.match_case else re.IGNORECASE
+        if self.regex:
+            search = re.compile(self.search, flags).search
+            return lambda path: search(path if self.match_path else ntpath.basename(path)) is not None
+        terms = []
+        for negate, modifiers, term in SEARCH_TERM.findall(self.search):
+            term = term.strip('"')
+            if '*' in term or '?' in term:
+                test = re.compile(fnmatch.translate(term), flags).match
+            elif 'wfn:' in modifiers:
+                test = re.compile(re.escape(term), flags).fullmatch
+            elif self.match_whole_word:
+                test = re.compile(rf"\b{re.escape(term)}\b", flags).search
+            else:
+                test = re.compile(re.escape(term), flags).search
+            terms.append((bool(negate), 'path:' in modifiers or self.match_path, test))
+
+        def matcher(path: str) -> bool:
+            name = ntpath.basename(path)
+            return all(
+                (test(path if full_path else name) is None) == negate
+                for negate, full_path, test in terms
+            )
+        return matcher
+
+    def _Everything_SetSearchW(self, search):
+        self.search = search
+
+    def _Everything_SetMatchPath(self, value):
+        self.match_path = bool(value)
+
+    def _Everything_SetMatchCase(self, value):
+        self.match_case = bool(value)
+
+    def _Everything_SetMatchWholeWord(self, value):
+        self.match_whole_word = bool(value)
+
+    def _Everything_SetRegex(self, value):
+        self.regex = bool(value)
+
+    def _Everything_SetMax(self, value):
+        self.max = value
+
+    def _Everything_SetSort(self, value):
+        self.sort = value
+
+    def _Everything_SetRequestFlags(self, value):
+        self.request_flags = value
+
+    def _Everything_QueryW(self, wait):
+        self.queries += 1
+        matcher = self._compile()
+        results = []
+        for index, path in enumerate(self.paths):
+            if matcher(path):
+                results.append(index)
+                if len(results) >= self.max:
+                    break
+        self.results = results
+        return True
+
+    def _Everything_GetNumResults(self):
+        return len(self.results)
+
+    def _Everything_GetLastError(self):
+        return self.last_error
+
+    def _path(self, index):
+        return self.paths[self.results[index]]
+
+    def _Everything_GetResultFileNameW(self, index):
+        return ntpath.basename(self._path(index))
+
+    def _Everything_GetResultExtensionW(self, index):
+        return ntpath.splitext(self._path(index))[1][1:]
+
+    def _Everything_GetResultPathW(self, index):
+        return ntpath.dirname(self._path(index))
+
+    def _Everything_GetResultFullPathNameW(self, index, buffer, size):
+        path = self._path(index)[:size - 1]
+        buffer.value = path
+        return len(path)
+
+    def _Everything_GetResultDateCreated(self, index, filetime):
+        filetime.value = BASE_FILETIME + self.results[index] * 10_000_000
+        return True
+
+    def _Everything_GetResultDateModified(self, index, filetime):
+        filetime.value = BASE_FILETIME + self.results[index] * 20_000_000
+        return True
+
+    def _Everything_GetResultDateAccessed(self, index, filetime):
+        filetime.value = BASE_FILETIME + self.results[index] * 30_000_000
+        return True
+
+    def _Everything_GetResultSize(self, index, size):
+        size.value = len(self._path(index)) * 1024
+        return True
+
+    def _Everything_GetResultAttributes(self, index):
+        return 0x20
+
+    def _Everything_GetResultRunCount(self, index):
+        return 0
+
+    def _Everything_GetResultHighlightedFileNameW(self, index):
+        return self._Everything_GetResultFileNameW(index)
+
+    def _Everything_GetResultHighlightedPathW(self, index):
+        return self._Everything_GetResultPathW(index)
+
+    def _Everything_Reset(self):
+        queries = self.queries
+        self._reset_state()
+        self.queries = queries
+
+def to_windows_paths(paths: List[str], drive: str = 'C:') -> List[str]:
+    """Convert POSIX corpus paths to Windows paths on the given drive."""
+    return [drive + path.replace('/', '\\') for path in paths]
@@ -0,0 +1,101 @@
+"""Fake locate/plocate binary backed by a newline-separated path database.
+
+Supports the options the server passes to locate: -i, -r/--regex, -c, -e,
+-0, -l/--limit and -d/--database, which may be repeated or list several
+databases separated by ':'. The database defaults to $FAKE_LOCATE_DB.
+Like the real tools it treats patterns without glob characters as substrings
+and exits with status 1 when nothing matched. Installed as plocate it prints
+entries matching all patterns, as plocate does; otherwise it prints entries
+matching any pattern, as mlocate does.
+"""
+
+import argparse
+import fnmatch
+import os
+import re
+import sys
+
+GLOB_CHARS = set('*?[')
+
+def build_matcher(pattern: str, ignore_case: bool, regex: bool):
+    """Return a predicate over (path, lowercased path)."""
+    flags = re.IGNORECASE if ignore_case else 0
+    if regex:
+        search = re.compile(pattern, flags).search
+        return lambda path, lowered: search(path)
+    if GLOB_CHARS & set(pattern):
+        match = re.compile(fnmatch.translate(pattern), flags).match
+        return lambda path, lowered: match(path)
+    if ignore_case:
+        needle = pattern.lower()
+        return lambda path, lowered: needle in lowered
+    return lambda path, lowered: pattern in path
+
+def _entries(databases):
+    for database in databases:
+        with open(database, 'r', encoding='utf-8', errors='surrogateescape') as db:
+            yield from db
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='locate', add_help=False)
+    parser.add_argument('-i', '--ignore-case', action='store_true')
+    parser.add_argument('-r', '--regex', action='store_true')
+    parser.add_argument('-c', '--count', action='store_true')
+    parser.add_argument('-e', '--existing', action='store_true')
+    parser.add_argument('-0', '--null', action='store_true')
+    parser.add_argument('-l', '--limit', type=int)
+    parser.add_argument('-d', '--database', action='append')
+    parser.add_argument('patterns', nargs='+')
+    args = parser.parse_args(argv)
+
+    databases = [
+        database
+        for option in args.database or [os.getenv('FAKE_LOCATE_DB') or '']
+        for database in option.split(':')
+    ]
+    for database in databases:
+        if not database or not os.path.exists(database):
+            print(f"locate: can not stat () `{database}': No such file or directory", file=sys.stderr)
+            return 1
+
+    matchers = [build_matcher(p, args.ignore_case, args.regex) for p in args.patterns]
+    combine = all if os.getenv('FAKE_LOCATE_NAME') == 'plocate' else any
+    separator = b'\0' if args.null else b'\n'
+    out = sys.stdout.buffer
+    matched = 0
+    for line in _entries(databases):
+        path = line.rstrip('\n')
+        # Like locate, fold case once per entry rather than once per pattern
+        lowered = path.lower() if args.ignore_case else path
+        if not combine(match(path, lowered) for match in matchers):
+            continue
+        if args.existing and not os.path.lexists(path):
+            continue
+        matched += 1
+        if not args.count:
+            out.write(os.fsencode(path) + separator)
+        if args.limit is not None and matched >= args.limit:
+            break
+    if args.count:
+        out.write(f"{matched}\n".encode())
+    out.flush()
+    return 0 if matched else 1
+
+def install(bin_dir: str, name: str = 'plocate') -> str:
+    """Write an executable wrapper named name into bin_dir that runs this script as that tool."""
+    os.makedirs(bin_dir, exist_ok=True)
+    wrapper = os.path.join(bin_dir, name)
+    with open(wrapper, 'w', encoding='utf-8') as f:
+        f.write(
+            f'#!/bin/sh\nFAKE_LOCATE_NAME={name} exec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n'
+        )
+    os.chmod(wrapper, 0o755)
+    return wrapper
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        # The reader stopped early, as the server does once it has enough results
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(0)
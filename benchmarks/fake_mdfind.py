@@ -0,0 +1,144 @@
+"""Fake mdfind binary backed by a newline-separated path database.
+
+Supports the options the server passes to mdfind: -0, -onlyin, -name, -live,
+-literal and -interpret. Query expressions are understood as far as the
+server generates them: '&&'-joined kMDItemFSName, kMDItemFSSize and
+kMDItemFSContentChangeDate comparisons, with sizes and dates read from the
+filesystem. Any other query is matched as a case-insensitive substring of the
+file name. With -live, the results are surrounded by progress messages, as
+mdfind prints them. The database defaults to $FAKE_MDFIND_DB, and when
+$FAKE_MDFIND_ARGS_LOG is set each invocation's arguments are appended to it
+as a JSON line.
+"""
+
+import argparse
+import fnmatch
+import json
+import operator
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+COMPARISONS = {
+    '==': operator.eq, '!=': operator.ne,
+    '>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt,
+}
+CLAUSE = re.compile(r'^(\w+)\s*(==|!=|>=|<=|>|<)\s*(.+)$')
+STRING_VALUE = re.compile(r'^"((?:[^"\\]|\\.)*)"(\w*)$')
+TIME_VALUE = re.compile(r'^\$time\.iso\(([^)]+)\)$')
+
+def _stat(path: str):
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+def _clause_matcher(clause: str):
+    clause = clause.strip()
+    while clause.startswith('(') and clause.endswith(')'):
+        clause = clause[1:-1].strip()
+    parsed = CLAUSE.match(clause)
+    if parsed is None:
+        needle = clause.strip('"').lower()
+        return lambda path: needle in os.path.basename(path).lower()
+
+    attribute, op, value = parsed.groups()
+    compare = COMPARISONS[op]
+    if attribute == 'kMDItemFSName':
+        string = STRING_VALUE.match(value)
+        if string is None:
+            raise ValueError(f"bad string value: {value}")
+        pattern = re.sub(r'\\(.)', r'\1', string.group(1))
+        flags = re.IGNORECASE if 'c' in string.group(2) else 0
+        regex = re.compile(fnmatch.translate(pattern), flags)
+        matched = lambda path: regex.match(os.path.basename(path)) is not None
+        return matched if op == '==' else lambda path: not matched(path)
+    if attribute == 'kMDItemFSSize':
+        size = int(value)
+        return lambda path: (st := _stat(path)) is not None and compare(st.st_size, size)
+    if attribute == 'kMDItemFSContentChangeDate':
+        moment = TIME_VALUE.match(value)
+        if moment is None:
+            raise ValueError(f"bad time value: {value}")
+        timestamp = datetime.fromisoformat(moment.group(1).replace('Z', '+00:00')).timestamp()
+        return lambda path: (st := _stat(path)) is not None and compare(st.st_mtime, timestamp)
+    raise ValueError(f"unsupported attribute: {attribute}")
+
+def build_matcher(query: str):
+    matchers = [_clause_matcher(clause) for clause in query.split('&&')]
+    return lambda path: all(match(path) for match in matchers)
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    log = os.getenv('FAKE_MDFIND_ARGS_LOG')
+    if log:
+        with open(log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(['mdfind', *argv]) + '\n')
+
+    parser = argparse.ArgumentParser(prog='mdfind', add_help=False)
+    parser.add_argument('-0', dest='null', action='store_true')
+    parser.add_argument('-onlyin', action='append', default=[])
+    parser.add_argument('-name')
+    parser.add_argument('-live', action='store_true')
+    parser.add_argument('-literal', action='store_true')
+    parser.add_argument('-interpret', action='store_true')
+    parser.add_argument('query', nargs='?')
+    args = parser.parse_args(argv)
+
+    database = os.getenv('FAKE_MDFIND_DB')
+    if not database or not os.path.exists(database):
+        print(f"mdfind: no database at {database}", file=sys.stderr)
+        return 1
+    if args.name is not None:
+        needle = args.name.lower()
+        matcher = lambda path: needle in os.path.basename(path).lower()
+    elif args.query:
+        try:
+            matcher = build_matcher(args.query)
+        except ValueError as e:
+            print(f"Failed to create query for '{args.query}': {e}", file=sys.stderr)
+            return 1
+    else:
+        print("mdfind: no query specified", file=sys.stderr)
+        return 1
+    scopes = [os.path.join(os.path.abspath(scope), '') for scope in args.onlyin]
+
+    separator = b'\0' if args.null else b'\n'
+    out = sys.stdout.buffer
+    if args.live:
+        out.write(b'[Type ctrl-C to exit]' + separator)
+    matches = 0
+    with open(database, 'r', encoding='utf-8', errors='surrogateescape') as db:
+        for line in db:
+            path = line.rstrip('\n')
+            if scopes and not any(path.startswith(scope) for scope in scopes):
+                continue
+            if matcher(path):
+                out.write(os.fsencode(path) + separator)
+                matches += 1
+    if args.live:
+        out.write(f"Query update: {matches} matches".encode() + separator)
+    out.flush()
+    # Spotlight reports no matches with an empty result, not an error
+    while args.live:
+        time.sleep(3600)
+    return 0
+
+def install(bin_dir: str, name: str = 'mdfind') -> str:
+    """Write an executable wrapper named name into bin_dir that runs this script."""
+    os.makedirs(bin_dir, exist_ok=True)
+    wrapper = os.path.join(bin_dir, name)
+    with open(wrapper, 'w', encoding='utf-8') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+    os.chmod(wrapper, 0o755)
+    return wrapper
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except BrokenPipeError:
+        # The reader stopped early, as the server does once it has enough results
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(0)
@@ -0,0 +1,44 @@
+"""Fake updatedb binary writing the newline-separated databases read by fake_locate.
+
+Supports the options the server passes to updatedb: -U/--database-root,
+-o/--output and -l/--require-visibility (accepted and ignored). The tree under
+the root is walked without following symlinks, and the database is written to
+a temporary file and renamed over the output, as the real tool does.
+"""
+
+import argparse
+import os
+import sys
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='updatedb', add_help=False)
+    parser.add_argument('-U', '--database-root', default='/')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('-l', '--require-visibility')
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.database_root)
+    if not os.path.isdir(root):
+        print(f"updatedb: can not open `{root}': No such file or directory", file=sys.stderr)
+        return 1
+    temporary = f"{args.output}.{os.getpid()}.tmp"
+    with open(temporary, 'w', encoding='utf-8', errors='surrogateescape') as db:
+        db.write(root + '\n')
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(dirnames + filenames):
+                db.write(os.path.join(directory, name) + '\n')
+    os.replace(temporary, args.output)
+    return 0
+
+def install(bin_dir: str, name: str = 'updatedb') -> str:
+    """Write an executable wrapper named name into bin_dir that runs this script."""
+    os.makedirs(bin_dir, exist_ok=True)
+    wrapper = os.path.join(bin_dir, name)
+    with open(wrapper, 'w', encoding='utf-8') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+    os.chmod(wrapper, 0o755)
+    return wrapper
+
+if __name__ == '__main__':
+    sys.exit(main())
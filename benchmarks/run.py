@@ -0,0 +1,465 @@
+"""Run the benchmark suite and emit machine-readable results.
+
+Usage:
+    python -m benchmarks.run --sizes 10000,100000 --output bench.json
+    python -m benchmarks.run --sizes 5000000 --scenarios locate_provider
+    python -m benchmarks.run --compare baseline.json --output current.json
+
+Each result records the scenario, case, corpus size and timing statistics in
+seconds. With --compare, medians are compared against a previous run and the
+exit status is non-zero when any case regressed beyond --fail-ratio.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from . import corpus, fake_everything, fake_locate, fake_mdfind, fake_updatedb
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+DEFAULT_SIZES = [10_000, 100_000]
+DEFAULT_MATERIALIZE = 20_000
+
+LOCATE_CASES = [
+    ('substring', dict(query='server')),
+    ('glob', dict(query='*.py')),
+    ('regex', dict(query=r'server_[0-9]+\.py$', match_regex=True)),
+]
+
+class BenchContext:
+    """Corpus, locate database and fake binaries shared by all scenarios for one size."""
+
+    def __init__(self, size: int, cache_dir: str, materialize_limit: int):
+        self.size = size
+        self.root = os.path.join(cache_dir, 'tree')
+        self.paths = corpus.generate_paths(size, root=self.root)
+        self.db_path = corpus.write_locate_db(size, root=self.root, cache_dir=cache_dir)
+        self.bin_dir = os.path.join(cache_dir, 'bin')
+        fake_locate.install(self.bin_dir, 'plocate')
+        fake_mdfind.install(self.bin_dir, 'mdfind')
+        fake_updatedb.install(self.bin_dir, 'updatedb')
+        corpus.materialize(self.paths, materialize_limit)
+
+    def activate(self) -> None:
+        """Put the fake locate, mdfind and updatedb first on PATH and point them at this corpus."""
+        path = os.environ.get('PATH', '')
+        if not path.startswith(self.bin_dir + os.pathsep):
+            os.environ['PATH'] = self.bin_dir + os.pathsep + path
+        os.environ['FAKE_LOCATE_DB'] = self.db_path
+        os.environ['FAKE_MDFIND_DB'] = self.db_path
+
+def _summarize(case: str, samples: List[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        'case': case,
+        'repeat': len(samples),
+        'min_s': samples[0],
+        'median_s': statistics.median(samples),
+        'mean_s': statistics.fmean(samples),
+        'p95_s': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'max_s': samples[-1],
+    }
+
+def measure(case: str, fn: Callable[[], object], repeat: int, warmup: int = 1) -> dict:
+    """Time fn repeat times after warmup calls and summarize in seconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summarize(case, samples)
+
+def bench_locate_provider(ctx: BenchContext, repeat: int) -> List[dict]:
+    from mcp_server_everything_search.exclusions import build_filter
+    from mcp_server_everything_search.search_interface import LinuxSearchProvider
+
+    ctx.activate()
+    provider = LinuxSearchProvider()
+    results = []
+    for case, kwargs in LOCATE_CASES:
+        results.append(measure(case, lambda: provider.search_files(max_results=100, **kwargs), repeat))
+    # Default exclusions drop most vendored matches before they are stat'ed
+    exclusions = build_filter()
+    results.append(measure(
+        'substring_excluded',
+        lambda: provider.search_files('server', max_results=100, exclusions=exclusions),
+        repeat
+    ))
+    return results
+
+# Selective lookups, each matching fewer than max_results paths, so every one scans the whole database
+SELECTIVE_BATCH = [
+    'server_3.rs', 'client_12.py', 'parser_7.json', 'README', 'config_5.toml',
+    'handler_1.md', 'model_20.ts', 'query_4.yaml', 'worker_9.c', 'zzz_missing',
+]
+# Broad queries that fill max_results early and stop their own scans
+BROAD_BATCH = ['server', 'client', '*.toml', 'parser', 'config_', '*.rs', 'handler', 'model', 'query', 'worker']
+
+def bench_locate_batch(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Compare ten locate searches run one by one with the same ten merged into one pass."""
+    from mcp_server_everything_search.search_interface import LinuxSearchProvider
+    from mcp_server_everything_search.stat_cache import StatCache
+
+    ctx.activate()
+    provider = LinuxSearchProvider()
+    # Only mlocate prints entries matching any of its patterns, so merging runs on it
+    provider.locate_cmd = fake_locate.install(ctx.bin_dir, 'locate')
+    provider.locate_type = 'mlocate'
+    # Both variants stat their results, so the comparison is of the locate passes alone
+    uncached = StatCache(max_entries=0)
+    results = []
+    for name, queries in (('selective', SELECTIVE_BATCH), ('broad', BROAD_BATCH)):
+        searches = [dict(query=query, max_results=20) for query in queries]
+        results.append(measure(
+            f'{name}_sequential',
+            lambda: [provider.search_files(**search, stat_cache=uncached) for search in searches],
+            repeat
+        ))
+        results.append(measure(f'{name}_merged', lambda: provider.search_merged(searches, uncached), repeat))
+    return results
+
+def bench_stat_cache(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Look up 1000 materialized paths without a cache, in an empty cache, and in a warm one."""
+    from mcp_server_everything_search.stat_cache import StatCache
+
+    paths = ctx.paths[:1000]
+
+    def cold():
+        cache = StatCache()
+        cache.lookup(paths)
+        cache.close()
+
+    warm = StatCache()
+    warm.lookup(paths)
+    results = [
+        measure('uncached', lambda: StatCache(max_entries=0).lookup(paths), repeat),
+        measure('cold', cold, repeat),
+        measure('warm', lambda: warm.lookup(paths), repeat),
+    ]
+    warm.close()
+    return results
+
+def bench_parallel_match(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Match a regex over the whole corpus in this process and in a pool of one worker per CPU.
+
+    The '_first100' cases stop at 100 matches of a common pattern, which
+    measures early cancellation; 'provider' is a regex search through the
+    Linux provider with the corpus loaded from the locate database, matched in
+    the pool only when the corpus is at least EVERYTHING_SEARCH_MATCH_MIN_BYTES.
+    """
+    from mcp_server_everything_search.parallel_match import MatchSpec, ParallelMatcher, SharedCorpus
+    from mcp_server_everything_search.search_interface import LinuxSearchProvider
+
+    ctx.activate()
+    shared = SharedCorpus.from_paths(ctx.paths)
+    selective = MatchSpec(r'server_[0-9]+7\.py$', match_regex=True)
+    common = MatchSpec(r'\.py$', match_regex=True)
+    serial = ParallelMatcher(workers=1)
+    pool = ParallelMatcher(workers=max(2, os.cpu_count() or 1), min_parallel_bytes=0)
+    provider = LinuxSearchProvider(matcher=ParallelMatcher(workers=pool.workers))
+    search = dict(query=selective.query, match_regex=True, max_results=100, databases=[ctx.db_path])
+    try:
+        return [
+            measure('serial', lambda: serial.match(shared, selective, ctx.size), repeat),
+            measure('parallel', lambda: pool.match(shared, selective, ctx.size), repeat),
+            measure('serial_first100', lambda: serial.match(shared, common, 100), repeat),
+            measure('parallel_first100', lambda: pool.match(shared, common, 100), repeat),
+            measure('provider', lambda: provider.search_files(**search), repeat),
+        ]
+    finally:
+        pool.close()
+        provider.matcher.close()
+        shared.close()
+
+def bench_snapshots(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Measure change tracking over the corpus.
+
+    'walk' snapshots the materialized tree from disk. 'diff' merges two
+    in-memory snapshots of the whole corpus that differ in 0.1% of paths, the
+    work done after each rebuild; 'changes_since' answers from the resulting
+    journal, in time proportional to the number of changes.
+    """
+    from array import array
+    from mcp_server_everything_search.snapshots import ChangeTracker, Snapshot, diff
+
+    relative = sorted(os.fsencode(os.path.relpath(path, ctx.root)) for path in ctx.paths)
+    paths = b'\0'.join(relative)
+    mtimes = array('q', range(len(relative)))
+    changed = array('q', mtimes)
+    for index in range(0, len(changed), 1000):
+        changed[index] += 1
+    old = Snapshot(ctx.root, 1, 0.0, paths, mtimes)
+    new = Snapshot(ctx.root, 2, 1.0, paths, changed)
+
+    tracker = ChangeTracker()
+    tracker.record(ctx.root, paths, mtimes, 0.0)
+    tracker.record(ctx.root, paths, changed, 1.0)
+    return [
+        measure('walk', lambda: ChangeTracker().snapshot(ctx.root), repeat),
+        measure('diff', lambda: diff(old, new), repeat),
+        measure('changes_since', lambda: tracker.changes_since(snapshot_id=1), repeat),
+    ]
+
+def bench_owned_index(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Measure the server's own index over the materialized part of the corpus.
+
+    'fresh_check' is the cost max_staleness adds to a search when no root
+    has unindexed changes; 'rebuild' is a forced rebuild of a changed root.
+    """
+    import tempfile
+    from mcp_server_everything_search.index_refresh import OwnedIndex
+    from mcp_server_everything_search.search_interface import LinuxSearchProvider
+
+    ctx.activate()
+    provider = LinuxSearchProvider()
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as directory:
+        index = OwnedIndex([ctx.root], directory=directory)
+        loop.run_until_complete(index.ensure_fresh())
+
+        def rebuild():
+            # Stands in for the watcher reporting a change under the root
+            index._on_change(ctx.root, 'modified')
+            loop.run_until_complete(index.ensure_fresh(max_staleness=0))
+
+        results = [
+            measure('fresh_check', lambda: loop.run_until_complete(index.ensure_fresh(max_staleness=0)), repeat),
+            measure('rebuild', rebuild, repeat),
+            measure(
+                'search_owned',
+                lambda: provider.search_files('server', max_results=100, databases=index.databases()),
+                repeat
+            ),
+        ]
+    loop.close()
+    return results
+
+def bench_mdfind_provider(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Run the macOS provider against the fake mdfind.
+
+    'name' stops reading after max_results, while 'name_ranked' must read
+    every match, so the gap between them is the saving from early termination.
+    """
+    from mcp_server_everything_search.search_interface import MacSearchProvider
+
+    ctx.activate()
+    provider = MacSearchProvider()
+    scope = os.path.dirname(ctx.paths[0])
+    cases = [
+        ('name', dict(query='server')),
+        ('name_ranked', dict(query='server', rank=True)),
+        ('onlyin', dict(query='server', search_directory=scope)),
+        ('size_filter', dict(query='server', min_size=0)),
+    ]
+    results = []
+    for case, kwargs in cases:
+        results.append(measure(case, lambda: provider.search_files(max_results=100, **kwargs), repeat))
+    return results
+
+def bench_everything_sdk(ctx: BenchContext, repeat: int) -> List[dict]:
+    from mcp_server_everything_search.everything_sdk import EverythingSDK
+
+    dll = fake_everything.FakeEverythingDLL(fake_everything.to_windows_paths(ctx.paths))
+    sdk = EverythingSDK('Everything64.dll', dll=dll)
+    results = []
+    for max_results in (100, 1000):
+        results.append(measure(
+            f'max_results={max_results}', lambda: sdk.search_files('server', max_results=max_results), repeat
+        ))
+    return results
+
+def bench_format_results(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Render 100 and 1000 rows as a list, as a tree, and as a tree held to 8 KiB."""
+    from mcp_server_everything_search.rendering import format_results, render_tree
+    from mcp_server_everything_search.search_interface import ResultBatch
+
+    results = []
+    for rows in (100, 1000):
+        batch = ResultBatch()
+        for index, path in enumerate(ctx.paths[:rows]):
+            batch.append(path, index * 100, index * 10**9, index * 10**9, index * 10**9)
+        results.append(measure(f'rows={len(batch)}', lambda: format_results(batch), repeat))
+        results.append(measure(f'tree_rows={len(batch)}', lambda: render_tree(batch), repeat))
+        results.append(measure(f'tree_8k_rows={len(batch)}', lambda: render_tree(batch, 8192), repeat))
+    return results
+
+def bench_ranking(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Rank every corpus path in process, without the backend or stat."""
+    from mcp_server_everything_search.ranking import Ranker
+
+    results = []
+    for case, query in (('substring', 'server'), ('glob', '*.py')):
+        ranker = Ranker(query)
+        results.append(measure(case, lambda: ranker.top_k(ctx.paths, 100), repeat))
+    return results
+
+def bench_mcp_roundtrip(ctx: BenchContext, repeat: int) -> List[dict]:
+    from mcp.shared.memory import create_connected_server_and_client_session
+    from mcp_server_everything_search.search_interface import LinuxSearchProvider
+    from mcp_server_everything_search.server import create_server
+
+    ctx.activate()
+    server = create_server(LinuxSearchProvider())
+
+    async def run() -> List[dict]:
+        async with create_connected_server_and_client_session(server) as session:
+            results = []
+            timings = {
+                'list_tools': lambda: session.list_tools(),
+                'search': lambda: session.call_tool('search', {'base': {'query': 'server', 'max_results': 100}}),
+            }
+            for case, call in timings.items():
+                await call()
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    await call()
+                    samples.append(time.perf_counter() - start)
+                results.append(_summarize(case, samples))
+            return results
+
+    return asyncio.run(run())
+
+def bench_startup(ctx: BenchContext, repeat: int) -> List[dict]:
+    """Time a fresh server process from spawn to initialize, and to its first tool listing."""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    ctx.activate()
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=['-m', 'mcp_server_everything_search'],
+        env=dict(os.environ)
+    )
+
+    async def run():
+        initialize, list_tools = [], []
+        for _ in range(repeat + 1):
+            start = time.perf_counter()
+            async with stdio_client(params) as (read_stream, write_stream):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    initialized = time.perf_counter()
+                    await session.list_tools()
+                    listed = time.perf_counter()
+            initialize.append(initialized - start)
+            list_tools.append(listed - start)
+        # Drop the first run, which warms the OS page cache
+        return [_summarize('initialize', initialize[1:]), _summarize('first_list_tools', list_tools[1:])]
+
+    return asyncio.run(run())
+
+SCENARIOS: Dict[str, Callable[[BenchContext, int], List[dict]]] = {
+    'locate_provider': bench_locate_provider,
+    'locate_batch': bench_locate_batch,
+    'owned_index': bench_owned_index,
+    'stat_cache': bench_stat_cache,
+    'parallel_match': bench_parallel_match,
+    'snapshots': bench_snapshots,
+    'mdfind_provider': bench_mdfind_provider,
+    'everything_sdk': bench_everything_sdk,
+    'format_results': bench_format_results,
+    'ranking': bench_ranking,
+    'mcp_roundtrip': bench_mcp_roundtrip,
+    'startup': bench_startup,
+}
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: dict, baseline: dict, fail_ratio: float) -> bool:
+    """Print median ratios against baseline. Returns False if any case regressed."""
+    def key(result):
+        return (result['scenario'], result['case'], result['corpus_size'])
+
+    previous = {key(r): r for r in baseline['results']}
+    ok = True
+    print(f"{'scenario':<18} {'case':<20} {'size':>9} {'baseline':>10} {'current':>10} {'ratio':>7}", file=sys.stderr)
+    for result in current['results']:
+        before = previous.get(key(result))
+        if before is None:
+            continue
+        ratio = result['median_s'] / before['median_s'] if before['median_s'] else float('inf')
+        flag = ' !' if ratio > fail_ratio else ''
+        ok = ok and ratio <= fail_ratio
+        print(
+            f"{result['scenario']:<18} {result['case']:<20} {result['corpus_size']:>9} "
+            f"{before['median_s'] * 1000:>8.2f}ms {result['median_s'] * 1000:>8.2f}ms {ratio:>6.2f}x{flag}",
+            file=sys.stderr
+        )
+    return ok
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated corpus sizes (10000 to 5000000)')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"comma-separated scenarios from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--materialize', type=int, default=DEFAULT_MATERIALIZE,
+                        help='number of corpus paths to create on disk so stat() hits real files')
+    parser.add_argument('--cache-dir', default=corpus.DEFAULT_CACHE_DIR)
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='baseline JSON results to compare medians against')
+    parser.add_argument('--fail-ratio', type=float, default=1.25,
+                        help='median slowdown ratio treated as a regression with --compare')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    scenarios = args.scenarios.split(',')
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': [],
+    }
+    for size in sizes:
+        ctx = BenchContext(size, args.cache_dir, args.materialize)
+        for scenario in scenarios:
+            for result in SCENARIOS[scenario](ctx, args.repeat):
+                report['results'].append({'scenario': scenario, 'corpus_size': size, **result})
+                print(
+                    f"{scenario:<18} {result['case']:<20} {size:>9} median {result['median_s'] * 1000:8.2f}ms",
+                    file=sys.stderr
+                )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.fail_ratio):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,12 @@
 """Everything SDK wrapper class."""
 
 import ctypes
-import datetime
-import struct
 import sys
-from typing import Any, List
-from pydantic import BaseModel
+import time
+from typing import Any, Optional
+
+from .metrics import METRICS, current_trace
+from .search_interface import UNKNOWN, ResultBatch
 
 # Everything SDK constants
 EVERYTHING_OK = 0
@@ -63,26 +64,12 @@ EVERYTHING_SORT_DATE_ACCESSED_DESCENDING = 24
 EVERYTHING_SORT_DATE_RUN_ASCENDING = 25
 EVERYTHING_SORT_DATE_RUN_DESCENDING = 26
 
-# Windows time conversion constants
-WINDOWS_TICKS = int(1/10**-7)
-WINDOWS_EPOCH = datetime.datetime.strptime('1601-01-01 00:00:00', '%Y-%m-%d %H:%M:%S')
-POSIX_EPOCH = datetime.datetime.strptime('1970-01-01 00:00:00', '%Y-%m-%d %H:%M:%S')
-EPOCH_DIFF = (POSIX_EPOCH - WINDOWS_EPOCH).total_seconds()
-WINDOWS_TICKS_TO_POSIX_EPOCH = EPOCH_DIFF * WINDOWS_TICKS
+# Windows time conversion constants (FILETIME counts 100ns ticks since 1601-01-01)
+WINDOWS_TICK_NS = 100
+WINDOWS_TICKS_TO_POSIX_EPOCH = 116444736000000000
 
-class SearchResult(BaseModel):
-    """Model for search results."""
-    path: str
-    filename: str
-    extension: str | None = None
-    size: int
-    created: str | None = None
-    modified: str | None = None
-    accessed: str | None = None
-    attributes: int | None = None
-    run_count: int | None = None
-    highlighted_filename: str | None = None
-    highlighted_path: str | None = None
+# Everything reports unavailable sizes and dates as -1, read back as unsigned
+EVERYTHING_UNAVAILABLE = 0xFFFFFFFFFFFFFFFF
 
 class EverythingError(Exception):
     """Custom exception for Everything SDK errors."""
@@ -105,10 +92,10 @@ class EverythingError(Exception):
 class EverythingSDK:
     """Wrapper for Everything SDK functionality."""
     
-    def __init__(self, dll_path: str):
-        """Initialize Everything SDK with the specified DLL path."""
+    def __init__(self, dll_path: str, dll: Optional[Any] = None):
+        """Initialize Everything SDK with the specified DLL path, or an already loaded DLL."""
         try:
-            self.dll = ctypes.WinDLL(dll_path)
+            self.dll = dll if dll is not None else ctypes.WinDLL(dll_path)
             self._configure_dll()
         except Exception as e:
             print(f"Failed to load Everything SDK DLL: {e}", file=sys.stderr)
@@ -177,10 +164,11 @@ class EverythingSDK:
         if error_code != EVERYTHING_OK:
             raise EverythingError(error_code)
 
-    def _get_time(self, filetime: int) -> datetime.datetime:
-        """Convert Windows filetime to Python datetime."""
-        microsecs = (filetime - WINDOWS_TICKS_TO_POSIX_EPOCH) / WINDOWS_TICKS
-        return datetime.datetime.fromtimestamp(microsecs)
+    def _filetime_to_ns(self, filetime: int) -> int:
+        """Convert Windows filetime to POSIX nanoseconds, or UNKNOWN when unset."""
+        if not filetime or filetime == EVERYTHING_UNAVAILABLE:
+            return UNKNOWN
+        return (filetime - WINDOWS_TICKS_TO_POSIX_EPOCH) * WINDOWS_TICK_NS
 
     def search_files(
         self, 
@@ -192,7 +180,7 @@ class EverythingSDK:
         match_regex: bool = False,
         sort_by: int = EVERYTHING_SORT_NAME_ASCENDING,
         request_flags: int | None = None
-    ) -> List[SearchResult]:
+    ) -> ResultBatch:
         """Perform file search using Everything SDK."""
         print(f"Debug: Setting up search with query: {query}", file=sys.stderr)
         
@@ -215,23 +203,34 @@ class EverythingSDK:
                 EVERYTHING_REQUEST_DATE_CREATED |
                 EVERYTHING_REQUEST_DATE_MODIFIED |
                 EVERYTHING_REQUEST_DATE_ACCESSED |
-                EVERYTHING_REQUEST_ATTRIBUTES |
-                EVERYTHING_REQUEST_RUN_COUNT |
-                EVERYTHING_REQUEST_HIGHLIGHTED_FILE_NAME |
-                EVERYTHING_REQUEST_HIGHLIGHTED_PATH
+                EVERYTHING_REQUEST_ATTRIBUTES
             )
         self.dll.Everything_SetRequestFlags(request_flags)
 
         # Execute search
         print("Debug: Executing search query", file=sys.stderr)
-        if not self.dll.Everything_QueryW(True):
+        with METRICS.stage('backend_query'):
+            succeeded = self.dll.Everything_QueryW(True)
+        if not succeeded:
             self._check_error()
             raise RuntimeError("Search query failed")
         
         # Get results
         print("Debug: Getting search results", file=sys.stderr)
-        num_results = min(self.dll.Everything_GetNumResults(), max_results)
-        results = []
+        total_results = self.dll.Everything_GetNumResults()
+        num_results = min(total_results, max_results)
+        trace = current_trace()
+        if trace is not None:
+            trace.backend = 'everything'
+            trace.command = [
+                'Everything_QueryW', query,
+                f'match_path={match_path}', f'match_case={match_case}',
+                f'match_whole_word={match_whole_word}', f'match_regex={match_regex}',
+                f'sort={sort_by}', f'max={max_results}'
+            ]
+            trace.candidates = total_results
+            trace.truncated = total_results > max_results
+        results = ResultBatch()
 
         filename_buffer = ctypes.create_unicode_buffer(260)
         date_created = ctypes.c_ulonglong()
@@ -239,6 +238,7 @@ class EverythingSDK:
         date_accessed = ctypes.c_ulonglong()
         file_size = ctypes.c_ulonglong()
 
+        fetch_start = time.perf_counter()
         for i in range(num_results):
             try:
                 self.dll.Everything_GetResultFullPathNameW(i, filename_buffer, 260)
@@ -249,30 +249,18 @@ class EverythingSDK:
                 self.dll.Everything_GetResultDateAccessed(i, date_accessed)
                 self.dll.Everything_GetResultSize(i, file_size)
 
-                # Get other attributes
-                filename = self.dll.Everything_GetResultFileNameW(i)
-                extension = self.dll.Everything_GetResultExtensionW(i)
-                attributes = self.dll.Everything_GetResultAttributes(i)
-                run_count = self.dll.Everything_GetResultRunCount(i)
-                highlighted_filename = self.dll.Everything_GetResultHighlightedFileNameW(i)
-                highlighted_path = self.dll.Everything_GetResultHighlightedPathW(i)
-
-                results.append(SearchResult(
-                    path=filename_buffer.value,
-                    filename=filename,
-                    extension=extension,
-                    size=file_size.value,
-                    created=self._get_time(date_created.value).isoformat() if date_created.value else None,
-                    modified=self._get_time(date_modified.value).isoformat() if date_modified.value else None,
-                    accessed=self._get_time(date_accessed.value).isoformat() if date_accessed.value else None,
-                    attributes=attributes,
-                    run_count=run_count,
-                    highlighted_filename=highlighted_filename,
-                    highlighted_path=highlighted_path
-                ))
+                results.append(
+                    filename_buffer.value,
+                    size=file_size.value if file_size.value != EVERYTHING_UNAVAILABLE else UNKNOWN,
+                    created=self._filetime_to_ns(date_created.value),
+                    modified=self._filetime_to_ns(date_modified.value),
+                    accessed=self._filetime_to_ns(date_accessed.value),
+                    attributes=self.dll.Everything_GetResultAttributes(i)
+                )
             except Exception as e:
                 print(f"Debug: Error processing result {i}: {e}", file=sys.stderr)
                 continue
+        METRICS.observe('fetch', time.perf_counter() - fetch_start)
 
         print("Debug: Resetting Everything SDK", file=sys.stderr)
         self.dll.Everything_Reset()
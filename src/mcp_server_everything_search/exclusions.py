@@ -0,0 +1,189 @@
+"""Path exclusions applied before results are stat'ed or counted.
+
+An exclusion is one of:
+
+- a path prefix (absolute, or starting with ~), excluding that directory and
+  everything under it;
+- a name or glob without separators, such as 'node_modules' or '*.pyc',
+  excluding any path with a matching component;
+- a glob containing a separator, such as '*/build/*.o', matched against the
+  whole path.
+
+Exclusions compile to one regular expression, so filtering a streamed backend
+output costs a single search() per path.
+"""
+
+import fnmatch
+import functools
+import os
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from .platform_search import CURRENT_PLATFORM
+
+DEFAULT_EXCLUDES = (
+    'node_modules',
+    '.git',
+    '__pycache__',
+    'target',
+    '.venv',
+    'venv',
+    '.tox',
+    '.mypy_cache',
+    '.pytest_cache',
+)
+
+def _default_excludes() -> Tuple[str, ...]:
+    spec = os.getenv('EVERYTHING_SEARCH_EXCLUDE')
+    if spec is None:
+        return DEFAULT_EXCLUDES
+    # An empty value turns default exclusions off
+    return tuple(item.strip() for item in spec.split(',') if item.strip())
+
+DEFAULTS = _default_excludes()
+
+# Windows and macOS file systems are case-insensitive by default
+IGNORE_CASE = CURRENT_PLATFORM in ('windows', 'darwin')
+
+WINDOWS_DRIVE = re.compile(r'^[A-Za-z]:[\\/]')
+
+# Splits query text and roots into the components that can name a default exclusion;
+# ':' separates an Everything function from its value, as in 'path:node_modules'
+CONTEXT_SEPARATORS = re.compile(r'[\s/\\:]+')
+
+def _is_prefix(pattern: str) -> bool:
+    return pattern.startswith(('/', '\\', '~')) or WINDOWS_DRIVE.match(pattern) is not None
+
+def _glob_to_regex(pattern: str, sep: str, whole_path: bool = False) -> str:
+    """Translate a glob to a regex body, normalizing separators to sep.
+
+    In a component glob wildcards stop at separators; in a whole-path glob
+    '*' spans directories, as it does for fnmatch.
+    """
+    not_sep = f"[^{re.escape(sep)}]"
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '*':
+            parts.append('.*' if whole_path else f"{not_sep}*")
+        elif char == '?':
+            parts.append(not_sep)
+        elif char == '[':
+            end = pattern.find(']', i + 2)
+            if end < 0:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        else:
+            parts.append(re.escape(sep if char in '/\\' else char))
+        i += 1
+    return ''.join(parts)
+
+class ExclusionFilter:
+    """Compiled exclusions for paths using one separator style."""
+
+    def __init__(self, patterns: Sequence[str], sep: str = os.sep, ignore_case: bool = IGNORE_CASE):
+        self.patterns = tuple(dict.fromkeys(pattern for pattern in patterns if pattern))
+        self.sep = sep
+        escaped_sep = re.escape(sep)
+        prefixes: List[str] = []
+        components: List[str] = []
+        globs: List[str] = []
+        for pattern in self.patterns:
+            if _is_prefix(pattern):
+                prefix = os.path.expanduser(pattern) if pattern.startswith('~') else pattern
+                prefix = prefix.replace('/', sep).replace('\\', sep).rstrip(sep)
+                prefixes.append(prefix)
+            elif '/' in pattern or '\\' in pattern:
+                globs.append(_glob_to_regex(pattern, sep, whole_path=True))
+            else:
+                components.append(_glob_to_regex(pattern, sep))
+        self.prefixes = prefixes
+
+        alternatives = []
+        if prefixes:
+            alternatives.append(
+                rf"\A(?:{'|'.join(re.escape(prefix) for prefix in prefixes)})(?:{escaped_sep}|\Z)"
+            )
+        if components:
+            alternatives.append(rf"(?:\A|{escaped_sep})(?:{'|'.join(components)})(?:{escaped_sep}|\Z)")
+        if globs:
+            alternatives.append(rf"\A(?:{'|'.join(globs)})\Z")
+        flags = re.IGNORECASE if ignore_case else 0
+        self._search = re.compile('|'.join(alternatives), flags).search if alternatives else None
+
+    def __bool__(self) -> bool:
+        return self._search is not None
+
+    def excluded(self, path: str) -> bool:
+        """Whether path, or a directory above it, is excluded."""
+        return self._search is not None and self._search(path) is not None
+
+    def keep(self, paths: Iterable[str]) -> List[str]:
+        """Return the paths that are not excluded, in order."""
+        if self._search is None:
+            return list(paths)
+        search = self._search
+        return [path for path in paths if search(path) is None]
+
+    def everything_terms(self) -> str:
+        """Render the exclusions as Everything search terms.
+
+        Everything wildcards match the whole path, so each component exclusion
+        becomes one term for the entry itself and one for everything below it.
+        Text without wildcards matches anywhere in the path, so terms that must
+        match the whole path use wfn:.
+        """
+        terms = []
+        for pattern in self.patterns:
+            if _is_prefix(pattern):
+                prefix = os.path.expanduser(pattern) if pattern.startswith('~') else pattern
+                prefix = prefix.replace('/', '\\').rstrip('\\')
+                terms.extend([f'!wfn:path:"{prefix}"', f'!path:"{prefix}\\*"'])
+            elif '/' in pattern or '\\' in pattern:
+                terms.append('!wfn:path:"' + pattern.replace('/', '\\') + '"')
+            else:
+                terms.extend([f'!path:"*\\{pattern}"', f'!path:"*\\{pattern}\\*"'])
+        return ' '.join(terms)
+
+@functools.lru_cache(maxsize=64)
+def _cached_filter(patterns: Tuple[str, ...], sep: str) -> ExclusionFilter:
+    return ExclusionFilter(patterns, sep)
+
+def build_filter(
+    exclude: Optional[Sequence[str]] = None,
+    use_defaults: bool = True,
+    sep: str = os.sep,
+    context: Iterable[str] = ()
+) -> ExclusionFilter:
+    """Combine the default and per-query exclusions into a compiled filter.
+
+    Default exclusions named as a whole path component in context, such as
+    the query text or the roots of a subscription, are left out, so that a
+    search for 'node_modules/react' still finds it while one for '.gitignore'
+    keeps .git excluded.
+    """
+    defaults: Tuple[str, ...] = ()
+    if use_defaults:
+        mentioned = _components(context)
+        defaults = tuple(pattern for pattern in DEFAULTS if not _mentioned(pattern.lower(), mentioned))
+    return _cached_filter(defaults + tuple(exclude or ()), sep)
+
+def _components(context: Iterable[str]) -> List[str]:
+    """Split query text and paths into lowercased path components, which may be globs."""
+    components = []
+    for text in context:
+        for component in CONTEXT_SEPARATORS.split(text.lower()):
+            component = component.strip('"\'')
+            if component:
+                components.append(component)
+    return components
+
+def _mentioned(pattern: str, components: Sequence[str]) -> bool:
+    """Whether a component names pattern itself, or is a glob matching it."""
+    return any(component == pattern or fnmatch.fnmatchcase(pattern, component) for component in components)
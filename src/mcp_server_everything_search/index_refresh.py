@@ -0,0 +1,309 @@
+"""Locate databases owned by the server, refreshed in the background.
+
+The system locate database is rebuilt as root by a cron job, so the server
+can neither refresh it nor say how much it is missing. When
+EVERYTHING_SEARCH_INDEX_ROOTS lists directories, the server instead keeps one
+database per root in its own index directory, searches those, and rebuilds
+them itself:
+
+- each root is watched, and only roots with changes since their last build
+  are rebuilt; a root in which the watcher misses changes, through an inotify
+  queue overflow or the watch limit, is rebuilt at every refresh interval;
+- updatedb runs at idle CPU and I/O priority, one root at a time, at most
+  once per root per refresh interval, and is put off while searches are
+  running or queued;
+- a search with max_staleness first rebuilds the roots whose unindexed
+  changes are older than that.
+
+With a ChangeTracker, each rebuild is followed by a snapshot of the root, from
+which the changes_since tool answers.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .metrics import METRICS
+from .snapshots import TRACK_CHANGES, ChangeTracker
+from .watchers import OVERFLOW, PollingWatcher, create_watcher
+
+logger = logging.getLogger(__name__)
+
+INDEX_ROOTS = [root for root in os.getenv('EVERYTHING_SEARCH_INDEX_ROOTS', '').split(os.pathsep) if root]
+INDEX_DIR = os.getenv(
+    'EVERYTHING_SEARCH_INDEX_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'mcp-everything-search', 'index')
+)
+UPDATEDB = os.getenv('EVERYTHING_SEARCH_UPDATEDB', 'updatedb')
+
+# Minimum seconds between background rebuilds of one root
+REFRESH_INTERVAL = float(os.getenv('EVERYTHING_SEARCH_REFRESH_INTERVAL', '60'))
+
+# Roots are rebuilt after this many seconds even without observed changes,
+# covering changes the watcher missed without reporting it
+MAX_INDEX_AGE = float(os.getenv('EVERYTHING_SEARCH_MAX_INDEX_AGE', '86400'))
+
+# Seconds between checks for roots due a background rebuild
+CHECK_INTERVAL = 5.0
+
+SYSTEM_DATABASES = {
+    'plocate': '/var/lib/plocate/plocate.db',
+    'mlocate': '/var/lib/mlocate/mlocate.db',
+}
+
+def format_age(seconds: float) -> str:
+    """Render a duration as a short age such as '42s', '3m 12s' or '5h 20m'."""
+    seconds = int(max(0.0, seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds}s"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours}h {minutes}m"
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h"
+
+def system_index_status(locate_type: Optional[str]) -> str:
+    """Describe the age of the system locate database, which the server does not refresh."""
+    database = SYSTEM_DATABASES.get(locate_type or '')
+    try:
+        age = time.time() - os.path.getmtime(database)
+    except (OSError, TypeError):
+        return "unknown (system locate database)"
+    return f"{format_age(age)} (system locate database, refreshed outside the server)"
+
+def low_priority(cmd: List[str]) -> List[str]:
+    """Prefix cmd to run at idle I/O and lowest CPU priority, where the tools exist."""
+    prefix = []
+    if shutil.which('ionice'):
+        prefix += ['ionice', '-c', '3']
+    if shutil.which('nice'):
+        prefix += ['nice', '-n', '19']
+    return prefix + cmd
+
+@dataclass
+class RootIndex:
+    """An owned root and the state of its database."""
+    root: str
+    database: str
+    # Wall-clock time the last successful build started, or 0 if never built
+    built: float = 0.0
+    # Time of the first change not yet in the database, or None if it is current
+    stale_since: Optional[float] = None
+    # Time the last build, successful or not, started
+    attempted: float = 0.0
+    # Whether the watcher has missed changes here, so the database can never be taken as current
+    unwatched: bool = False
+
+    def staleness(self, now: float) -> float:
+        """Seconds the oldest unindexed change has been missing from the database."""
+        if not self.built:
+            return float('inf')
+        return 0.0 if self.stale_since is None else max(0.0, now - self.stale_since)
+
+class OwnedIndex:
+    """Per-root locate databases kept current by the server."""
+
+    def __init__(
+        self,
+        roots: Sequence[str],
+        directory: str = INDEX_DIR,
+        updatedb: str = UPDATEDB,
+        refresh_interval: float = REFRESH_INTERVAL,
+        max_age: float = MAX_INDEX_AGE,
+        tracker: Optional[ChangeTracker] = None
+    ):
+        resolved = []
+        for root in roots:
+            root = os.path.abspath(os.path.expanduser(root))
+            if not os.path.isdir(root):
+                raise ValueError(f"Index root is not a directory: {root}")
+            resolved.append(root)
+        if not resolved:
+            raise ValueError("At least one index root is required")
+        if shutil.which(updatedb) is None:
+            raise RuntimeError(f"'{updatedb}' is not installed; it is needed to build the indexes of {', '.join(resolved)}")
+
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        os.makedirs(self.directory, exist_ok=True)
+        self.updatedb = updatedb
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.tracker = tracker
+        self.indexes: List[RootIndex] = []
+        for root in dict.fromkeys(resolved):
+            name = hashlib.sha1(os.fsencode(root)).hexdigest()[:16]
+            index = RootIndex(root, os.path.join(self.directory, f"{name}.db"))
+            try:
+                # Changes made while the server was not watching are unknown
+                index.built = index.stale_since = os.path.getmtime(index.database)
+            except OSError:
+                pass
+            self.indexes.append(index)
+
+        self.is_busy: Callable[[], bool] = lambda: False
+        self._building: Dict[str, asyncio.Future] = {}
+        self._lock = asyncio.Lock()
+        self._watcher = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> Optional['OwnedIndex']:
+        """Create the owned index configured by EVERYTHING_SEARCH_INDEX_ROOTS, if any."""
+        if not INDEX_ROOTS:
+            return None
+        return cls(INDEX_ROOTS, tracker=ChangeTracker() if TRACK_CHANGES else None)
+
+    def databases(self) -> List[str]:
+        """Databases to search, one per root that has been built."""
+        return [index.database for index in self.indexes if index.built]
+
+    def start(self, is_busy: Optional[Callable[[], bool]] = None) -> None:
+        """Start watching the roots and refreshing in the background. Must run inside the event loop.
+
+        is_busy reports whether searches are running or queued; background
+        rebuilds wait until it returns false.
+        """
+        if is_busy is not None:
+            self.is_busy = is_busy
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    async def ensure_fresh(self, max_staleness: Optional[float] = None) -> List[str]:
+        """Rebuild roots never built, or with changes unindexed for longer than max_staleness.
+
+        Returns the roots rebuilt. Rebuilds already in progress are joined
+        rather than repeated.
+        """
+        now = time.time()
+        targets = [
+            index for index in self.indexes
+            if not index.built or (max_staleness is not None and index.staleness(now) > max_staleness)
+        ]
+        if targets:
+            METRICS.increment('index_refreshes_forced', len(targets))
+            await asyncio.gather(*(self._build(index) for index in targets))
+        return [index.root for index in targets]
+
+    def describe(self, refreshed: Sequence[str] = ()) -> str:
+        """Describe the age of the owned databases for a search response."""
+        now = time.time()
+        built = [index for index in self.indexes if index.built]
+        if not built:
+            return "never built (owned index)"
+        oldest = min(index.built for index in built)
+        count = len(self.indexes)
+        text = f"{format_age(now - oldest)} ({count} owned root{'s' if count != 1 else ''}"
+        stale = [index for index in built if index.stale_since is not None]
+        if stale:
+            text += (
+                f"; unindexed changes under {', '.join(index.root for index in stale)} "
+                f"for up to {format_age(max(index.staleness(now) for index in stale))}"
+            )
+        if refreshed:
+            text += f"; rebuilt for this search: {', '.join(refreshed)}"
+        return text + ")"
+
+    def _prune(self, path: str) -> bool:
+        return path == self.directory or path.startswith(self.directory + os.sep)
+
+    def _on_change(self, path: str, kind: str) -> None:
+        for index in self.indexes:
+            if path == index.root or path.startswith(index.root + os.sep):
+                if kind == OVERFLOW and not index.unwatched:
+                    logger.warning("Changes under %s may be missed; it will be rebuilt at every refresh", index.root)
+                    index.unwatched = True
+                if index.stale_since is None:
+                    index.stale_since = time.time()
+
+    def _due(self, index: RootIndex, now: float) -> bool:
+        if index.root in self._building or now - index.attempted < self.refresh_interval:
+            return False
+        if self.tracker is not None and not self.tracker.has_snapshot(index.root):
+            # The first snapshot is the baseline that later changes are measured against
+            return True
+        return not index.built or index.stale_since is not None or now - index.built >= self.max_age
+
+    async def _watch(self) -> None:
+        roots = [index.root for index in self.indexes]
+        self._watcher = create_watcher(roots, self._on_change, prune=self._prune)
+        try:
+            await self._watcher.start()
+        except OSError as e:
+            logger.warning("inotify unavailable (%s); falling back to polling", e)
+            self._watcher = PollingWatcher(roots, self._on_change, prune=self._prune)
+            await self._watcher.start()
+
+    async def _run(self) -> None:
+        # Watching starts here so that walking large roots does not delay the server
+        await self._watch()
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            for index in self.indexes:
+                if not self._due(index, time.time()):
+                    continue
+                if self.is_busy():
+                    METRICS.increment('index_refreshes_deferred')
+                    break
+                try:
+                    await self._build(index)
+                except Exception as e:
+                    logger.warning("Background refresh of %s failed: %s", index.root, e)
+
+    async def _build(self, index: RootIndex) -> None:
+        building = self._building.get(index.root)
+        if building is None:
+            building = asyncio.ensure_future(self._locked_build(index))
+            self._building[index.root] = building
+            building.add_done_callback(lambda _: self._building.pop(index.root, None))
+        # A caller giving up must not cancel a build others are waiting on
+        await asyncio.shield(building)
+
+    async def _locked_build(self, index: RootIndex) -> None:
+        # One updatedb at a time keeps the refresh load to a single idle-priority process
+        async with self._lock:
+            started = time.time()
+            index.attempted = started
+            # Changes from here on may be missed by this build, so they mark the root stale again,
+            # as does any change at all in a root the watcher cannot follow
+            stale_since, index.stale_since = index.stale_since, started if index.unwatched else None
+            try:
+                await asyncio.to_thread(self._updatedb, index)
+            except BaseException:
+                if index.stale_since is None or (stale_since is not None and stale_since < index.stale_since):
+                    index.stale_since = stale_since
+                raise
+            index.built = started
+            if self.tracker is not None:
+                try:
+                    await asyncio.to_thread(self.tracker.snapshot, index.root, self._prune)
+                except Exception as e:
+                    logger.warning("Snapshot of %s failed: %s", index.root, e)
+
+    def _updatedb(self, index: RootIndex) -> None:
+        cmd = low_priority([self.updatedb, '-l', '0', '-U', index.root, '-o', index.database])
+        with METRICS.stage('index_refresh'):
+            try:
+                completed = subprocess.run(cmd, capture_output=True, text=True, errors='replace')
+            except OSError as e:
+                METRICS.increment('index_refresh_errors')
+                raise RuntimeError(f"Could not run {self.updatedb} for {index.root}: {e}")
+        if completed.returncode != 0:
+            METRICS.increment('index_refresh_errors')
+            raise RuntimeError(f"{self.updatedb} failed for {index.root}: {completed.stderr.strip()}")
+        METRICS.increment('index_refreshes')
@@ -0,0 +1,134 @@
+"""In-process path matching with locate semantics."""
+
+import fnmatch
+import re
+import string
+from typing import Callable, List, Tuple
+
+GLOB_CHARS = frozenset('*?[')
+
+# POSIX character classes as the contents of a Python character set
+POSIX_CLASSES = {
+    'alpha': 'a-zA-Z',
+    'digit': '0-9',
+    'alnum': 'a-zA-Z0-9',
+    'upper': 'A-Z',
+    'lower': 'a-z',
+    'xdigit': '0-9A-Fa-f',
+    'space': r' \t\n\r\f\v',
+    'blank': r' \t',
+    'punct': ''.join(re.escape(char) for char in string.punctuation),
+    'cntrl': r'\x00-\x1f\x7f',
+    'print': r'\x20-\x7e',
+    'graph': r'\x21-\x7e',
+}
+
+# Characters that are operators in an extended expression, and when escaped in a basic one
+POSIX_OPERATORS = '(){}|+?'
+
+def compile_pattern(query: str, match_case: bool = False, match_regex: bool = False) -> 're.Pattern[str]':
+    """Compile a query into a regular expression applied to full paths with search().
+
+    Mirrors locate: a regex is used as-is, a pattern containing glob characters
+    must match the whole path, and any other pattern matches as a substring.
+    """
+    flags = 0 if match_case else re.IGNORECASE
+    if match_regex:
+        return re.compile(query, flags)
+    if GLOB_CHARS.intersection(query):
+        return re.compile(r'\A' + fnmatch.translate(query), flags)
+    return re.compile(re.escape(query), flags)
+
+def compile_query(query: str, match_case: bool = False, match_regex: bool = False) -> Callable[[str], bool]:
+    """Compile a query into a predicate over full paths."""
+    if not match_regex and not GLOB_CHARS.intersection(query):
+        # Plain substrings are far cheaper with the in operator than with re
+        if match_case:
+            return lambda path: query in path
+        needle = query.lower()
+        return lambda path: needle in path.lower()
+    search = compile_pattern(query, match_case, match_regex).search
+    return lambda path: search(path) is not None
+
+def posix_to_python(pattern: str, extended: bool = False) -> str:
+    """Translate a POSIX regular expression, as locate matches it, to Python's re syntax.
+
+    In a basic expression \\( \\) \\{ \\} \\| \\+ \\? are operators and the bare
+    characters literals; an extended expression is the reverse. The GNU escapes
+    \\< \\> \\b \\B \\w \\W \\s \\S and back-references are kept, and any other
+    escaped character matches itself. Raises ValueError for constructs with no
+    translation, such as collating elements.
+    """
+    out: List[str] = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        # Where '*' has nothing to repeat it is a literal
+        leading = not out or out[-1] in ('(', '|', '^')
+        if char == '\\':
+            if i + 1 == len(pattern):
+                raise ValueError("Trailing backslash in regular expression")
+            char = pattern[i + 1]
+            i += 2
+            if not extended and char in POSIX_OPERATORS:
+                out.append(re.escape(char) if leading and char in '+?' else char)
+            elif char in '<>':
+                out.append(r'\b')
+            elif char in 'bBwWsS' or char in '123456789':
+                out.append('\\' + char)
+            elif char == '`':
+                out.append(r'\A')
+            elif char == "'":
+                out.append(r'\Z')
+            else:
+                out.append(re.escape(char))
+            continue
+        if char == '[':
+            i, bracket = _posix_bracket(pattern, i)
+            out.append(bracket)
+            continue
+        if char in POSIX_OPERATORS:
+            out.append(char if extended and not (leading and char in '+?') else re.escape(char))
+        elif char == '^':
+            # In a basic expression '^' anchors only at the start of the pattern or a group
+            out.append('^' if extended or not out or out[-1] in ('(', '|') else r'\^')
+        elif char == '$':
+            end = i + 1 == len(pattern) or (not extended and pattern.startswith(('\\)', '\\|'), i + 1))
+            out.append(r'\Z' if extended or end else r'\$')
+        elif char == '*':
+            out.append(r'\*' if leading else '*')
+        else:
+            out.append(char if char == '.' else re.escape(char))
+        i += 1
+    # '.' matches any character, newlines included
+    return '(?s)' + ''.join(out)
+
+def _posix_bracket(pattern: str, start: int) -> Tuple[int, str]:
+    """Translate the bracket expression at start, returning the index after it and its translation."""
+    i = start + 1
+    negate = pattern.startswith('^', i)
+    if negate:
+        i += 1
+    items: List[str] = []
+    while True:
+        if i >= len(pattern):
+            raise ValueError("Unterminated bracket expression in regular expression")
+        char = pattern[i]
+        # ']' first in the list is a member, not the end
+        if char == ']' and items:
+            break
+        if pattern.startswith('[:', i):
+            end = pattern.find(':]', i + 2)
+            name = pattern[i + 2:end] if end >= 0 else ''
+            if name not in POSIX_CLASSES:
+                raise ValueError(f"Unsupported character class in regular expression: {pattern[i:end + 2]}")
+            items.append(POSIX_CLASSES[name])
+            i = end + 2
+            continue
+        if pattern.startswith(('[.', '[='), i):
+            raise ValueError("Collating elements and equivalence classes are not supported")
+        # '-' between two members is a range; first or last it is a member. A backslash is always a member.
+        is_range = char == '-' and items and i + 1 < len(pattern) and pattern[i + 1] != ']'
+        items.append('-' if is_range else re.escape(char))
+        i += 1
+    return i + 1, '[' + ('^' if negate else '') + ''.join(items) + ']'
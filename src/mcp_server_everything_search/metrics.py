@@ -0,0 +1,230 @@
+"""Per-stage latency timers and counters for the search hot path."""
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+METRICS_RESOURCE_URI = "metrics://search"
+
+# Minimum seconds between rewrites of the Prometheus text file
+PROMETHEUS_WRITE_INTERVAL = 1.0
+
+_DISABLED_STAGE = nullcontext()
+
+@dataclass
+class QueryTrace:
+    """Execution details of a single search, collected while it runs."""
+    query: str
+    params: dict = field(default_factory=dict)
+    backend: Optional[str] = None
+    command: Optional[List[str]] = None
+    candidates: Optional[int] = None
+    returned: Optional[int] = None
+    truncated: bool = False
+    excluded: int = 0
+    stages: Dict[str, float] = field(default_factory=dict)
+    # 'ok', 'rejected' when the search queue was full, or 'error'
+    outcome: str = 'ok'
+    error: Optional[str] = None
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+_current_trace: contextvars.ContextVar[Optional[QueryTrace]] = contextvars.ContextVar(
+    'current_trace', default=None
+)
+
+def current_trace() -> Optional[QueryTrace]:
+    """Return the trace of the search running in this context, if one is being traced."""
+    return _current_trace.get()
+
+@contextmanager
+def tracing(trace: QueryTrace) -> Iterator[QueryTrace]:
+    """Collect stage timings and provider details into trace for the enclosed block."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+class Metrics:
+    """Registry of stage histograms and counters.
+
+    When disabled every recording method returns immediately, and stage()
+    hands back a shared no-op context manager unless a query trace is active,
+    so instrumented code pays only an attribute lookup.
+    """
+
+    def __init__(self, enabled: bool = False, prometheus_path: Optional[str] = None):
+        self.enabled = enabled or bool(prometheus_path)
+        self.prometheus_path = prometheus_path
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._last_write = 0.0
+
+    @classmethod
+    def from_env(cls) -> 'Metrics':
+        """Create the registry configured by EVERYTHING_SEARCH_METRICS[_FILE]."""
+        flag = os.getenv('EVERYTHING_SEARCH_METRICS', '').lower()
+        return cls(
+            enabled=flag in ('1', 'true', 'yes', 'on'),
+            prometheus_path=os.getenv('EVERYTHING_SEARCH_METRICS_FILE') or None
+        )
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the duration of one execution of a stage."""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_stage(stage, seconds)
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, counter: str, value: float = 1) -> None:
+        """Add to a monotonically increasing counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def set_gauge(self, gauge: str, value: float) -> None:
+        """Set a value that can go up or down, such as a cache's size."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[gauge] = value
+
+    def stage(self, name: str):
+        """Return a context manager timing the enclosed block as a stage."""
+        if not self.enabled and _current_trace.get() is None:
+            return _DISABLED_STAGE
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        """Return a JSON-serializable view of all metrics."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            stages = {
+                name: {
+                    'count': h.count,
+                    'sum_seconds': h.total,
+                    'mean_seconds': h.total / h.count if h.count else None,
+                    'p50_seconds': h.quantile(0.5),
+                    'p95_seconds': h.quantile(0.95),
+                    'p99_seconds': h.quantile(0.99),
+                    'buckets': {
+                        **{str(bound): c for bound, c in zip(LATENCY_BUCKETS, h.counts)},
+                        '+Inf': h.counts[-1]
+                    }
+                }
+                for name, h in self._histograms.items()
+            }
+        caches = {}
+        for counter in counters:
+            if counter.endswith(('_cache_hits', '_cache_misses')):
+                cache = counter.rsplit('_cache_', 1)[0]
+                hits = counters.get(f"{cache}_cache_hits", 0)
+                misses = counters.get(f"{cache}_cache_misses", 0)
+                lookups = hits + misses
+                caches[cache] = {'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else None}
+        return {'enabled': self.enabled, 'stages': stages, 'counters': counters, 'gauges': gauges, 'caches': caches}
+
+    def render_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP everything_search_stage_seconds Time spent in each search stage.",
+            "# TYPE everything_search_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS, h.counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f'everything_search_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'everything_search_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'everything_search_stage_seconds_sum{{stage="{name}"}} {h.total}')
+                lines.append(f'everything_search_stage_seconds_count{{stage="{name}"}} {h.count}')
+            for counter, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE everything_search_{counter}_total counter")
+                lines.append(f"everything_search_{counter}_total {value}")
+            for gauge, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE everything_search_{gauge} gauge")
+                lines.append(f"everything_search_{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self, force: bool = False) -> None:
+        """Rewrite the Prometheus text file, at most once per write interval."""
+        if not self.prometheus_path:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_write < PROMETHEUS_WRITE_INTERVAL:
+            return
+        self._last_write = now
+        tmp_path = f"{self.prometheus_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, self.prometheus_path)
+        except OSError:
+            # Metrics export must never fail a search
+            pass
+
+METRICS = Metrics.from_env()
@@ -0,0 +1,237 @@
+"""Multi-process matching of queries against a large path corpus.
+
+Matching a regex against millions of paths in Python is bound to one core by
+the GIL, and locate -r is single-threaded as well. A SharedCorpus holds
+NUL-separated paths in a memory-mapped file (in /dev/shm where available),
+split into shards at path boundaries. ParallelMatcher runs a query over the
+shards in a process pool, each worker mapping the same file, and merges the
+matches in corpus order. Once max_results matches are merged, shards not yet
+started are cancelled and running ones stop at their next check.
+"""
+
+import functools
+import itertools
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from .exclusions import ExclusionFilter
+from .matching import compile_query
+from .metrics import METRICS, current_trace
+
+# Worker processes used for regex searches; 0 leaves matching to locate
+MATCH_WORKERS = int(os.getenv('EVERYTHING_SEARCH_MATCH_WORKERS', '0'))
+
+# Corpora smaller than this are matched in the server process, where a pool
+# costs more in dispatch than it saves
+MIN_PARALLEL_BYTES = int(os.getenv('EVERYTHING_SEARCH_MATCH_MIN_BYTES', str(16 * 1024 * 1024)))
+
+# Bytes per shard. Many more shards than workers keeps all cores busy and
+# lets early cancellation skip most of the corpus for selective limits.
+SHARD_BYTES = 4 * 1024 * 1024
+
+# Paths matched between checks for cancellation
+CANCEL_CHECK = 4096
+
+# Concurrent searches that can be cancelled independently
+CANCEL_SLOTS = 64
+
+# Corpora a worker keeps mapped, so a replaced corpus is unmapped promptly
+MAX_MAPPED_CORPORA = 2
+
+CORPUS_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+class MatchSpec(NamedTuple):
+    """What a shard is matched against, sent to workers with each shard."""
+    query: str
+    match_case: bool = False
+    match_regex: bool = False
+    exclusions: Optional[ExclusionFilter] = None
+    existing_files: bool = False
+
+def _remove(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class SharedCorpus:
+    """NUL-separated paths in a memory-mapped file, split into shards at path boundaries.
+
+    The file is removed when the corpus is closed or garbage collected, so a
+    search still matching against a replaced corpus keeps it alive.
+    """
+
+    def __init__(self, path: str, shard_bytes: int = SHARD_BYTES):
+        self.path = path
+        self._finalizer = weakref.finalize(self, _remove, path)
+        self.shards: List[Tuple[int, int]] = []
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if not self.size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start = 0
+                while start < self.size:
+                    separator = data.find(b'\0', min(start + shard_bytes, self.size) - 1)
+                    end = self.size if separator < 0 else separator + 1
+                    self.shards.append((start, end))
+                    start = end
+
+    @classmethod
+    def create(cls, fill: Callable[[BinaryIO], None], directory: str = CORPUS_DIR) -> 'SharedCorpus':
+        """Create a corpus from the NUL-separated paths fill writes to a new file."""
+        fd, path = tempfile.mkstemp(prefix='everything-search-corpus-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                fill(f)
+            return cls(path)
+        except BaseException:
+            _remove(path)
+            raise
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str], directory: str = CORPUS_DIR) -> 'SharedCorpus':
+        return cls.create(lambda f: f.writelines(os.fsencode(path) + b'\0' for path in paths), directory)
+
+    def read(self, start: int, end: int) -> bytes:
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def close(self) -> None:
+        self._finalizer()
+
+@functools.lru_cache(maxsize=32)
+def _compiled(query: str, match_case: bool, match_regex: bool) -> Callable[[str], bool]:
+    return compile_query(query, match_case=match_case, match_regex=match_regex)
+
+def scan(data: bytes, spec: MatchSpec, limit: int, cancelled: Callable[[], bool] = lambda: False) -> List[str]:
+    """Return up to limit paths in a block of NUL-separated paths matching spec, in order."""
+    paths = data.decode('utf-8', 'surrogateescape').split('\0')
+    if paths and not paths[-1]:
+        paths.pop()
+    matches = _compiled(spec.query, spec.match_case, spec.match_regex)
+    excluded = spec.exclusions.excluded if spec.exclusions else None
+    found: List[str] = []
+    for start in range(0, len(paths), CANCEL_CHECK):
+        if cancelled():
+            break
+        for path in filter(matches, paths[start:start + CANCEL_CHECK]):
+            if excluded is not None and excluded(path):
+                continue
+            if spec.existing_files and not os.path.lexists(path):
+                continue
+            found.append(path)
+            if len(found) >= limit:
+                return found
+    return found
+
+# Worker process state
+_cancelled = None
+_mapped: 'OrderedDict[str, mmap.mmap]' = OrderedDict()
+
+def _init_worker(cancelled) -> None:
+    global _cancelled
+    _cancelled = cancelled
+
+def _map(path: str) -> mmap.mmap:
+    data = _mapped.get(path)
+    if data is None:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _mapped[path] = data
+        while len(_mapped) > MAX_MAPPED_CORPORA:
+            _mapped.popitem(last=False)[1].close()
+    return data
+
+def _match_shard(path: str, start: int, end: int, spec: MatchSpec, limit: int, search_id: int) -> List[str]:
+    slot = search_id % CANCEL_SLOTS
+    cancelled = lambda: _cancelled[slot] == search_id
+    if cancelled():
+        return []
+    return scan(_map(path)[start:end], spec, limit, cancelled)
+
+class ParallelMatcher:
+    """Matches queries against a SharedCorpus in a pool of worker processes.
+
+    With fewer than two workers, or for a corpus smaller than
+    min_parallel_bytes, shards are matched in this process instead, which is
+    the single-core baseline.
+    """
+
+    def __init__(self, workers: int = MATCH_WORKERS, min_parallel_bytes: int = MIN_PARALLEL_BYTES):
+        self.workers = workers
+        self.min_parallel_bytes = min_parallel_bytes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cancelled = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def match(self, corpus: SharedCorpus, spec: MatchSpec, limit: int) -> List[str]:
+        """Return the first limit paths of corpus matching spec, in corpus order."""
+        # Compiled here first, so an invalid pattern fails before any shard is sent
+        _compiled(spec.query, spec.match_case, spec.match_regex)
+        trace = current_trace()
+        if trace is not None:
+            trace.backend = 'parallel_match'
+        found: List[str] = []
+        with METRICS.stage('match'):
+            if self.workers < 2 or corpus.size < self.min_parallel_bytes:
+                for start, end in corpus.shards:
+                    found.extend(scan(corpus.read(start, end), spec, limit - len(found)))
+                    if len(found) >= limit:
+                        break
+            else:
+                found = self._match_shards(corpus, spec, limit)
+        if trace is not None:
+            trace.truncated = len(found) >= limit
+        return found
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Forking the server itself could copy locks held by its other threads
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload([__name__])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._cancelled = context.Array('q', CANCEL_SLOTS, lock=False)
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=context, initializer=_init_worker, initargs=(self._cancelled,)
+                )
+            return self._pool
+
+    def _match_shards(self, corpus: SharedCorpus, spec: MatchSpec, limit: int) -> List[str]:
+        pool = self._get_pool()
+        search_id = next(self._ids)
+        futures = [
+            pool.submit(_match_shard, corpus.path, start, end, spec, limit, search_id)
+            for start, end in corpus.shards
+        ]
+        found: List[str] = []
+        try:
+            for future in futures:
+                found.extend(future.result()[:limit - len(found)])
+                if len(found) >= limit:
+                    break
+        finally:
+            # Stop running shards at their next check, and drop those not started
+            self._cancelled[search_id % CANCEL_SLOTS] = search_id
+            skipped = sum(future.cancel() for future in futures)
+        METRICS.increment('match_shards', len(futures))
+        METRICS.increment('match_shards_skipped', skipped)
+        return found
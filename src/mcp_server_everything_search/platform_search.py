@@ -1,10 +1,20 @@
 """Platform-specific search implementations with dedicated parameter models."""
 
+from datetime import datetime
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 from enum import Enum
+import functools
 import platform
 
+# Resolved once at import; the platform cannot change while the server runs
+CURRENT_PLATFORM = platform.system().lower()
+
+class OutputFormat(str, Enum):
+    """How search results are rendered."""
+    LIST = 'list'
+    TREE = 'tree'
+
 class BaseSearchQuery(BaseModel):
     """Base search parameters common to all platforms."""
     query: str = Field(
@@ -16,6 +26,47 @@ class BaseSearchQuery(BaseModel):
         le=1000,
         description="Maximum number of results to return (1-1000)"
     )
+    rank: bool = Field(
+        default=False,
+        description=(
+            "Rank results by relevance instead of index order: exact and prefix filename matches first, "
+            "shallower and recently modified paths preferred, vendored directories such as node_modules penalized"
+        )
+    )
+    exclude: List[str] = Field(
+        default_factory=list,
+        description=(
+            "Paths to leave out: directory prefixes such as '/srv/cache', names or globs matched against any "
+            "path component such as 'dist' or '*.pyc', or whole-path globs such as '*/build/*.o'"
+        )
+    )
+    default_excludes: bool = Field(
+        default=True,
+        description="Also apply the server's default exclusions (node_modules, .git, __pycache__, target, virtualenvs)"
+    )
+    max_staleness: Optional[float] = Field(
+        default=None,
+        ge=0,
+        description=(
+            "Maximum age in seconds of unindexed changes the search may miss. Roots of the server's own locate "
+            "index with older changes are rebuilt before searching; live indexes (Everything, Spotlight) always qualify"
+        )
+    )
+    output_format: OutputFormat = Field(
+        default=OutputFormat.LIST,
+        description=(
+            "'list' gives every result's full path, size and times; 'tree' groups results by directory, "
+            "writing each shared directory prefix once, with size and modification time per file"
+        )
+    )
+    max_response_bytes: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "Byte budget for a 'tree' response. The largest directory listings, then the deepest subtrees, "
+            "are collapsed into counts until the results fit"
+        )
+    )
 
 class MacSpecificParams(BaseModel):
     """macOS-specific search parameters for mdfind."""
@@ -35,6 +86,24 @@ class MacSpecificParams(BaseModel):
         default=False,
         description="Interpret query as if typed in Spotlight menu"
     )
+    min_size: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="Only match files of at least this many bytes (filtered by Spotlight)"
+    )
+    max_size: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="Only match files of at most this many bytes (filtered by Spotlight)"
+    )
+    modified_after: Optional[datetime] = Field(
+        default=None,
+        description="Only match files modified at or after this ISO 8601 time (filtered by Spotlight)"
+    )
+    modified_before: Optional[datetime] = Field(
+        default=None,
+        description="Only match files modified before this ISO 8601 time (filtered by Spotlight)"
+    )
 
 class LinuxSpecificParams(BaseModel):
     """Linux-specific search parameters for locate."""
@@ -100,9 +169,10 @@ class UnifiedSearchQuery(BaseSearchQuery):
     windows_params: Optional[WindowsSpecificParams] = None
 
     @classmethod
+    @functools.lru_cache(maxsize=None)
     def get_schema_for_platform(cls) -> Dict[str, Any]:
         """Get the appropriate schema based on the current platform."""
-        system = platform.system().lower()
+        system = CURRENT_PLATFORM
         
         schema = {
             "type": "object",
@@ -124,7 +194,7 @@ class UnifiedSearchQuery(BaseSearchQuery):
 
     def get_platform_params(self) -> Optional[BaseModel]:
         """Get the parameters specific to the current platform."""
-        system = platform.system().lower()
+        system = CURRENT_PLATFORM
         if system == "darwin":
             return self.mac_params
         elif system == "linux":
@@ -133,9 +203,77 @@ class UnifiedSearchQuery(BaseSearchQuery):
             return self.windows_params
         return None
 
+# Most queries accepted by one search_batch call
+MAX_BATCH_QUERIES = 50
+
+class SubscribeQuery(BaseModel):
+    """Parameters for registering a standing query."""
+    query: str = Field(
+        description="Pattern matched against the full path of new entries: a substring, a glob such as '*.log', or a regex"
+    )
+    roots: List[str] = Field(
+        min_length=1,
+        description="Directories to watch recursively for new and renamed entries"
+    )
+    match_case: bool = Field(
+        default=False,
+        description="Enable case-sensitive matching"
+    )
+    match_regex: bool = Field(
+        default=False,
+        description="Treat query as a regular expression"
+    )
+    debounce_ms: int = Field(
+        default=500,
+        ge=0,
+        le=60000,
+        description="Collect hits for this many milliseconds before sending one notification"
+    )
+    exclude: List[str] = Field(
+        default_factory=list,
+        description="Paths to leave unwatched, in the same forms as the search tool's exclude"
+    )
+    default_excludes: bool = Field(
+        default=True,
+        description="Also apply the server's default exclusions"
+    )
+
+class UnsubscribeQuery(BaseModel):
+    """Parameters for removing a standing query."""
+    subscription_id: str = Field(
+        description="Identifier returned by the subscribe tool"
+    )
+
+class ChangesQuery(BaseModel):
+    """Parameters for listing changes under the owned index roots."""
+    snapshot_id: Optional[int] = Field(
+        default=None,
+        ge=0,
+        description="Return changes made after this snapshot, as reported by an earlier call"
+    )
+    since: Optional[datetime] = Field(
+        default=None,
+        description="Return changes made after this ISO 8601 time or POSIX timestamp"
+    )
+    root: Optional[str] = Field(
+        default=None,
+        description="Only return changes under this directory"
+    )
+    max_results: int = Field(
+        default=100,
+        ge=1,
+        le=1000,
+        description="Maximum number of changed paths to list (1-1000); all changes are counted"
+    )
+    max_staleness: Optional[float] = Field(
+        default=None,
+        ge=0,
+        description="Rebuild and snapshot roots whose unrecorded changes are older than this many seconds first"
+    )
+
 def build_search_command(query: UnifiedSearchQuery) -> List[str]:
     """Build the appropriate search command based on platform and parameters."""
-    system = platform.system().lower()
+    system = CURRENT_PLATFORM
     platform_params = query.get_platform_params()
     
     if system == "darwin":
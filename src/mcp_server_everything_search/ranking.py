@@ -0,0 +1,199 @@
+"""Relevance ranking of candidate paths with a bounded top-k heap."""
+
+import heapq
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .metrics import METRICS
+
+# Maximum number of backend candidates considered by a ranked search
+RANK_CANDIDATE_LIMIT = int(os.getenv('EVERYTHING_SEARCH_RANK_CANDIDATES', '1000000'))
+
+# Score weights
+EXACT_NAME_SCORE = 100.0
+NAME_PREFIX_SCORE = 40.0
+NAME_MATCH_SCORE = 25.0
+PATH_MATCH_SCORE = 5.0
+DEPTH_PENALTY = 2.0
+RECENCY_SCORE = 20.0
+RECENCY_HALF_LIFE_DAYS = 7.0
+
+# Only this many times k of the best candidates are stat'ed to apply recency
+RECENCY_SHORTLIST_FACTOR = 4
+
+# Candidates are scored in batches so per-batch setup is amortized
+BATCH_SIZE = 4096
+
+DEFAULT_PENALTIES: Dict[str, float] = {
+    'node_modules': 60.0,
+    '.git': 60.0,
+    '__pycache__': 50.0,
+    'site-packages': 50.0,
+    '.venv': 50.0,
+    'venv': 50.0,
+    '.tox': 50.0,
+    'target': 30.0,
+    'dist': 30.0,
+    'build': 30.0,
+    'vendor': 30.0,
+    '.cache': 30.0,
+}
+
+GLOB_CHARS = re.compile(r'[*?\[\]]')
+REGEX_CHARS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
+def parse_penalties(spec: Optional[str]) -> Dict[str, float]:
+    """Parse 'name[=weight],...' into directory penalties, defaulting weights to 50."""
+    if not spec:
+        return dict(DEFAULT_PENALTIES)
+    penalties = {}
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name:
+            penalties[name] = float(weight) if weight else 50.0
+    return penalties
+
+PENALTIES = parse_penalties(os.getenv('EVERYTHING_SEARCH_RANK_PENALTIES'))
+
+def query_needle(query: str, match_regex: bool = False) -> str:
+    """Extract the literal text a ranked query is looking for.
+
+    Glob or regex syntax and Everything function terms such as 'ext:py' are
+    dropped, and the longest remaining literal run is used, so '*server.py'
+    ranks against 'server.py'.
+    """
+    if match_regex:
+        parts = REGEX_CHARS.split(query)
+    else:
+        parts = [
+            part
+            for term in query.split() if ':' not in term
+            for part in GLOB_CHARS.split(term.strip('"!'))
+        ]
+    return max(parts, key=len, default='')
+
+class Ranker:
+    """Scores paths against a query and keeps the best k.
+
+    A path scores for an exact basename match, a basename prefix or substring
+    match, or a match only in its directory part. It is penalized for depth
+    and for each penalized directory component, such as node_modules. When an
+    mtime lookup is supplied, a recency bonus is applied to a shortlist of the
+    best candidates.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        match_case: bool = False,
+        match_regex: bool = False,
+        penalties: Optional[Dict[str, float]] = None,
+        sep: str = os.sep
+    ):
+        needle = query_needle(query, match_regex)
+        self.match_case = match_case
+        self.needle = needle if match_case else needle.lower()
+        self.sep = sep
+        penalties = PENALTIES if penalties is None else penalties
+        if not match_case:
+            penalties = {name.lower(): weight for name, weight in penalties.items()}
+        self.penalties = penalties
+        # One pass finds every penalized component; the lookahead lets adjacent ones share a separator
+        self._penalty_finder = re.compile(
+            f"{re.escape(sep)}({'|'.join(map(re.escape, penalties))})(?={re.escape(sep)})"
+        ) if penalties else None
+
+    def score_batch(self, paths: Sequence[str], floor: float = float('-inf')) -> List[Tuple[float, int]]:
+        """Score a batch of paths without recency, returning (score, index) pairs above floor.
+
+        Basename matches are located for the whole batch with list-level passes
+        first. Once floor is at least PATH_MATCH_SCORE, paths without a basename
+        match cannot qualify and are dropped before any per-path scoring.
+        """
+        sep = self.sep
+        needle = self.needle
+        lowered = paths if self.match_case else [p.lower() for p in paths]
+        if needle:
+            cuts = [p.rfind(sep) + 1 for p in lowered]
+            positions = [p.find(needle, cut) for p, cut in zip(lowered, cuts)]
+            if floor >= PATH_MATCH_SCORE:
+                indices = [i for i, position in enumerate(positions) if position >= 0]
+            else:
+                indices = range(len(lowered))
+        elif floor >= 0:
+            return []
+        else:
+            indices = range(len(lowered))
+
+        penalty_search = self._penalty_finder.search if self._penalty_finder is not None else None
+        weights = self.penalties
+        scored = []
+        for i in indices:
+            p = lowered[i]
+            score = -DEPTH_PENALTY * p.count(sep)
+            if needle:
+                position = positions[i]
+                if position < 0:
+                    if needle in p:
+                        score += PATH_MATCH_SCORE
+                elif position != cuts[i]:
+                    score += NAME_MATCH_SCORE
+                else:
+                    name = p[position:]
+                    if name == needle or name.rpartition('.')[0] == needle:
+                        score += EXACT_NAME_SCORE
+                    else:
+                        score += NAME_PREFIX_SCORE
+            # Penalties only lower the score, so skip them for paths already out of reach
+            if score <= floor:
+                continue
+            if penalty_search is not None and penalty_search(p):
+                for name in self._penalty_finder.findall(p):
+                    score -= weights[name]
+                if score <= floor:
+                    continue
+            scored.append((score, i))
+        return scored
+
+    def top_k(
+        self,
+        paths: Sequence[str],
+        k: int,
+        mtime_ns: Optional[Callable[[int], Optional[int]]] = None
+    ) -> List[int]:
+        """Return indices of the k best paths, best first.
+
+        mtime_ns maps a candidate index to its modification time in
+        nanoseconds (or None), and is only called for the shortlist.
+        """
+        with METRICS.stage('rank'):
+            shortlist_size = k * RECENCY_SHORTLIST_FACTOR if mtime_ns else k
+            heap: List[tuple] = []
+            for start in range(0, len(paths), BATCH_SIZE):
+                # Candidates scoring at or below the heap minimum cannot enter it
+                floor = heap[0][0] if len(heap) >= shortlist_size else float('-inf')
+                for score, offset in self.score_batch(paths[start:start + BATCH_SIZE], floor):
+                    # Earlier candidates win ties, preserving the backend's order
+                    entry = (score, -(start + offset))
+                    if len(heap) < shortlist_size:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+
+            if mtime_ns:
+                now = time.time_ns()
+                half_life_ns = RECENCY_HALF_LIFE_DAYS * 86400 * 1e9
+                rescored = []
+                for score, negative_index in heap:
+                    mtime = mtime_ns(-negative_index)
+                    if mtime is not None:
+                        age = max(0, now - mtime)
+                        score += RECENCY_SCORE * 0.5 ** (age / half_life_ns)
+                    rescored.append((score, negative_index))
+                heap = heapq.nlargest(k, rescored)
+            else:
+                heap = sorted(heap, reverse=True)
+        METRICS.increment('ranked_candidates', len(paths))
+        return [-negative_index for _, negative_index in heap[:k]]
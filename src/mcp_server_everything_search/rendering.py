@@ -0,0 +1,224 @@
+"""Text renderings of search results.
+
+The list format repeats the full path and metadata of every result. The tree
+format factors out shared directory prefixes instead: results are grouped by
+directory, directories are nested under their common ancestors, and chains of
+directories without results of their own are joined into one line, so each
+prefix is written once however many results share it.
+
+A tree rendering can be held to a byte budget. When it does not fit, the
+largest file groups are collapsed into counts on their directory's line, and
+then, if that is not enough, whole subtrees from the deepest up.
+"""
+
+import heapq
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .search_interface import UNKNOWN, ResultBatch, format_timestamp
+from .snapshots import ADDED, MODIFIED, REMOVED, Changes
+
+INDENT = '  '
+
+def format_results(results: ResultBatch) -> str:
+    """Render a result batch as text, reading its columns directly."""
+    if results.total != UNKNOWN and not results:
+        return f"Matches: {results.total:,}"
+    paths = results.paths
+    sizes = results.sizes
+    created = results.created
+    modified = results.modified
+    accessed = results.accessed
+    lines = []
+    for i in range(len(paths)):
+        extension = results.extension(i)
+        size = sizes[i]
+        lines.append(
+            f"Path: {paths[i]}\n"
+            f"Filename: {results.filename(i)}"
+            f"{f' ({extension})' if extension else ''}\n"
+            f"Size: {f'{size:,} bytes' if size != UNKNOWN else 'N/A'}\n"
+            f"Created: {format_timestamp(created[i])}\n"
+            f"Modified: {format_timestamp(modified[i])}\n"
+            f"Accessed: {format_timestamp(accessed[i])}\n"
+        )
+    return "\n".join(lines)
+
+def _count(number: int, singular: str, plural: str) -> str:
+    return f"{number:,} {singular if number == 1 else plural}"
+
+def _encoded_len(text: str) -> int:
+    return len(text.encode('utf-8', 'surrogateescape'))
+
+class _Group:
+    """A directory line of the tree: the results directly in it and the directories below it."""
+
+    __slots__ = ('components', 'depth', 'files', 'children', 'header', 'files_bytes', 'suffix', 'collapsed')
+
+    def __init__(self, components: List[str]):
+        self.components = components
+        self.depth = 0
+        self.files: List[str] = []
+        self.children: List['_Group'] = []
+        self.header = ''
+        self.files_bytes = 0
+        # Count appended to the header once the group's files or subtree are collapsed
+        self.suffix = ''
+        self.collapsed = False
+
+    def count(self) -> Tuple[int, int]:
+        """Number of results and of directories with results in this subtree."""
+        files, directories = len(self.files), 1 if self.files else 0
+        for child in self.children:
+            child_files, child_directories = child.count()
+            files += child_files
+            directories += child_directories
+        return files, directories
+
+    def visible_bytes(self) -> int:
+        """Bytes this group renders below its header."""
+        if self.collapsed:
+            return 0
+        size = 0 if self.suffix else self.files_bytes
+        return size + sum(_encoded_len(child.header + child.suffix) + 1 + child.visible_bytes() for child in self.children)
+
+    def render(self, lines: List[str]) -> None:
+        lines.append(self.header + self.suffix)
+        if self.collapsed:
+            return
+        if not self.suffix:
+            lines.extend(self.files)
+        for child in self.children:
+            child.render(lines)
+
+def _file_line(results: ResultBatch, index: int, name: str, depth: int) -> str:
+    details = []
+    size = results.sizes[index]
+    if size != UNKNOWN:
+        details.append(f"{size:,} bytes")
+    modified = results.modified[index]
+    if modified != UNKNOWN:
+        details.append(f"modified {datetime.fromtimestamp(modified // 10**9)}")
+    return f"{INDENT * depth}{name} ({', '.join(details)})" if details else f"{INDENT * depth}{name}"
+
+def _build_tree(results: ResultBatch, sep: str) -> List[_Group]:
+    """Group results by directory and return the top-level groups, prefixes factored and sorted."""
+    root = _Group([])
+    nodes: Dict[str, _Group] = {}
+    entries: Dict[int, str] = {}
+    for index, path in enumerate(results.paths):
+        directory, _, name = path.rpartition(sep)
+        if not name:
+            # The root directory itself
+            directory, name = path.rstrip(sep), path
+        node = nodes.get(directory)
+        if node is None:
+            node, prefix = root, None
+            for component in directory.split(sep):
+                prefix = component if prefix is None else prefix + sep + component
+                child = nodes.get(prefix)
+                if child is None:
+                    child = nodes[prefix] = _Group([component])
+                    node.children.append(child)
+                node = child
+        node.files.append(index)
+        entries[index] = name
+
+    def compact(group: _Group, depth: int) -> _Group:
+        # A directory holding nothing but one subdirectory shares its line
+        while len(group.children) == 1 and not group.files:
+            child = group.children[0]
+            child.components = group.components + child.components
+            group = child
+        group.depth = depth
+        group.header = INDENT * depth + sep.join(group.components) + sep
+        group.files = [
+            _file_line(results, index, entries[index], depth + 1)
+            for index in sorted(group.files, key=lambda index: entries[index])
+        ]
+        group.files_bytes = sum(_encoded_len(line) + 1 for line in group.files)
+        group.children = sorted(
+            (compact(child, depth + 1) for child in group.children),
+            key=lambda child: child.components
+        )
+        return group
+
+    return sorted((compact(group, 0) for group in root.children), key=lambda group: group.components)
+
+def _fit(groups: List[_Group], total: int, max_bytes: int) -> None:
+    """Collapse groups until the rendering is at most max_bytes long, or nothing is left to collapse."""
+    everything: List[_Group] = []
+    pending = list(groups)
+    while pending:
+        group = pending.pop()
+        everything.append(group)
+        pending.extend(group.children)
+
+    # Largest file listings first, so most directories stay visible
+    for group in sorted(everything, key=lambda group: group.files_bytes, reverse=True):
+        if total <= max_bytes or not group.files:
+            break
+        group.suffix = f" ({_count(len(group.files), 'file', 'files')})"
+        total -= group.files_bytes - _encoded_len(group.suffix)
+
+    # Then whole subtrees, deepest first, so the top of the tree stays visible
+    for group in sorted(everything, key=lambda group: (group.depth, group.visible_bytes()), reverse=True):
+        if total <= max_bytes:
+            break
+        if not group.children:
+            continue
+        hidden = group.visible_bytes()
+        files, directories = group.count()
+        suffix = f" ({_count(files, 'file', 'files')} in {_count(directories, 'directory', 'directories')})"
+        total -= hidden + _encoded_len(group.suffix) - _encoded_len(suffix)
+        group.suffix = suffix
+        group.collapsed = True
+
+def render_tree(results: ResultBatch, max_bytes: Optional[int] = None, sep: str = '/') -> str:
+    """Render a result batch as a directory tree, collapsing groups to fit max_bytes if given.
+
+    Results are listed by directory and name rather than in result order,
+    with their size and modification time to the second.
+    """
+    if results.total != UNKNOWN and not results:
+        return f"Matches: {results.total:,}"
+    if not results:
+        return ""
+    groups = _build_tree(results, sep)
+    directories = sum(group.count()[1] for group in groups)
+    summary = f"Results: {len(results):,} in {_count(directories, 'directory', 'directories')}"
+    if max_bytes is not None:
+        total = _encoded_len(summary) + sum(
+            _encoded_len(group.header) + 1 + group.visible_bytes() for group in groups
+        )
+        _fit(groups, total, max_bytes)
+    lines = [summary]
+    for group in groups:
+        group.render(lines)
+    return "\n".join(lines)
+
+def format_changes(changes: Changes, max_results: int) -> str:
+    """Render the result of a changes query: counts per kind, then up to max_results paths by kind and path."""
+    by_kind: Dict[str, List[str]] = {ADDED: [], REMOVED: [], MODIFIED: []}
+    for path, (kind, _) in changes.paths.items():
+        by_kind[kind].append(path)
+    lines = [
+        f"Changes: {len(by_kind[ADDED]):,} added, {len(by_kind[REMOVED]):,} removed, "
+        f"{len(by_kind[MODIFIED]):,} modified"
+    ]
+    remaining = max_results
+    for kind in (ADDED, REMOVED, MODIFIED):
+        paths = by_kind[kind]
+        if not paths:
+            continue
+        lines.append(f"{kind.capitalize()}:")
+        shown = heapq.nsmallest(remaining, paths)
+        for path in shown:
+            if kind == REMOVED:
+                lines.append(f"{INDENT}{path}")
+            else:
+                lines.append(f"{INDENT}{path} (modified {datetime.fromtimestamp(changes.paths[path][1] // 10**9)})")
+        if len(shown) < len(paths):
+            lines.append(f"{INDENT}... {len(paths) - len(shown):,} more")
+        remaining -= len(shown)
+    return "\n".join(lines)
@@ -0,0 +1,199 @@
+"""Admission control and priority scheduling for searches.
+
+Each backend gets a fixed number of concurrent slots. Searches beyond that
+wait in a priority queue, so cheap queries overtake broad ones. A search is
+rejected at once, instead of queued, when the queue is full. Provider calls
+are blocking and run in worker threads, which keeps the event loop free for
+other requests and notifications.
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple, TypeVar
+
+from .matching import GLOB_CHARS
+from .metrics import METRICS
+from .platform_search import UnifiedSearchQuery
+
+T = TypeVar('T')
+
+# Priority classes, lowest value first
+CHEAP = 0
+NORMAL = 1
+HEAVY = 2
+PRIORITY_NAMES = {CHEAP: 'cheap', NORMAL: 'normal', HEAVY: 'heavy'}
+
+DEFAULT_CONCURRENCY = int(os.getenv('EVERYTHING_SEARCH_MAX_CONCURRENT', '2'))
+DEFAULT_MAX_QUEUED = int(os.getenv('EVERYTHING_SEARCH_MAX_QUEUED', '16'))
+
+# Queries with a literal part shorter than this match most of the index
+BROAD_QUERY_CHARS = 2
+
+# Everything functions that filter on a property, so a term such as 'ext:py' or 'size:>1gb'
+# narrows the results even without a literal part
+NARROWING_FUNCTIONS = frozenset({
+    'size', 'len', 'count', 'childcount', 'childfilecount', 'childfoldercount',
+    'datemodified', 'dm', 'dateaccessed', 'da', 'datecreated', 'dc', 'daterun', 'dr', 'recentchange', 'rc',
+    'attrib', 'attributes', 'type', 'ext', 'parent', 'infolder', 'nosubfolders', 'startwith', 'endwith',
+    'child', 'depth', 'parents', 'shell', 'filelist', 'filelistfilename', 'frn', 'fsi'
+})
+# Everything modifiers, which change how the text after them is matched
+MODIFIERS = frozenset({
+    'case', 'nocase', 'file', 'folder', 'path', 'nopath', 'regex', 'noregex', 'wfn', 'nowfn',
+    'wholefilename', 'nowholefilename', 'wholeword', 'ww', 'nowholeword', 'noww', 'wildcards', 'nowildcards'
+})
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a search is rejected because the backend's queue is full."""
+
+def classify(query: UnifiedSearchQuery, platform: str) -> int:
+    """Assign a priority class to a search.
+
+    Count-only and exact-name queries are cheap. Regex, ranked and very broad
+    queries are heavy, because the backend must produce and the server must
+    process most of the index. Everything else is normal, including queries
+    narrowed only by Everything functions such as 'ext:py' or 'size:>1gb'.
+    On Windows, modifiers such as 'case:' are dropped and the text they apply
+    to is kept. Elsewhere a term with a colon is plain text.
+    """
+    windows_params = query.windows_params
+    linux_params = query.linux_params
+    if platform == 'linux' and linux_params and linux_params.count_only:
+        return CHEAP
+
+    regex = bool(
+        (platform == 'windows' and windows_params and windows_params.match_regex)
+        or (platform == 'linux' and linux_params and linux_params.regex_search)
+    )
+    text = query.query.strip()
+    literal = text.split()
+    narrowed = False
+    if platform == 'windows':
+        literal = []
+        for term in text.split():
+            name, colon, value = term.lstrip('!<').partition(':')
+            name = name.lower()
+            if not colon or (name not in NARROWING_FUNCTIONS and name not in MODIFIERS):
+                literal.append(term)
+            elif name in NARROWING_FUNCTIONS:
+                narrowed = narrowed or bool(value)
+            else:
+                regex = regex or name == 'regex'
+                literal.append(value)
+    literal = ''.join(char for char in ''.join(literal) if char not in GLOB_CHARS and char not in '"!]')
+    if regex or query.rank:
+        return HEAVY
+    if len(literal) < BROAD_QUERY_CHARS:
+        return NORMAL if narrowed else HEAVY
+    if not GLOB_CHARS.intersection(text):
+        return CHEAP
+    return NORMAL
+
+@dataclass
+class _Backend:
+    """Slots in use and queued waiters for one backend."""
+    active: int = 0
+    waiters: List[Tuple[int, int, asyncio.Future]] = field(default_factory=list)
+
+class Scheduler:
+    """Bounds concurrent searches per backend and orders waiting searches by priority."""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, max_queued: int = DEFAULT_MAX_QUEUED):
+        self.concurrency = max(1, concurrency)
+        self.max_queued = max(0, max_queued)
+        self._backends: Dict[str, _Backend] = {}
+        self._sequence = itertools.count()
+
+    def queued(self, backend: str) -> int:
+        """Number of searches waiting for a slot on backend."""
+        state = self._backends.get(backend)
+        return len(state.waiters) if state else 0
+
+    def busy(self, backend: str) -> bool:
+        """Whether searches are running or waiting on backend."""
+        state = self._backends.get(backend)
+        return bool(state and (state.active or state.waiters))
+
+    def admit(self, backend: str, count: int) -> None:
+        """Check that count searches can start or queue now, raising SchedulerBusy if not.
+
+        Used for a batch, so that it is accepted or rejected as a whole; its
+        searches are then run with admitted=True.
+        """
+        state = self._backends.setdefault(backend, _Backend())
+        free = 0 if state.waiters else max(0, self.concurrency - state.active)
+        if len(state.waiters) + count - free > self.max_queued:
+            METRICS.increment('searches_rejected', count)
+            raise SchedulerBusy(
+                f"Search queue cannot take {count} more searches ({len(state.waiters)} waiting, "
+                f"{state.active} running, limit {self.max_queued}); retry shortly"
+            )
+
+    async def run(
+        self,
+        backend: str,
+        priority: int,
+        fn: Callable[..., T],
+        *args,
+        admitted: bool = False
+    ) -> Tuple[T, float]:
+        """Run fn(*args) in a worker thread once a slot is free.
+
+        Returns the result and the seconds spent waiting for a slot. Raises
+        SchedulerBusy without waiting if the backend's queue is full, unless
+        the search was already admitted.
+        """
+        state = self._backends.setdefault(backend, _Backend())
+        start = time.perf_counter()
+        await self._acquire(state, priority, admitted)
+        wait = time.perf_counter() - start
+        METRICS.observe('queue_wait', wait)
+        # A worker thread cannot be stopped, so if the caller is cancelled the
+        # slot stays taken until the thread finishes, not just until the caller leaves
+        task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        task.add_done_callback(functools.partial(self._finished, state))
+        return await asyncio.shield(task), wait
+
+    def _finished(self, state: _Backend, task: asyncio.Future) -> None:
+        if not task.cancelled():
+            # Retrieved here in case the caller was cancelled and never will
+            task.exception()
+        self._release(state)
+
+    async def _acquire(self, state: _Backend, priority: int, admitted: bool = False) -> None:
+        if state.active < self.concurrency and not state.waiters:
+            state.active += 1
+            return
+        if not admitted and len(state.waiters) >= self.max_queued:
+            METRICS.increment('searches_rejected')
+            raise SchedulerBusy(
+                f"Search queue is full ({self.max_queued} waiting, {state.active} running); retry shortly"
+            )
+        future = asyncio.get_running_loop().create_future()
+        # Equal priorities are served first come, first served
+        entry = (priority, next(self._sequence), future)
+        heapq.heappush(state.waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller gave up
+                self._release(state)
+            else:
+                state.waiters.remove(entry)
+                heapq.heapify(state.waiters)
+            raise
+
+    def _release(self, state: _Backend) -> None:
+        # Hand the slot straight to the best waiter so nothing can jump the queue
+        while state.waiters:
+            _, _, future = heapq.heappop(state.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        state.active -= 1
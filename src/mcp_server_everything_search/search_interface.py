@@ -1,25 +1,109 @@
 """Platform-agnostic search interface for MCP."""
 
 import abc
-import platform
+import re
+import selectors
+import shutil
 import subprocess
+import sys
 import os
-from datetime import datetime
-from typing import Optional, List
-from dataclasses import dataclass
-from pathlib import Path
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Hashable, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+from .exclusions import ExclusionFilter
+from .index_refresh import SYSTEM_DATABASES, system_index_status
+from .matching import compile_query, posix_to_python
+from .metrics import METRICS, current_trace
+from .parallel_match import MATCH_WORKERS, MatchSpec, ParallelMatcher, SharedCorpus
+from .platform_search import CURRENT_PLATFORM
+from .ranking import RANK_CANDIDATE_LIMIT, Ranker
+from .stat_cache import MISSING, STAT_CACHE, StatCache
+
+# Sentinel stored in the integer columns of a ResultBatch when a value is unavailable
+UNKNOWN = -1
+
+# Candidates fetched from Everything for a ranked search
+EVERYTHING_RANK_CANDIDATES = 10000
+
+# Everything regex searches fetch this many times max_results, since excluded
+# paths can only be filtered out afterwards
+EXCLUSION_OVERFETCH = 4
+
+# Bytes read from a streamed search command per read
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# How long a live mdfind query keeps collecting results
+LIVE_UPDATE_SECONDS = float(os.getenv('EVERYTHING_SEARCH_LIVE_SECONDS', '5'))
 
 @dataclass
-class SearchResult:
-    """Universal search result structure."""
-    path: str
-    filename: str
-    extension: Optional[str] = None
-    size: Optional[int] = None
-    created: Optional[datetime] = None
-    modified: Optional[datetime] = None
-    accessed: Optional[datetime] = None
-    attributes: Optional[str] = None
+class ResultBatch:
+    """Columnar search results shared by every provider.
+
+    Each column is a parallel array indexed by result position. Timestamps are
+    POSIX nanoseconds, and missing values are stored as UNKNOWN so providers can
+    append rows without allocating per-row objects.
+    """
+    paths: List[str] = field(default_factory=list)
+    sizes: array = field(default_factory=lambda: array('q'))
+    created: array = field(default_factory=lambda: array('q'))
+    modified: array = field(default_factory=lambda: array('q'))
+    accessed: array = field(default_factory=lambda: array('q'))
+    attributes: array = field(default_factory=lambda: array('q'))
+    # Number of matches, for count-only searches that return no rows
+    total: int = UNKNOWN
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def append(
+        self,
+        path: str,
+        size: int = UNKNOWN,
+        created: int = UNKNOWN,
+        modified: int = UNKNOWN,
+        accessed: int = UNKNOWN,
+        attributes: int = UNKNOWN
+    ) -> None:
+        """Append one result row."""
+        self.paths.append(path)
+        self.sizes.append(size)
+        self.created.append(created)
+        self.modified.append(modified)
+        self.accessed.append(accessed)
+        self.attributes.append(attributes)
+
+    def append_stat(self, path: str, stat: os.stat_result) -> None:
+        """Append a row filled from an os.stat() result."""
+        self.append(path, stat.st_size, stat.st_ctime_ns, stat.st_mtime_ns, stat.st_atime_ns)
+
+    def take(self, indices: List[int]) -> 'ResultBatch':
+        """Return a new batch holding the given rows, in the given order."""
+        batch = ResultBatch()
+        for i in indices:
+            batch.append(
+                self.paths[i], self.sizes[i], self.created[i],
+                self.modified[i], self.accessed[i], self.attributes[i]
+            )
+        return batch
+
+    def filename(self, index: int) -> str:
+        """Return the final path component of a row."""
+        return os.path.basename(self.paths[index])
+
+    def extension(self, index: int) -> Optional[str]:
+        """Return the extension of a row without the leading dot, if any."""
+        ext = os.path.splitext(self.paths[index])[1]
+        return ext[1:] if ext else None
+
+def format_timestamp(value: int) -> str:
+    """Format a nanosecond timestamp column value for display."""
+    if value == UNKNOWN:
+        return 'N/A'
+    return str(datetime.fromtimestamp(value / 1e9))
 
 class SearchProvider(abc.ABC):
     """Abstract base class for platform-specific search implementations."""
@@ -33,15 +117,38 @@ class SearchProvider(abc.ABC):
         match_case: bool = False,
         match_whole_word: bool = False,
         match_regex: bool = False,
-        sort_by: Optional[int] = None
-    ) -> List[SearchResult]:
-        """Execute a file search using platform-specific methods."""
+        sort_by: Optional[int] = None,
+        rank: bool = False,
+        exclusions: Optional[ExclusionFilter] = None,
+        stat_cache: Optional[StatCache] = None
+    ) -> ResultBatch:
+        """Execute a file search using platform-specific methods.
+
+        Paths matched by exclusions are dropped before they are stat'ed or
+        counted toward max_results. Result metadata is read through
+        stat_cache, the process-wide STAT_CACHE unless another is given.
+        """
         pass
 
+    def batch_key(self, **search) -> Optional[Hashable]:
+        """Key under which searches can share one backend pass, or None if this one cannot.
+
+        search holds the keyword arguments that would be passed to search_files.
+        """
+        return None
+
+    def search_merged(self, searches: List[dict], stat_cache: Optional[StatCache] = None) -> List[ResultBatch]:
+        """Run searches sharing a batch_key, returning one batch per search in order."""
+        return [self.search_files(**search, stat_cache=stat_cache) for search in searches]
+
+    def index_status(self) -> str:
+        """Describe how current the backend's index is, for search responses."""
+        return "live"
+
     @classmethod
     def get_provider(cls) -> 'SearchProvider':
         """Factory method to get the appropriate search provider for the current platform."""
-        system = platform.system().lower()
+        system = CURRENT_PLATFORM
         if system == 'darwin':
             return MacSearchProvider()
         elif system == 'linux':
@@ -51,30 +158,268 @@ class SearchProvider(abc.ABC):
         else:
             raise NotImplementedError(f"No search provider available for {system}")
 
-    def _convert_path_to_result(self, path: str) -> SearchResult:
-        """Convert a path to a SearchResult with file information."""
+    def _run_command(self, cmd: List[str]) -> Tuple[int, bytes, str]:
+        """Run a search command, returning its exit code, raw stdout and stderr."""
+        trace = current_trace()
+        if trace is not None:
+            trace.backend = os.path.basename(cmd[0])
+            trace.command = cmd
+        with METRICS.stage('spawn'):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        METRICS.increment('subprocesses_spawned')
+        with METRICS.stage('backend_query'):
+            stdout, stderr = process.communicate()
+        METRICS.increment('bytes_read', len(stdout))
+        return process.returncode, stdout, os.fsdecode(stderr)
+
+    def _stream_command(
+        self,
+        cmd: List[str],
+        on_paths: Callable[[List[str]], bool],
+        delimiter: bytes = b'\n',
+        timeout: Optional[float] = None
+    ) -> Tuple[int, str, int]:
+        """Run a search command, handing its delimited output to on_paths chunk by chunk.
+
+        on_paths receives each decoded chunk of paths and returns True once it
+        has seen enough, at which point the command is killed, so a broad query
+        costs no more backend work than the results that are used. Reading also
+        stops after timeout seconds, for commands that never exit on their own.
+        Returns the exit code (0 if the command was stopped), stderr and the
+        number of paths read. Relies on select() over pipes, so it is for POSIX
+        backends only.
+        """
+        trace = current_trace()
+        if trace is not None:
+            trace.backend = os.path.basename(cmd[0])
+            trace.command = cmd
+        with METRICS.stage('spawn'):
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        METRICS.increment('subprocesses_spawned')
+
+        errors: List[bytes] = []
+        pending = b''
+        bytes_read = 0
+        candidates = 0
+        decode_seconds = 0.0
+        stopped = False
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        def accept(records: List[bytes]) -> bool:
+            nonlocal candidates, decode_seconds
+            start = time.perf_counter()
+            paths = [os.fsdecode(record) for record in records if record]
+            candidates += len(paths)
+            done = on_paths(paths)
+            decode_seconds += time.perf_counter() - start
+            return done
+
+        with METRICS.stage('backend_query'):
+            with selectors.DefaultSelector() as selector:
+                selector.register(process.stdout, selectors.EVENT_READ)
+                selector.register(process.stderr, selectors.EVENT_READ)
+                while selector.get_map() and not stopped:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        stopped = True
+                        break
+                    for key, _ in selector.select(remaining):
+                        chunk = os.read(key.fd, STREAM_CHUNK_SIZE)
+                        if not chunk:
+                            selector.unregister(key.fileobj)
+                        elif key.fileobj is process.stderr:
+                            errors.append(chunk)
+                        else:
+                            bytes_read += len(chunk)
+                            records = (pending + chunk).split(delimiter)
+                            pending = records.pop()
+                            if accept(records):
+                                stopped = True
+                                break
+            if pending and not stopped:
+                accept([pending])
+            if stopped and process.poll() is None:
+                process.kill()
+            process.wait()
+            process.stdout.close()
+            process.stderr.close()
+        METRICS.increment('bytes_read', bytes_read)
+        METRICS.observe('decode', decode_seconds)
+        if trace is not None:
+            trace.candidates = candidates
+            trace.truncated = stopped
+        return 0 if stopped else process.returncode, os.fsdecode(b''.join(errors)), candidates
+
+    def _stream_paths(
+        self,
+        cmd: List[str],
+        max_paths: int,
+        delimiter: bytes = b'\n',
+        timeout: Optional[float] = None,
+        exclusions: Optional[ExclusionFilter] = None,
+        is_path: Optional[Callable[[str], bool]] = None
+    ) -> Tuple[int, List[str], str]:
+        """Run a search command and read up to max_paths paths from it.
+
+        Lines for which is_path returns false, such as progress messages, and
+        excluded paths are dropped as each chunk is decoded, so they never count
+        toward max_paths. Returns the exit code, the paths and stderr.
+        """
+        keep = exclusions.keep if exclusions else None
+        paths: List[str] = []
+        messages = 0
+
+        def on_paths(chunk: List[str]) -> bool:
+            nonlocal messages
+            if is_path is not None:
+                lines = len(chunk)
+                chunk = [line for line in chunk if is_path(line)]
+                messages += lines - len(chunk)
+            paths.extend(keep(chunk) if keep else chunk)
+            return len(paths) >= max_paths
+
+        returncode, stderr, candidates = self._stream_command(cmd, on_paths, delimiter, timeout)
+        excluded = candidates - messages - len(paths)
+        if excluded:
+            METRICS.increment('paths_excluded', excluded)
+        trace = current_trace()
+        if trace is not None:
+            trace.excluded = excluded
+            trace.truncated = trace.truncated or len(paths) > max_paths
+        return returncode, paths[:max_paths], stderr
+
+    def _rank_paths(
+        self,
+        paths: List[str],
+        query: str,
+        max_results: int,
+        match_case: bool,
+        match_regex: bool,
+        stat_cache: Optional[StatCache] = None
+    ) -> List[str]:
+        """Return the max_results most relevant paths, best first.
+
+        Recency is read through the stat cache, so the paths returned are
+        already cached when their results are collected.
+        """
+        cache = STAT_CACHE if stat_cache is None else stat_cache
+
+        def mtime_ns(index: int) -> Optional[int]:
+            (row,), _ = cache.lookup((paths[index],))
+            return None if row[4] == MISSING else row[2]
+
+        ranker = Ranker(query, match_case=match_case, match_regex=match_regex)
+        return [paths[i] for i in ranker.top_k(paths, max_results, mtime_ns)]
+
+    def _append_path(self, batch: ResultBatch, path: str) -> None:
+        """Stat a path and append it to the batch with file information."""
         try:
-            path_obj = Path(path)
-            stat = path_obj.stat()
-            return SearchResult(
-                path=str(path_obj),
-                filename=path_obj.name,
-                extension=path_obj.suffix[1:] if path_obj.suffix else None,
-                size=stat.st_size,
-                created=datetime.fromtimestamp(stat.st_ctime),
-                modified=datetime.fromtimestamp(stat.st_mtime),
-                accessed=datetime.fromtimestamp(stat.st_atime)
-            )
-        except (OSError, ValueError) as e:
+            batch.append_stat(path, os.stat(path))
+        except (OSError, ValueError):
             # If we can't access the file, return basic info
-            return SearchResult(
-                path=str(path),
-                filename=os.path.basename(path)
-            )
+            batch.append(path)
+
+    def _collect_paths(self, paths: List[str], stat_cache: Optional[StatCache] = None) -> ResultBatch:
+        """Build a result batch from a list of paths.
+
+        Metadata of paths returned recently by any search is served from the
+        stat cache instead of being stat'ed again.
+        """
+        batch = ResultBatch()
+        cache = STAT_CACHE if stat_cache is None else stat_cache
+        if not cache:
+            with METRICS.stage('stat'):
+                for path in paths:
+                    self._append_path(batch, path)
+            METRICS.increment('stat_calls', len(paths))
+            return batch
+
+        with METRICS.stage('stat'):
+            rows, hits = cache.lookup(paths)
+            for path, (size, created, modified, accessed, mode) in zip(paths, rows):
+                if mode == MISSING:
+                    batch.append(path)
+                else:
+                    batch.append(path, size, created, modified, accessed)
+        misses = len(paths) - hits
+        if hits:
+            METRICS.increment('stat_cache_hits', hits)
+        if misses:
+            METRICS.increment('stat_calls', misses)
+            METRICS.increment('stat_cache_misses', misses)
+        if METRICS.enabled:
+            METRICS.set_gauge('stat_cache_entries', len(cache))
+            METRICS.set_gauge('stat_cache_bytes', cache.memory_bytes())
+            METRICS.set_gauge('stat_cache_watched_dirs', cache.watched_dirs)
+        return batch
+
+def _spotlight_string(value: str) -> str:
+    """Quote a value for a Spotlight query expression."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _spotlight_time(value: datetime) -> str:
+    """Format a time for a Spotlight query expression, treating naive times as local."""
+    utc = value.astimezone(timezone.utc)
+    return f"$time.iso({utc.strftime('%Y-%m-%dT%H:%M:%SZ')})"
 
 class MacSearchProvider(SearchProvider):
     """macOS search implementation using mdfind."""
-    
+
+    def build_command(
+        self,
+        query: str,
+        match_path: bool = False,
+        match_case: bool = False,
+        live_updates: bool = False,
+        search_directory: Optional[str] = None,
+        literal_query: bool = False,
+        interpret_query: bool = False,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None
+    ) -> List[str]:
+        """Build the mdfind command line, pushing scope and filters down to Spotlight.
+
+        Size and date filters become kMDItemFSSize and kMDItemFSContentChangeDate
+        conditions in the query expression, so Spotlight answers them from its
+        index and non-matching files are never listed or stat'ed.
+        """
+        cmd = ['mdfind', '-0']
+        if search_directory:
+            cmd.extend(['-onlyin', os.path.expanduser(search_directory)])
+        if live_updates:
+            cmd.append('-live')
+
+        filters = []
+        if min_size is not None:
+            filters.append(f"kMDItemFSSize >= {min_size}")
+        if max_size is not None:
+            filters.append(f"kMDItemFSSize <= {max_size}")
+        if modified_after is not None:
+            filters.append(f"kMDItemFSContentChangeDate >= {_spotlight_time(modified_after)}")
+        if modified_before is not None:
+            filters.append(f"kMDItemFSContentChangeDate < {_spotlight_time(modified_before)}")
+
+        if interpret_query:
+            if filters:
+                raise ValueError("Size and date filters cannot be combined with interpret_query")
+            cmd.extend(['-interpret', query])
+        elif literal_query:
+            # A literal query is already a Spotlight query expression
+            cmd.extend(['-literal', ' && '.join([f"({query})", *filters]) if filters else query])
+        elif match_path:
+            if filters:
+                raise ValueError("Size and date filters require a filename search or a literal query")
+            cmd.append(query)
+        elif filters:
+            pattern = query if any(char in query for char in '*?') else f"*{query}*"
+            modifiers = '' if match_case else 'cd'
+            cmd.append(' && '.join([f"kMDItemFSName == {_spotlight_string(pattern)}{modifiers}", *filters]))
+        else:
+            cmd.extend(['-name', query])
+        return cmd
+
     def search_files(
         self,
         query: str,
@@ -83,46 +428,76 @@ class MacSearchProvider(SearchProvider):
         match_case: bool = False,
         match_whole_word: bool = False,
         match_regex: bool = False,
-        sort_by: Optional[int] = None
-    ) -> List[SearchResult]:
-        try:
-            # Build mdfind command
-            cmd = ['mdfind']
-            if match_path:
-                # When matching path, don't use -name
-                cmd.append(query)
-            else:
-                cmd.extend(['-name', query])
-            
-            # Execute search
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                raise RuntimeError(f"mdfind failed: {result.stderr}")
-
-            # Process results
-            paths = result.stdout.splitlines()[:max_results]
-            return [self._convert_path_to_result(path) for path in paths]
-            
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Search failed: {e}")
+        sort_by: Optional[int] = None,
+        rank: bool = False,
+        live_updates: bool = False,
+        search_directory: Optional[str] = None,
+        literal_query: bool = False,
+        interpret_query: bool = False,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        exclusions: Optional[ExclusionFilter] = None,
+        stat_cache: Optional[StatCache] = None
+    ) -> ResultBatch:
+        cmd = self.build_command(
+            query,
+            match_path=match_path,
+            match_case=match_case,
+            live_updates=live_updates,
+            search_directory=search_directory,
+            literal_query=literal_query,
+            interpret_query=interpret_query,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=modified_after,
+            modified_before=modified_before
+        )
+        # A live query never exits, so it collects new matches for a bounded time
+        returncode, paths, stderr = self._stream_paths(
+            cmd,
+            RANK_CANDIDATE_LIMIT if rank else max_results,
+            delimiter=b'\0',
+            timeout=LIVE_UPDATE_SECONDS if live_updates else None,
+            exclusions=exclusions,
+            # Drop the progress messages mdfind interleaves with live results
+            is_path=(lambda line: line.startswith('/')) if live_updates else None
+        )
+        if returncode != 0:
+            raise RuntimeError(f"mdfind failed: {stderr}")
+
+        if rank:
+            paths = self._rank_paths(paths, query, max_results, match_case, match_regex, stat_cache)
+        return self._collect_paths(paths, stat_cache)
+
+    def index_status(self) -> str:
+        return "live (Spotlight)"
 
 class LinuxSearchProvider(SearchProvider):
     """Linux search implementation using locate/plocate."""
 
-    def __init__(self):
-        """Check if locate/plocate is installed and the database is ready."""
+    def __init__(self, matcher: Optional[ParallelMatcher] = None):
+        """Check if locate/plocate is installed and the database is ready.
+
+        Regex searches are matched by matcher against a copy of the database's
+        paths, when given or enabled with EVERYTHING_SEARCH_MATCH_WORKERS,
+        instead of by locate -r.
+        """
         self.locate_cmd = None
         self.locate_type = None
+        self.matcher = matcher if matcher is not None else (ParallelMatcher() if MATCH_WORKERS else None)
+        self._corpus: Optional[SharedCorpus] = None
+        self._corpus_key: Optional[tuple] = None
+        self._corpus_lock = threading.Lock()
 
-        # Check for plocate first (newer version)
-        plocate_check = subprocess.run(['which', 'plocate'], capture_output=True)
-        if plocate_check.returncode == 0:
+        # Check for plocate first (newer version); look up PATH directly rather than forking `which`
+        if shutil.which('plocate'):
             self.locate_cmd = 'plocate'
             self.locate_type = 'plocate'
         else:
             # Check for mlocate
-            mlocate_check = subprocess.run(['which', 'locate'], capture_output=True)
-            if mlocate_check.returncode == 0:
+            if shutil.which('locate'):
                 self.locate_cmd = 'locate'
                 self.locate_type = 'mlocate'
             else:
@@ -137,13 +512,46 @@ class LinuxSearchProvider(SearchProvider):
                     "For mlocate: sudo /etc/cron.daily/mlocate"
                 )
 
-    def _update_database(self):
-        """Update the locate database."""
-        if self.locate_type == 'plocate':
-            subprocess.run(['sudo', 'updatedb'], check=True)
-        else:  # mlocate
-            subprocess.run(['sudo', '/etc/cron.daily/mlocate'], check=True)
-    
+    def _locate_options(
+        self,
+        match_case: bool = False,
+        match_regex: bool = False,
+        ignore_case: Optional[bool] = None,
+        regex_search: Optional[bool] = None,
+        existing_files: bool = False,
+        **_
+    ) -> Tuple[bool, bool, bool]:
+        """Resolve the options that shape a locate invocation.
+
+        ignore_case and regex_search are the linux_params spellings of
+        match_case and match_regex, and take precedence when given.
+        """
+        if ignore_case is not None:
+            match_case = not ignore_case
+        if regex_search is not None:
+            match_regex = regex_search
+        return match_case, match_regex, existing_files
+
+    def _locate_command(
+        self,
+        match_case: bool,
+        match_regex: bool,
+        existing_files: bool,
+        count: bool = False,
+        databases: Optional[List[str]] = None
+    ) -> List[str]:
+        cmd = [self.locate_cmd]
+        if databases:
+            cmd.extend(['-d', ':'.join(databases)])
+        if not match_case:
+            cmd.append('-i')
+        if match_regex:
+            cmd.append('--regex' if self.locate_type == 'mlocate' else '-r')
+        if existing_files:
+            cmd.append('-e')
+        cmd.append('-c' if count else '-0')
+        return cmd
+
     def search_files(
         self,
         query: str,
@@ -152,53 +560,239 @@ class LinuxSearchProvider(SearchProvider):
         match_case: bool = False,
         match_whole_word: bool = False,
         match_regex: bool = False,
-        sort_by: Optional[int] = None
-    ) -> List[SearchResult]:
+        sort_by: Optional[int] = None,
+        rank: bool = False,
+        exclusions: Optional[ExclusionFilter] = None,
+        stat_cache: Optional[StatCache] = None,
+        ignore_case: Optional[bool] = None,
+        regex_search: Optional[bool] = None,
+        existing_files: bool = False,
+        count_only: bool = False,
+        databases: Optional[List[str]] = None
+    ) -> ResultBatch:
+        """Search the locate database, streaming its NUL-delimited output.
+
+        A count-only search returns an empty batch with total set; with
+        exclusions, matches are streamed and counted here instead of by -c.
+        databases replaces the system database, as for the server's owned
+        index.
+        """
+        match_case, match_regex, existing_files = self._locate_options(
+            match_case, match_regex, ignore_case, regex_search, existing_files
+        )
+        count_in_locate = count_only and not exclusions
+        pattern = self._python_regex(query) if match_regex and self.matcher is not None else None
+        if pattern is not None and not count_in_locate:
+            corpus = self._load_corpus(databases)
+            if corpus is not None:
+                spec = MatchSpec(pattern, match_case, match_regex, exclusions, existing_files)
+                paths = self.matcher.match(corpus, spec, self._path_limit(max_results, rank, count_only))
+                return self._finish(paths, query, max_results, match_case, match_regex, rank, count_only, stat_cache)
+
+        cmd = self._locate_command(match_case, match_regex, existing_files, count=count_in_locate, databases=databases)
+        cmd.append(query)
+
         try:
-            # Build locate command
-            cmd = [self.locate_cmd]
-            if not match_case:
-                cmd.append('-i')
-            if match_regex:
-                cmd.append('--regex' if self.locate_type == 'mlocate' else '-r')
-            cmd.append(query)
-            
-            # Execute search
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                error_msg = result.stderr.lower()
-                if "no such file or directory" in error_msg or "database" in error_msg:
-                    raise RuntimeError(
-                        f"The {self.locate_type} database needs to be created. "
-                        f"Please run: sudo updatedb"
-                    )
-                raise RuntimeError(f"{self.locate_cmd} failed: {result.stderr}")
-
-            # Process results
-            paths = result.stdout.splitlines()[:max_results]
-            return [self._convert_path_to_result(path) for path in paths]
-            
+            if count_in_locate:
+                returncode, stdout, stderr = self._run_command(cmd)
+                self._check_returncode(returncode, stderr)
+                return ResultBatch(total=int(stdout.strip() or 0))
+
+            returncode, paths, stderr = self._stream_paths(
+                cmd, self._path_limit(max_results, rank, count_only), delimiter=b'\0', exclusions=exclusions
+            )
+            self._check_returncode(returncode, stderr)
+        except FileNotFoundError:
+            self._missing_command()
+
+        return self._finish(paths, query, max_results, match_case, match_regex, rank, count_only, stat_cache)
+
+    def batch_key(self, **search) -> Optional[Hashable]:
+        """Searches with the same case and existence options can share one mlocate run.
+
+        plocate prints only entries matching all of its patterns, so its
+        searches are not merged. Nor are regex searches: locate matches POSIX
+        regular expressions, and routing its output with Python's re could
+        disagree with it.
+        """
+        if self.locate_type != 'mlocate':
+            return None
+        options = self._locate_options(**search)
+        _, match_regex, _ = options
+        return None if match_regex else options
+
+    def search_merged(self, searches: List[dict], stat_cache: Optional[StatCache] = None) -> List[ResultBatch]:
+        """Answer several searches from one locate run over the database.
+
+        mlocate prints entries matching any of its patterns, so all queries are
+        passed together and each path is routed to the searches it matches,
+        using the same substring and glob rules as locate. The run stops once
+        every search has all the paths it needs. Searches batch_key does not
+        merge are run one by one.
+        """
+        if len(searches) == 1 or self.batch_key(**searches[0]) is None:
+            return super().search_merged(searches, stat_cache)
+        match_case, match_regex, existing_files = self._locate_options(**searches[0])
+        cmd = self._locate_command(match_case, match_regex, existing_files, databases=searches[0].get('databases'))
+        cmd.extend(search['query'] for search in searches)
+
+        # Without match_case, queries are matched against paths lowercased once per chunk
+        fold_case = not match_case
+        routes = []
+        for search in searches:
+            exclusions = search.get('exclusions')
+            query = search['query']
+            routes.append((
+                compile_query(query.lower(), match_case=True) if fold_case else
+                compile_query(query, match_case=True),
+                exclusions.excluded if exclusions else None,
+                self._path_limit(search.get('max_results', 100), search.get('rank', False), search.get('count_only', False)),
+                []
+            ))
+
+        def on_paths(chunk: List[str]) -> bool:
+            done = True
+            texts = [path.lower() for path in chunk] if fold_case else chunk
+            for matches, excluded, limit, paths in routes:
+                if len(paths) < limit:
+                    for path, text in zip(chunk, texts):
+                        if matches(text) and not (excluded and excluded(path)):
+                            paths.append(path)
+                            if len(paths) >= limit:
+                                break
+                    done = done and len(paths) >= limit
+            return done
+
+        try:
+            returncode, stderr, _ = self._stream_command(cmd, on_paths, delimiter=b'\0')
+            self._check_returncode(returncode, stderr)
         except FileNotFoundError:
+            self._missing_command()
+        METRICS.increment('merged_searches', len(searches))
+
+        return [
+            self._finish(
+                paths, search['query'], search.get('max_results', 100), match_case, match_regex,
+                search.get('rank', False), search.get('count_only', False), stat_cache
+            )
+            for search, (_, _, _, paths) in zip(searches, routes)
+        ]
+
+    def _python_regex(self, query: str) -> Optional[str]:
+        """Translate a locate regex for the parallel matcher, or None to leave it to locate.
+
+        mlocate's --regex takes extended expressions and plocate's -r basic
+        ones. Patterns that cannot be translated, or that Python rejects, are
+        matched by locate, which also reports genuine syntax errors.
+        """
+        try:
+            pattern = posix_to_python(query, extended=self.locate_type == 'mlocate')
+            re.compile(pattern)
+        except (ValueError, re.error):
+            return None
+        return pattern
+
+    def _load_corpus(self, databases: Optional[List[str]] = None) -> Optional[SharedCorpus]:
+        """Return the paths of the locate databases as a shared corpus, reloading it after they change.
+
+        The corpus is read with one locate run over every entry. Returns None
+        if a database cannot be found, leaving the search to locate.
+        """
+        try:
+            key = tuple(
+                (database, os.stat(database).st_mtime_ns)
+                for database in databases or [SYSTEM_DATABASES[self.locate_type]]
+            )
+        except OSError:
+            return None
+        with self._corpus_lock:
+            if self._corpus_key != key:
+                cmd = [self.locate_cmd]
+                if databases:
+                    cmd.extend(['-d', ':'.join(databases)])
+                cmd.extend(['-0', '/'])
+
+                def fill(f) -> None:
+                    returncode = subprocess.run(cmd, stdout=f, stderr=subprocess.PIPE).returncode
+                    if returncode not in (0, 1):
+                        raise RuntimeError(f"{self.locate_cmd} exited with status {returncode} reading the database")
+
+                try:
+                    with METRICS.stage('corpus_load'):
+                        corpus = SharedCorpus.create(fill)
+                except (OSError, RuntimeError):
+                    return None
+                METRICS.increment('subprocesses_spawned')
+                METRICS.increment('corpus_loads')
+                # A search still using the old corpus keeps its file until it finishes
+                self._corpus, self._corpus_key = corpus, key
+            return self._corpus
+
+    @staticmethod
+    def _path_limit(max_results: int, rank: bool, count_only: bool) -> int:
+        """Number of paths to read from locate for one search."""
+        if count_only:
+            return sys.maxsize
+        if rank:
+            return RANK_CANDIDATE_LIMIT
+        return max_results
+
+    def _finish(
+        self,
+        paths: List[str],
+        query: str,
+        max_results: int,
+        match_case: bool,
+        match_regex: bool,
+        rank: bool,
+        count_only: bool,
+        stat_cache: Optional[StatCache]
+    ) -> ResultBatch:
+        """Turn the paths read for one search into its result batch."""
+        if count_only:
+            return ResultBatch(total=len(paths))
+        if rank:
+            paths = self._rank_paths(paths, query, max_results, match_case, match_regex, stat_cache)
+        return self._collect_paths(paths[:max_results], stat_cache)
+
+    def index_status(self) -> str:
+        return system_index_status(self.locate_type)
+
+    def _missing_command(self) -> None:
+        raise RuntimeError(
+            f"The {self.locate_cmd} command disappeared. Please reinstall:\n"
+            "Ubuntu/Debian: sudo apt-get install plocate\n"
+            "              or\n"
+            "              sudo apt-get install mlocate\n"
+            "Fedora: sudo dnf install mlocate"
+        )
+
+    def _check_returncode(self, returncode: int, stderr: str) -> None:
+        """Raise for a failed locate run. Exit status 1 without a message only means nothing matched."""
+        if returncode == 0 or (returncode == 1 and not stderr.strip()):
+            return
+        error_msg = stderr.lower()
+        if "no such file or directory" in error_msg or "database" in error_msg:
             raise RuntimeError(
-                f"The {self.locate_cmd} command disappeared. Please reinstall:\n"
-                "Ubuntu/Debian: sudo apt-get install plocate\n"
-                "              or\n"
-                "              sudo apt-get install mlocate\n"
-                "Fedora: sudo dnf install mlocate"
+                f"The {self.locate_type} database needs to be created. "
+                f"Please run: sudo updatedb"
             )
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Search failed: {e}")
+        raise RuntimeError(f"{self.locate_cmd} failed: {stderr}")
 
 
 class WindowsSearchProvider(SearchProvider):
     """Windows search implementation using Everything SDK."""
     
-    def __init__(self):
-        """Initialize Everything SDK."""
-        import os
-        from .everything_sdk import EverythingSDK
-        dll_path = os.getenv('EVERYTHING_SDK_PATH', 'D:\\dev\\tools\\Everything-SDK\\dll\\Everything64.dll')
-        self.everything_sdk = EverythingSDK(dll_path)
+    def __init__(self, everything_sdk=None):
+        """Initialize Everything SDK, unless an SDK instance is supplied."""
+        if everything_sdk is None:
+            from .everything_sdk import EverythingSDK
+            dll_path = os.getenv('EVERYTHING_SDK_PATH', 'D:\\dev\\tools\\Everything-SDK\\dll\\Everything64.dll')
+            everything_sdk = EverythingSDK(dll_path)
+        self.everything_sdk = everything_sdk
+
+    def index_status(self) -> str:
+        return "live (Everything service)"
 
     def search_files(
         self,
@@ -208,20 +802,54 @@ class WindowsSearchProvider(SearchProvider):
         match_case: bool = False,
         match_whole_word: bool = False,
         match_regex: bool = False,
-        sort_by: Optional[int] = None
-    ) -> List[SearchResult]:
+        sort_by: Optional[int] = None,
+        rank: bool = False,
+        exclusions: Optional[ExclusionFilter] = None,
+        stat_cache: Optional[StatCache] = None
+    ) -> ResultBatch:
+        # Everything returns sizes and dates itself, so stat_cache is not needed
         # Replace double backslashes with single backslashes
         query = query.replace("\\\\", "\\")
         # If the query.query contains forward slashes, replace them with backslashes
         query = query.replace("/", "\\")
 
-        return self.everything_sdk.search_files(
-            query=query,
-            max_results=max_results,
+        fetch = max_results
+        if rank:
+            fetch = max(max_results, min(RANK_CANDIDATE_LIMIT, EVERYTHING_RANK_CANDIDATES))
+        search = query
+        post_filter = None
+        if exclusions:
+            if match_regex:
+                # The whole search string is one regex, so exclusions are applied here instead
+                post_filter = exclusions
+                fetch = max(fetch, min(max_results * EXCLUSION_OVERFETCH, EVERYTHING_RANK_CANDIDATES))
+            else:
+                # Everything drops excluded paths itself, before they count toward max_results
+                search = f"{query} {exclusions.everything_terms()}"
+
+        results = self.everything_sdk.search_files(
+            query=search,
+            max_results=fetch,
             match_path=match_path,
             match_case=match_case,
             match_whole_word=match_whole_word,
             match_regex=match_regex,
             sort_by=sort_by
         )
+        if post_filter is not None:
+            excluded = post_filter.excluded
+            indices = [i for i, path in enumerate(results.paths) if not excluded(path)]
+            METRICS.increment('paths_excluded', len(results) - len(indices))
+            results = results.take(indices if rank else indices[:max_results])
+        if rank:
+            # Everything already returns dates, so recency needs no extra I/O
+            modified = results.modified
+            ranker = Ranker(query, match_case=match_case, match_regex=match_regex, sep='\\')
+            indices = ranker.top_k(
+                results.paths,
+                max_results,
+                lambda i: modified[i] if modified[i] != UNKNOWN else None
+            )
+            results = results.take(indices)
+        return results
     
\ No newline at end of file
@@ -1,16 +1,38 @@
 """MCP server implementation for cross-platform file search."""
 
+import asyncio
+import functools
 import json
 import platform
 import sys
-from typing import List
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import TextContent, Tool, Resource, ResourceTemplate, Prompt
-from pydantic import BaseModel, Field
+from pydantic import AnyUrl, BaseModel, Field
 
-from .platform_search import UnifiedSearchQuery, WindowsSpecificParams, build_search_command
-from .search_interface import SearchProvider
+from .exclusions import build_filter
+from .index_refresh import OwnedIndex, format_age
+from .metrics import METRICS, METRICS_RESOURCE_URI, QueryTrace, tracing
+from .platform_search import (
+    CURRENT_PLATFORM,
+    ChangesQuery,
+    MAX_BATCH_QUERIES,
+    OutputFormat,
+    SubscribeQuery,
+    UnifiedSearchQuery,
+    UnsubscribeQuery,
+    WindowsSpecificParams,
+    build_search_command
+)
+from .rendering import format_changes, format_results, render_tree
+from .scheduler import PRIORITY_NAMES, Scheduler, SchedulerBusy, classify
+from .search_interface import ResultBatch, SearchProvider
+from .slow_query_log import SLOW_QUERY_LOG
+from .subscriptions import Subscription, SubscriptionManager
 
 class SearchQuery(BaseModel):
     """Model for search query parameters."""
@@ -44,50 +66,26 @@ class SearchQuery(BaseModel):
         description="Sort order for results (Note: Not all sort options available on all platforms)"
     )
 
-async def serve() -> None:
-    """Run the server."""
-    current_platform = platform.system().lower()
-    search_provider = SearchProvider.get_provider()
-    
-    server = Server("universal-search")
-
-    @server.list_resources()
-    async def list_resources() -> list[Resource]:
-        """Return an empty list since this server doesn't provide any resources."""
-        return []
-
-    @server.list_resource_templates()
-    async def list_resource_templates() -> list[ResourceTemplate]:
-        """Return an empty list since this server doesn't provide any resource templates."""
-        return []
-
-    @server.list_prompts()
-    async def list_prompts() -> list[Prompt]:
-        """Return an empty list since this server doesn't provide any prompts."""
-        return []
+PLATFORM_INFO = {
+    'windows': "Using Everything SDK with full search capabilities",
+    'darwin': "Using mdfind (Spotlight) with native macOS search capabilities",
+    'linux': "Using locate with Unix-style search capabilities"
+}
 
-    @server.list_tools()
-    async def list_tools() -> List[Tool]:
-        """Return the search tool with platform-specific documentation and schema."""
-        platform_info = {
-            'windows': "Using Everything SDK with full search capabilities",
-            'darwin': "Using mdfind (Spotlight) with native macOS search capabilities",
-            'linux': "Using locate with Unix-style search capabilities"
-        }
-
-        syntax_docs = {
-            'darwin': """macOS Spotlight (mdfind) Search Syntax:
+SYNTAX_DOCS = {
+    'darwin': """macOS Spotlight (mdfind) Search Syntax:
                 
 Basic Usage:
-- Simple text search: Just type the words you're looking for
+- Filename search: Just type part of the filename (mdfind -name)
 - Phrase search: Use quotes ("exact phrase")
-- Filename search: -name "filename"
-- Directory scope: -onlyin /path/to/dir
 
-Special Parameters:
-- Live updates: -live
-- Literal search: -literal
-- Interpreted search: -interpret
+Parameters (mac_params):
+- search_directory: Limit the search to a directory (-onlyin)
+- live_updates: Also collect matches that appear in the next few seconds (-live)
+- literal_query: Query is a raw Spotlight query expression (-literal)
+- interpret_query: Query is interpreted as if typed in the Spotlight menu (-interpret)
+- min_size / max_size: File size bounds in bytes
+- modified_after / modified_before: ISO 8601 modification time bounds
 
 Metadata Attributes:
 - kMDItemDisplayName
@@ -96,7 +94,7 @@ Metadata Attributes:
 - kMDItemFSSize
 - And many more OS X metadata attributes""",
 
-            'linux': """Linux Locate Search Syntax:
+    'linux': """Linux Locate Search Syntax:
 
 Basic Usage:
 - Simple pattern: locate filename
@@ -115,7 +113,7 @@ Examples:
 - locate -r "/home/.*\.txt$"
 - locate -c "*.doc"
 """,
-            'windows': """Search for files and folders using Everything SDK.
+    'windows': """Search for files and folders using Everything SDK.
                 
 Features:
 - Fast file and folder search across all indexed drives
@@ -198,31 +196,287 @@ Examples:
 3. Find files in specific folder:
    path:C:\Projects *.js
 """
-        }
+}
+
+SUBSCRIBE_DESCRIPTION = """Register a standing query and get pushed new matches instead of polling search.
+
+The server watches the given root directories (inotify on Linux, periodic rescans elsewhere)
+and matches every new or renamed entry against the query, using the same rules as locate:
+a plain pattern matches anywhere in the full path, a glob must match the whole path, and
+match_regex enables regular expressions.
+
+Hits are collected for debounce_ms and then sent as a logging notification from the
+"everything-search.subscriptions" logger, with data:
+  {"subscription_id": ..., "query": ..., "paths": [...], "more": <paths not included>}
+
+Returns the subscription ID. The number of active subscriptions is capped; use
+unsubscribe to free a slot.
+"""
+
+BATCH_DESCRIPTION = f"""Run several searches in one call instead of one search call per query.
+
+Each entry of "queries" takes the same arguments as the search tool ("base" plus
+platform-specific parameters); a plain string is taken as the query text. Up to
+{MAX_BATCH_QUERIES} queries run concurrently and files found by more than one query are only
+stat'ed once. On Linux, queries with the same case, regex and existing-file options
+are answered by a single pass over the locate database.
+
+Returns one text item per query, in order, each starting with "Query N: <query>".
+A failing query reports its error in its own item without failing the batch."""
+
+CHANGES_DESCRIPTION = """List files and directories added, removed or modified under the server's own index roots.
+
+Needs the owned index (Linux, EVERYTHING_SEARCH_INDEX_ROOTS). Each rebuild of a root
+records a snapshot of its paths and modification times, and the changes between
+snapshots are kept in a journal, so this answers without scanning the file system.
+
+Give either snapshot_id, from the "Snapshot" line of an earlier response, to get
+everything since that call, or since, a time. Changes are as of the latest snapshot;
+set max_staleness to rebuild roots with older unrecorded changes first."""
 
-        description = f"""Universal file search tool for {platform.system()}
+@functools.lru_cache(maxsize=None)
+def _tool_list() -> tuple:
+    """Build the tool definitions once; the description and schema never change at runtime."""
+    description = f"""Universal file search tool for {platform.system()}
 
 Current Implementation:
-{platform_info.get(current_platform, "Unknown platform")}
+{PLATFORM_INFO.get(CURRENT_PLATFORM, "Unknown platform")}
 
 Search Syntax Guide:
-{syntax_docs.get(current_platform, "Platform-specific syntax guide not available")}
+{SYNTAX_DOCS.get(CURRENT_PLATFORM, "Platform-specific syntax guide not available")}
 """
 
+    return (
+        Tool(
+            name="search",
+            description=description,
+            inputSchema=UnifiedSearchQuery.get_schema_for_platform()
+        ),
+        Tool(
+            name="search_batch",
+            description=BATCH_DESCRIPTION,
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "queries": {
+                        "type": "array",
+                        "items": UnifiedSearchQuery.get_schema_for_platform(),
+                        "minItems": 1,
+                        "maxItems": MAX_BATCH_QUERIES,
+                        "description": "Searches to run, each with the search tool's arguments"
+                    }
+                },
+                "required": ["queries"]
+            }
+        ),
+        Tool(
+            name="subscribe",
+            description=SUBSCRIBE_DESCRIPTION,
+            inputSchema=SubscribeQuery.model_json_schema()
+        ),
+        Tool(
+            name="unsubscribe",
+            description="Stop a standing query created with the subscribe tool.",
+            inputSchema=UnsubscribeQuery.model_json_schema()
+        ),
+        Tool(
+            name="changes_since",
+            description=CHANGES_DESCRIPTION,
+            inputSchema=ChangesQuery.model_json_schema()
+        ),
+    )
+
+# Scheduler queue used for each platform's search backend
+BACKENDS = {'windows': 'everything', 'darwin': 'mdfind', 'linux': 'locate'}
+
+def create_server(
+    search_provider: Optional[SearchProvider] = None,
+    subscriptions: Optional[SubscriptionManager] = None,
+    scheduler: Optional[Scheduler] = None,
+    owned_index: Optional[OwnedIndex] = None
+) -> Server:
+    """Create the MCP server, using the platform's search provider unless one is given.
+
+    The platform provider is created on the first search rather than at startup,
+    so initialize and list_tools never wait on backend detection. On Linux,
+    an owned index replaces the system locate database for every search.
+    """
+    current_platform = CURRENT_PLATFORM
+    backend = BACKENDS.get(current_platform, current_platform)
+
+    provider_lock = threading.Lock()
+
+    def get_search_provider() -> SearchProvider:
+        # Called from worker threads, so two first searches must not both detect the backend
+        nonlocal search_provider
+        if search_provider is None:
+            with provider_lock:
+                if search_provider is None:
+                    search_provider = SearchProvider.get_provider()
+        return search_provider
+
+    if subscriptions is None:
+        subscriptions = SubscriptionManager()
+    if scheduler is None:
+        scheduler = Scheduler()
+    
+    server = Server("universal-search")
+
+    @server.list_resources()
+    async def list_resources() -> list[Resource]:
+        """Return the metrics resource."""
         return [
-            Tool(
-                name="search",
-                description=description,
-                inputSchema=UnifiedSearchQuery.get_schema_for_platform()
+            Resource(
+                uri=METRICS_RESOURCE_URI,
+                name="Search metrics",
+                description="Per-stage latency histograms and counters (enable with EVERYTHING_SEARCH_METRICS=1)",
+                mimeType="application/json"
             )
         ]
 
+    @server.read_resource()
+    async def read_resource(uri: AnyUrl) -> str:
+        if str(uri) != METRICS_RESOURCE_URI:
+            raise ValueError(f"Unknown resource: {uri}")
+        return METRICS.render_json()
+
+    @server.list_resource_templates()
+    async def list_resource_templates() -> list[ResourceTemplate]:
+        """Return an empty list since this server doesn't provide any resource templates."""
+        return []
+
+    @server.list_prompts()
+    async def list_prompts() -> list[Prompt]:
+        """Return an empty list since this server doesn't provide any prompts."""
+        return []
+
+    @server.list_tools()
+    async def list_tools() -> List[Tool]:
+        """Return the search tool with platform-specific documentation and schema."""
+        return list(_tool_list())
+
     @server.call_tool()
     async def call_tool(name: str, arguments: dict) -> List[TextContent]:
-        if name != "search":
+        if name == "subscribe":
+            return await _subscribe(arguments)
+        if name == "unsubscribe":
+            return _unsubscribe(arguments)
+        if name == "changes_since":
+            return await _changes_since(arguments)
+        if name not in ("search", "search_batch"):
             raise ValueError(f"Unknown tool: {name}")
 
+        start = time.perf_counter()
+        METRICS.increment('searches' if name == "search" else 'search_batches')
         try:
+            if name == "search_batch":
+                return await _run_batch(arguments)
+            return await _run_search(arguments)
+        except Exception as e:
+            METRICS.increment('search_errors')
+            return [TextContent(
+                type="text",
+                text=f"Search failed: {str(e)}"
+            )]
+        finally:
+            METRICS.observe('total', time.perf_counter() - start)
+            METRICS.flush()
+
+    async def _subscribe(arguments: dict) -> List[TextContent]:
+        try:
+            params = SubscribeQuery(**arguments)
+            session = server.request_context.session
+
+            async def notify(subscription: Subscription, paths: List[str], more: int) -> None:
+                await session.send_log_message(
+                    level="info",
+                    data={
+                        "subscription_id": subscription.id,
+                        "query": subscription.query,
+                        "paths": paths,
+                        "more": more
+                    },
+                    logger="everything-search.subscriptions"
+                )
+
+            subscription = await subscriptions.subscribe(
+                params.query,
+                params.roots,
+                notify,
+                match_case=params.match_case,
+                match_regex=params.match_regex,
+                debounce_ms=params.debounce_ms,
+                exclude=params.exclude,
+                default_excludes=params.default_excludes
+            )
+        except Exception as e:
+            return [TextContent(
+                type="text",
+                text=f"Subscribe failed: {str(e)}"
+            )]
+        text = (
+            f"Subscription ID: {subscription.id}\n"
+            f"Watching: {', '.join(subscription.roots)}\n"
+            f"Watcher: {type(subscription.watcher).__name__}"
+        )
+        unwatched = getattr(subscription.watcher, 'unwatched', 0)
+        if unwatched:
+            text += (
+                f"\nNot watched: {unwatched} directories beyond the inotify watch limit, "
+                "with everything below them; new entries there will not be reported"
+            )
+        return [TextContent(type="text", text=text)]
+
+    def _unsubscribe(arguments: dict) -> List[TextContent]:
+        params = UnsubscribeQuery(**arguments)
+        if subscriptions.unsubscribe(params.subscription_id):
+            text = f"Unsubscribed {params.subscription_id}"
+        else:
+            text = f"No active subscription {params.subscription_id}"
+        return [TextContent(type="text", text=text)]
+
+    async def _changes_since(arguments: dict) -> List[TextContent]:
+        METRICS.increment('change_queries')
+        try:
+            params = ChangesQuery(**arguments)
+            tracker = owned_index.tracker if owned_index else None
+            if tracker is None:
+                raise ValueError(
+                    "Change tracking needs the server's own index; set EVERYTHING_SEARCH_INDEX_ROOTS (Linux)"
+                )
+            refreshed = await owned_index.ensure_fresh(params.max_staleness)
+            with METRICS.stage('changes'):
+                changes = tracker.changes_since(
+                    params.snapshot_id, params.since.timestamp() if params.since else None, params.root
+                )
+                text = format_changes(changes, params.max_results)
+        except Exception as e:
+            return [TextContent(
+                type="text",
+                text=f"Changes query failed: {str(e)}"
+            )]
+
+        now = time.time()
+        notes = [
+            f"Tracking of {root} started {format_age(now - started)} ago; earlier changes there are not known"
+            for root, started in sorted(changes.partial.items())
+        ]
+        pending = [index.root for index in owned_index.indexes if not tracker.has_snapshot(index.root)]
+        if pending:
+            notes.append(f"Not snapshotted yet: {', '.join(pending)}")
+        return [TextContent(
+            type="text",
+            text="\n".join([
+                text,
+                "",
+                *notes,
+                f"Snapshot: {changes.snapshot_id}",
+                f"Index age: {owned_index.describe(refreshed)}",
+            ])
+        )]
+
+    def _parse_query(arguments: dict) -> UnifiedSearchQuery:
+        with METRICS.stage('parse'):
             # Parse and validate inputs
             base_params = {}
             windows_params = {}
@@ -241,76 +495,253 @@ Search Syntax Guide:
                 else:
                     raise ValueError("'base' parameter must be a string or dictionary")
 
-            # Handle Windows-specific parameters
-            if 'windows_params' in arguments:
-                if isinstance(arguments['windows_params'], str):
+            # Handle platform-specific parameters
+            platform_params = {'windows_params': windows_params}
+            for key in ('windows_params', 'mac_params', 'linux_params'):
+                if key not in arguments:
+                    continue
+                if isinstance(arguments[key], str):
                     try:
-                        windows_params = json.loads(arguments['windows_params'])
+                        platform_params[key] = json.loads(arguments[key])
                     except json.JSONDecodeError:
-                        raise ValueError("Invalid JSON in windows_params")
-                elif isinstance(arguments['windows_params'], dict):
+                        raise ValueError(f"Invalid JSON in {key}")
+                elif isinstance(arguments[key], dict):
                     # If already a dict, use directly
-                    windows_params = arguments['windows_params']
+                    platform_params[key] = arguments[key]
                 else:
-                    raise ValueError("'windows_params' must be a string or dictionary")
+                    raise ValueError(f"'{key}' must be a string or dictionary")
 
             # Combine parameters
             query_params = {
                 **base_params,
-                'windows_params': windows_params
+                **platform_params
             }
 
             # Create unified query
-            query = UnifiedSearchQuery(**query_params)
-
-            if current_platform == "windows":
-                # Use Everything SDK directly
-                platform_params = query.windows_params or WindowsSpecificParams()
-                results = search_provider.search_files(
-                    query=query.query,
-                    max_results=query.max_results,
-                    match_path=platform_params.match_path,
-                    match_case=platform_params.match_case,
-                    match_whole_word=platform_params.match_whole_word,
-                    match_regex=platform_params.match_regex,
-                    sort_by=platform_params.sort_by
-                )
-            else:
-                # Use command-line tools (mdfind/locate)
-                platform_params = None
-                if current_platform == 'darwin':
-                    platform_params = query.mac_params or {}
-                elif current_platform == 'linux':
-                    platform_params = query.linux_params or {}
-
-                results = search_provider.search_files(
-                    query=query.query,
-                    max_results=query.max_results,
-                    **platform_params.dict() if platform_params else {}
-                )
-            
-            return [TextContent(
-                type="text",
-                text="\n".join([
-                    f"Path: {r.path}\n"
-                    f"Filename: {r.filename}"
-                    f"{f' ({r.extension})' if r.extension else ''}\n"
-                    f"Size: {r.size:,} bytes\n"
-                    f"Created: {r.created if r.created else 'N/A'}\n"
-                    f"Modified: {r.modified if r.modified else 'N/A'}\n"
-                    f"Accessed: {r.accessed if r.accessed else 'N/A'}\n"
-                    for r in results
-                ])
-            )]
-        except Exception as e:
-            return [TextContent(
+            return UnifiedSearchQuery(**query_params)
+
+    async def _run_search(arguments: dict) -> List[TextContent]:
+        query = _parse_query(arguments)
+        trace = QueryTrace(
+            query=query.query,
+            params=query.model_dump(exclude={'query'}, exclude_none=True)
+        ) if SLOW_QUERY_LOG.enabled else None
+        priority = classify(query, current_platform)
+        start = time.perf_counter()
+        with tracing(trace) if trace else nullcontext():
+            try:
+                refreshed = await owned_index.ensure_fresh(query.max_staleness) if owned_index else []
+                results, wait = await scheduler.run(backend, priority, _search, query)
+            except Exception as e:
+                if trace:
+                    _record_failure(trace, start, e)
+                raise
+            with METRICS.stage('format'):
+                text = _render(query, results)
+            status = _status(wait, priority, refreshed, max_staleness=query.max_staleness)
+            text = f"{text}\n\n{status}" if text else status
+        METRICS.increment('results_returned', len(results))
+        if trace:
+            trace.returned = len(results)
+            SLOW_QUERY_LOG.record(trace, time.perf_counter() - start)
+
+        return [TextContent(
+            type="text",
+            text=text
+        )]
+
+    async def _run_batch(arguments: dict) -> List[TextContent]:
+        """Run a list of searches concurrently, returning one text item per query.
+
+        Searches the provider can merge (same batch_key) share one backend pass.
+        Each search or merged group is scheduled like a single search, but the
+        batch is admitted as a whole.
+        """
+        items = arguments.get('queries')
+        if not isinstance(items, list) or not items:
+            raise ValueError("'queries' must be a non-empty list")
+        if len(items) > MAX_BATCH_QUERIES:
+            raise ValueError(f"At most {MAX_BATCH_QUERIES} queries are accepted per batch")
+        METRICS.increment('batch_queries', len(items))
+
+        texts: List[Optional[str]] = [None] * len(items)
+        queries: Dict[int, UnifiedSearchQuery] = {}
+        for index, item in enumerate(items):
+            try:
+                queries[index] = _parse_query(item if isinstance(item, dict) else {'base': item})
+            except Exception as e:
+                texts[index] = f"Search failed: {str(e)}"
+
+        staleness = [query.max_staleness for query in queries.values() if query.max_staleness is not None]
+        refreshed = await owned_index.ensure_fresh(min(staleness, default=None)) if owned_index else []
+        provider = get_search_provider()
+        searches = {index: _search_arguments(query) for index, query in queries.items()}
+        groups: Dict[Any, List[int]] = {}
+        for index, search in searches.items():
+            key = provider.batch_key(**search)
+            groups.setdefault(index if key is None else ('merged', key), []).append(index)
+
+        def job_trace(indices: List[int]) -> Optional[QueryTrace]:
+            if not SLOW_QUERY_LOG.enabled:
+                return None
+            if len(indices) == 1:
+                query = queries[indices[0]]
+                return QueryTrace(query=query.query, params=query.model_dump(exclude={'query'}, exclude_none=True))
+            # A merged group is one backend pass, so it is logged as one entry
+            return QueryTrace(
+                query=' | '.join(queries[index].query for index in indices),
+                params={'merged': [queries[index].model_dump(exclude_none=True) for index in indices]}
+            )
+
+        jobs = list(groups.values())
+        try:
+            scheduler.admit(backend, len(jobs))
+        except SchedulerBusy as e:
+            for indices in jobs:
+                trace = job_trace(indices)
+                if trace:
+                    _record_failure(trace, time.perf_counter(), e)
+            raise
+
+        def search_group(indices: List[int]) -> List[ResultBatch]:
+            with METRICS.stage('search'):
+                if len(indices) == 1:
+                    return [provider.search_files(**searches[indices[0]])]
+                return provider.search_merged([searches[index] for index in indices])
+
+        async def run_job(indices: List[int]) -> None:
+            priority = max(classify(queries[index], current_platform) for index in indices)
+            trace = job_trace(indices)
+            start = time.perf_counter()
+            with tracing(trace) if trace else nullcontext():
+                try:
+                    batches, wait = await scheduler.run(backend, priority, search_group, indices, admitted=True)
+                except Exception as e:
+                    METRICS.increment('search_errors')
+                    for index in indices:
+                        texts[index] = f"Search failed: {str(e)}"
+                    if trace:
+                        _record_failure(trace, start, e)
+                    return
+                note = ''
+                if len(indices) > 1:
+                    note = f"; one backend pass shared with queries {', '.join(str(i + 1) for i in indices)}"
+                for index, results in zip(indices, batches):
+                    with METRICS.stage('format'):
+                        text = _render(queries[index], results)
+                    METRICS.increment('results_returned', len(results))
+                    status = _status(wait, priority, refreshed, note, queries[index].max_staleness)
+                    texts[index] = f"{text}\n\n{status}" if text else status
+            if trace:
+                trace.returned = sum(len(results) for results in batches)
+                SLOW_QUERY_LOG.record(trace, time.perf_counter() - start)
+
+        await asyncio.gather(*(run_job(indices) for indices in jobs))
+        return [
+            TextContent(
                 type="text",
-                text=f"Search failed: {str(e)}"
-            )]
+                text=f"Query {index + 1}: {queries[index].query if index in queries else items[index]}\n\n{text}"
+            )
+            for index, text in enumerate(texts)
+        ]
+
+    def _record_failure(trace: QueryTrace, start: float, error: Exception) -> None:
+        """Log a search that was rejected or failed, whatever its duration."""
+        trace.outcome = 'rejected' if isinstance(error, SchedulerBusy) else 'error'
+        trace.error = str(error)
+        SLOW_QUERY_LOG.record(trace, time.perf_counter() - start)
+
+    def _render(query: UnifiedSearchQuery, results: ResultBatch) -> str:
+        if query.output_format == OutputFormat.TREE:
+            return render_tree(
+                results, query.max_response_bytes, sep='\\' if current_platform == "windows" else '/'
+            )
+        return format_results(results)
+
+    def _status(
+        wait: float,
+        priority: int,
+        refreshed: List[str],
+        note: str = '',
+        max_staleness: Optional[float] = None
+    ) -> str:
+        """Status lines ending every search result: queue wait and index age."""
+        index_status = owned_index.describe(refreshed) if owned_index else get_search_provider().index_status()
+        text = (
+            f"Queue wait: {wait * 1000:.1f} ms ({PRIORITY_NAMES[priority]} priority){note}\n"
+            f"Index age: {index_status}"
+        )
+        if max_staleness is not None and owned_index is None and current_platform == "linux":
+            # Only the owned index can be rebuilt on demand; Everything and Spotlight are live
+            text += (
+                f"\nmax_staleness not enforced: the system locate database is refreshed outside the server; "
+                "set EVERYTHING_SEARCH_INDEX_ROOTS to have stale roots rebuilt before a search"
+            )
+        return text
 
+    def _search_arguments(query: UnifiedSearchQuery) -> Dict[str, Any]:
+        """Build the provider's search_files keyword arguments for a query."""
+        exclusions = build_filter(
+            query.exclude,
+            query.default_excludes,
+            sep='\\' if current_platform == "windows" else '/',
+            context=[query.query]
+        )
+        if current_platform == "windows":
+            # Use Everything SDK directly
+            platform_params = query.windows_params or WindowsSpecificParams()
+            return dict(
+                query=query.query,
+                max_results=query.max_results,
+                match_path=platform_params.match_path,
+                match_case=platform_params.match_case,
+                match_whole_word=platform_params.match_whole_word,
+                match_regex=platform_params.match_regex,
+                sort_by=platform_params.sort_by,
+                rank=query.rank,
+                exclusions=exclusions
+            )
+
+        # Use command-line tools (mdfind/locate)
+        platform_params = None
+        extra: Dict[str, Any] = {}
+        if current_platform == 'darwin':
+            platform_params = query.mac_params
+        elif current_platform == 'linux':
+            platform_params = query.linux_params
+            if owned_index:
+                extra['databases'] = owned_index.databases()
+        return dict(
+            query=query.query,
+            max_results=query.max_results,
+            rank=query.rank,
+            exclusions=exclusions,
+            **platform_params.model_dump() if platform_params else {},
+            **extra
+        )
+
+    def _search(query: UnifiedSearchQuery) -> ResultBatch:
+        with METRICS.stage('search'):
+            return get_search_provider().search_files(**_search_arguments(query))
+
+    return server
+
+async def serve() -> None:
+    """Run the server."""
+    subscriptions = SubscriptionManager()
+    scheduler = Scheduler()
+    owned_index = OwnedIndex.from_env() if CURRENT_PLATFORM == 'linux' else None
+    if owned_index:
+        owned_index.start(is_busy=lambda: scheduler.busy(BACKENDS['linux']))
+    server = create_server(subscriptions=subscriptions, scheduler=scheduler, owned_index=owned_index)
     options = server.create_initialization_options()
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(read_stream, write_stream, options, raise_exceptions=True)
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, options, raise_exceptions=True)
+    finally:
+        subscriptions.close()
+        if owned_index:
+            owned_index.stop()
 
 def configure_windows_console():
     """Configure Windows console for UTF-8 output."""
@@ -0,0 +1,115 @@
+"""Opt-in NDJSON log of searches slower than a configurable threshold, and of failed searches."""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from dataclasses import asdict
+from typing import Optional
+
+from .metrics import QueryTrace
+
+DEFAULT_LOG_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'mcp-everything-search', 'slow_queries.ndjson'
+)
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so equivalent queries produce identical log lines."""
+    return " ".join(query.split())
+
+class SlowQueryLog:
+    """Writes one JSON line per slow search to a rotating file.
+
+    Records are handed to a background listener thread through an unbounded
+    queue, so logging a slow query never blocks the request path on disk I/O.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: Optional[float],
+        path: str = DEFAULT_LOG_PATH,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backup_count: int = DEFAULT_BACKUP_COUNT
+    ):
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._logger: Optional[logging.Logger] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms is not None
+
+    @classmethod
+    def from_env(cls) -> 'SlowQueryLog':
+        """Create the log configured by EVERYTHING_SEARCH_SLOW_QUERY_* variables."""
+        threshold = os.getenv('EVERYTHING_SEARCH_SLOW_QUERY_MS')
+        return cls(
+            threshold_ms=float(threshold) if threshold else None,
+            path=os.getenv('EVERYTHING_SEARCH_SLOW_QUERY_LOG') or DEFAULT_LOG_PATH,
+            max_bytes=int(os.getenv('EVERYTHING_SEARCH_SLOW_QUERY_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            backup_count=int(os.getenv('EVERYTHING_SEARCH_SLOW_QUERY_BACKUPS', DEFAULT_BACKUP_COUNT))
+        )
+
+    def _start(self) -> logging.Logger:
+        # Searches finishing at once in worker threads must not start two writers
+        with self._lock:
+            if self._logger is None:
+                self._logger = self._create_logger()
+            return self._logger
+
+    def _create_logger(self) -> logging.Logger:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.path,
+            maxBytes=self.max_bytes,
+            backupCount=self.backup_count,
+            encoding='utf-8',
+            delay=True
+        )
+        file_handler.setFormatter(logging.Formatter('%(message)s'))
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(records, file_handler)
+        self._listener.start()
+        atexit.register(self.close)
+
+        logger = logging.getLogger(f"{__name__}.{id(self)}")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(logging.handlers.QueueHandler(records))
+        return logger
+
+    def record(self, trace: QueryTrace, elapsed: float) -> bool:
+        """Log the trace if elapsed seconds exceed the threshold, or the search failed.
+
+        Returns whether it was logged.
+        """
+        if not self.enabled or (trace.outcome == 'ok' and elapsed * 1000 < self.threshold_ms):
+            return False
+        entry = {
+            'timestamp': time.time(),
+            'elapsed_ms': round(elapsed * 1000, 3),
+            **asdict(trace),
+            'stages': {name: round(seconds * 1000, 3) for name, seconds in trace.stages.items()},
+        }
+        entry['query'] = normalize_query(trace.query)
+        logger = self._logger or self._start()
+        logger.info(json.dumps(entry, default=str))
+        return True
+
+    def close(self) -> None:
+        """Flush pending records and stop the writer thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+SLOW_QUERY_LOG = SlowQueryLog.from_env()
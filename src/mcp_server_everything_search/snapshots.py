@@ -0,0 +1,281 @@
+"""Change tracking over the roots of the owned index.
+
+Answering "what changed under /srv in the last hour" from locate means
+stat'ing every candidate. Instead, each time the owned index rebuilds a root,
+a snapshot of the root is taken: every path below it with its mtime, sorted,
+the paths joined into one byte string and the mtimes held in an array. The new
+snapshot is compared with the root's previous one in a single sorted merge,
+and the paths added, removed and modified between the two are appended to a
+journal. Only the latest snapshot of each root is kept.
+
+A query for the changes since a snapshot ID or a time reads the journal
+entries after that point and folds them together, so it costs time in
+proportion to the number of changes, not to the number of paths. The journal
+is bounded; the oldest entries are dropped first.
+"""
+
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .metrics import METRICS
+
+TRACK_CHANGES = os.getenv('EVERYTHING_SEARCH_TRACK_CHANGES', '1').lower() not in ('0', 'false', 'no', '')
+
+# Changes kept in the journal across all roots
+JOURNAL_SIZE = int(os.getenv('EVERYTHING_SEARCH_JOURNAL_SIZE', '1000000'))
+
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+@dataclass
+class Snapshot:
+    """Every path below a root with its mtime, sorted by path."""
+    root: str
+    snapshot_id: int
+    taken_at: float
+    # Paths relative to the root, encoded, sorted and joined with NUL
+    paths: bytes
+    # mtime in nanoseconds of each path, in the same order
+    mtimes: array
+
+    def __len__(self) -> int:
+        return len(self.mtimes)
+
+    def entries(self) -> Iterator[Tuple[bytes, int]]:
+        if self.mtimes:
+            yield from zip(self.paths.split(b'\0'), self.mtimes)
+
+    def memory_bytes(self) -> int:
+        return len(self.paths) + self.mtimes.buffer_info()[1] * self.mtimes.itemsize
+
+@dataclass
+class ChangeSet:
+    """Paths that changed under a root between two of its snapshots.
+
+    Each change is (kind, path, mtime in nanoseconds); removed paths have mtime 0.
+    """
+    snapshot_id: int
+    root: str
+    taken_at: float
+    previous_taken_at: float
+    changes: List[Tuple[str, str, int]] = field(default_factory=list)
+
+@dataclass
+class Changes:
+    """The result of a changes_since query."""
+    # path -> (kind, mtime in nanoseconds), in no particular order
+    paths: Dict[str, Tuple[str, int]]
+    # Latest snapshot ID, to pass as snapshot_id next time
+    snapshot_id: int
+    # Roots whose tracking started after the requested point, with the time it started
+    partial: Dict[str, float]
+
+def walk(root: str, prune: Optional[Callable[[str], bool]] = None) -> List[Tuple[bytes, int]]:
+    """Return every path below root, relative to it and encoded, with its mtime in nanoseconds.
+
+    Symlinks are not followed, unreadable directories are skipped, and
+    directories for which prune returns true are left out with everything
+    below them.
+    """
+    base = os.fsencode(root)
+    start = len(base) + (0 if base.endswith(b'/') else 1)
+    found: List[Tuple[bytes, int]] = []
+    pending = [base]
+    while pending:
+        try:
+            listing = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with listing:
+            for entry in listing:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    mtime = entry.stat(follow_symlinks=False).st_mtime_ns
+                except OSError:
+                    continue
+                if is_dir and prune is not None and prune(os.fsdecode(entry.path)):
+                    continue
+                found.append((entry.path[start:], mtime))
+                if is_dir:
+                    pending.append(entry.path)
+    return found
+
+def diff(old: Snapshot, new: Snapshot) -> List[Tuple[str, str, int]]:
+    """Return (kind, path, mtime) for each path added, removed or modified from old to new.
+
+    Both snapshots are sorted by path, so one merge pass over them finds
+    every change.
+    """
+    if old.paths == new.paths and old.mtimes == new.mtimes:
+        return []
+    root = new.root
+    join = lambda relative: os.path.join(root, os.fsdecode(relative))
+    changes: List[Tuple[str, str, int]] = []
+    before, after = old.entries(), new.entries()
+    a, b = next(before, None), next(after, None)
+    while a is not None and b is not None:
+        if a[0] == b[0]:
+            if a[1] != b[1]:
+                changes.append((MODIFIED, join(b[0]), b[1]))
+            a, b = next(before, None), next(after, None)
+        elif a[0] < b[0]:
+            changes.append((REMOVED, join(a[0]), 0))
+            a = next(before, None)
+        else:
+            changes.append((ADDED, join(b[0]), b[1]))
+            b = next(after, None)
+    while a is not None:
+        changes.append((REMOVED, join(a[0]), 0))
+        a = next(before, None)
+    while b is not None:
+        changes.append((ADDED, join(b[0]), b[1]))
+        b = next(after, None)
+    return changes
+
+def _fold(previous: Optional[Tuple[str, int]], kind: str, mtime: int) -> Optional[Tuple[str, int]]:
+    """Combine a path's earlier change with a later one; None when they cancel out."""
+    if previous is None:
+        return kind, mtime
+    if previous[0] == ADDED:
+        return None if kind == REMOVED else (ADDED, mtime)
+    if previous[0] == REMOVED:
+        return (MODIFIED, mtime) if kind == ADDED else (kind, mtime)
+    return kind, mtime
+
+class ChangeTracker:
+    """Latest snapshot of each root and a bounded journal of the changes between snapshots."""
+
+    def __init__(self, journal_size: int = JOURNAL_SIZE):
+        self.journal_size = journal_size
+        self._lock = threading.Lock()
+        self._next_id = 1
+        # ID of the latest snapshot whose changes are in the journal
+        self._latest_id = 0
+        self._snapshots: Dict[str, Snapshot] = {}
+        # Snapshot ID and time each root was first snapshotted
+        self._baselines: Dict[str, Tuple[int, float]] = {}
+        self._journal: Deque[ChangeSet] = deque()
+        self._journal_changes = 0
+        # Snapshot ID and time of the newest change set dropped from the journal
+        self._horizon: Tuple[int, float] = (0, 0.0)
+
+    def has_snapshot(self, root: str) -> bool:
+        return root in self._snapshots
+
+    @property
+    def snapshot_id(self) -> int:
+        """ID of the latest snapshot, or 0 before the first."""
+        return self._latest_id
+
+    def snapshot(self, root: str, prune: Optional[Callable[[str], bool]] = None) -> Snapshot:
+        """Take a snapshot of root and journal its changes since the previous one. Blocking."""
+        taken_at = time.time()
+        with METRICS.stage('snapshot'):
+            entries = walk(root, prune)
+            entries.sort()
+            paths = b'\0'.join(path for path, _ in entries)
+            mtimes = array('q', (mtime for _, mtime in entries))
+            del entries
+            return self.record(root, paths, mtimes, taken_at)
+
+    def record(self, root: str, paths: bytes, mtimes: array, taken_at: float) -> Snapshot:
+        """Store a snapshot of root from sorted, NUL-joined relative paths and their mtimes."""
+        with METRICS.stage('snapshot_diff'):
+            with self._lock:
+                previous = self._snapshots.get(root)
+                snapshot = Snapshot(root, self._next_id, taken_at, paths, mtimes)
+                self._next_id += 1
+            changes = diff(previous, snapshot) if previous is not None else []
+
+            with self._lock:
+                self._snapshots[root] = snapshot
+                self._latest_id = snapshot.snapshot_id
+                if previous is None:
+                    self._baselines[root] = (snapshot.snapshot_id, taken_at)
+                elif changes:
+                    self._journal.append(
+                        ChangeSet(snapshot.snapshot_id, root, taken_at, previous.taken_at, changes)
+                    )
+                    self._journal_changes += len(changes)
+                    # The newest change set is kept whatever its size
+                    while self._journal_changes > self.journal_size and len(self._journal) > 1:
+                        dropped = self._journal.popleft()
+                        self._journal_changes -= len(dropped.changes)
+                        self._horizon = (dropped.snapshot_id, dropped.taken_at)
+                METRICS.increment('snapshots')
+                METRICS.increment('snapshot_changes', len(changes))
+                if METRICS.enabled:
+                    METRICS.set_gauge('snapshot_bytes', sum(s.memory_bytes() for s in self._snapshots.values()))
+                    METRICS.set_gauge('journal_changes', self._journal_changes)
+        return snapshot
+
+    def changes_since(
+        self,
+        snapshot_id: Optional[int] = None,
+        since: Optional[float] = None,
+        root: Optional[str] = None
+    ) -> Changes:
+        """Fold the journal after a snapshot ID, or after a time, into one change per path.
+
+        With since, change sets from snapshots taken after it are read. A
+        change set whose previous snapshot was taken before since may hold
+        older changes, so from it only paths with an mtime from since on are
+        kept, along with its removals, which carry no time. root limits the
+        changes to that directory. Raises ValueError if the journal no longer
+        reaches back that far.
+        """
+        if (snapshot_id is None) == (since is None):
+            raise ValueError("Give exactly one of snapshot_id and since")
+        prefix = None
+        if root is not None:
+            root = os.path.abspath(os.path.expanduser(root))
+            prefix = root.rstrip(os.sep) + os.sep
+
+        with self._lock:
+            horizon_id, horizon_time = self._horizon
+            if (snapshot_id is not None and snapshot_id < horizon_id) or (since is not None and since < horizon_time):
+                raise ValueError(
+                    f"Changes up to snapshot {horizon_id} are no longer kept; "
+                    f"raise EVERYTHING_SEARCH_JOURNAL_SIZE to keep more"
+                )
+            if snapshot_id is not None:
+                after = lambda change_set: change_set.snapshot_id > snapshot_id
+                started_after = lambda baseline: baseline[0] > snapshot_id
+            else:
+                since_ns = int(since * 1e9)
+                after = lambda change_set: change_set.taken_at > since
+                started_after = lambda baseline: baseline[1] > since
+
+            folded: Dict[str, Tuple[str, int]] = {}
+            # Newest first, stopping at the first change set at or before the requested point
+            selected = []
+            for change_set in reversed(self._journal):
+                if not after(change_set):
+                    break
+                selected.append(change_set)
+            for change_set in reversed(selected):
+                straddles = since is not None and change_set.previous_taken_at < since
+                for kind, path, mtime in change_set.changes:
+                    if prefix is not None and not path.startswith(prefix):
+                        continue
+                    if straddles and kind != REMOVED and mtime < since_ns:
+                        continue
+                    result = _fold(folded.get(path), kind, mtime)
+                    if result is None:
+                        del folded[path]
+                    else:
+                        folded[path] = result
+
+            partial = {
+                tracked: baseline[1] for tracked, baseline in self._baselines.items()
+                if started_after(baseline) and (
+                    prefix is None or (tracked + os.sep).startswith(prefix) or prefix.startswith(tracked + os.sep)
+                )
+            }
+            return Changes(folded, self.snapshot_id, partial)
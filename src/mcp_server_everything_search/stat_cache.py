@@ -0,0 +1,335 @@
+"""Process-wide cache of the file metadata shown in search results.
+
+Hot files such as project sources and configuration come up in search after
+search, and each result needs a stat() for its size and times. The cache keeps
+the size, times and mode of recently returned paths, seven integers per path
+in one array, behind a bounded LRU index.
+
+An entry expires after a TTL, or as soon as inotify reports a change to it.
+On Linux the directory of each cached path is watched (and the path itself,
+for directories), and pending events are read before every lookup, so an
+entry is dropped before it can be served after its file changed. The watch
+on a path's directory is placed before the path is stat'ed, so no change can
+fall between the two. Entries whose directories could not be watched use the
+shorter TTL, as do directories on their first stat, whose own watch is only
+placed once their type is known.
+"""
+
+import ctypes
+import errno
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .watchers import (
+    EVENT_HEADER,
+    IN_ATTRIB,
+    IN_CLOEXEC,
+    IN_CLOSE_WRITE,
+    IN_CREATE,
+    IN_DELETE,
+    IN_DELETE_SELF,
+    IN_IGNORED,
+    IN_ISDIR,
+    IN_MODIFY,
+    IN_MOVE_SELF,
+    IN_MOVED_FROM,
+    IN_MOVED_TO,
+    IN_NONBLOCK,
+    IN_ONLYDIR,
+    IN_Q_OVERFLOW,
+    inotify_available,
+    load_libc,
+)
+
+STAT_CACHE_SIZE = int(os.getenv('EVERYTHING_SEARCH_STAT_CACHE_SIZE', '50000'))
+
+# Seconds an entry is served without inotify coverage, and with it
+STAT_CACHE_TTL = float(os.getenv('EVERYTHING_SEARCH_STAT_CACHE_TTL', '5'))
+WATCHED_TTL = float(os.getenv('EVERYTHING_SEARCH_STAT_CACHE_WATCHED_TTL', '300'))
+
+# Directories watched for invalidation; entries beyond this rely on STAT_CACHE_TTL
+MAX_WATCHED_DIRS = int(os.getenv('EVERYTHING_SEARCH_STAT_CACHE_WATCHES', '1024'))
+
+# Entry layout in the slot array
+SIZE, CTIME, MTIME, ATIME, MODE, EXPIRES, WATCHES = range(7)
+FIELDS = 7
+
+# MODE of a path that could not be stat'ed
+MISSING = -1
+
+# WATCHES bits: the entry holds a reference on its parent's watch, or on its own
+PARENT_WATCH = 1
+SELF_WATCH = 2
+
+WATCH_MASK = (
+    IN_ATTRIB | IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_DELETE
+    | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+# Events that change the watched directory's own listing, and so its times
+LISTING_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+# Rough per-entry cost of the OrderedDict index, beyond the key string
+INDEX_ENTRY_BYTES = 100
+
+# Entries added to the slot array at a time when it is full
+GROWTH_ENTRIES = 1024
+
+Row = Tuple[int, int, int, int, int]
+
+class StatCache:
+    """Bounded, thread-safe LRU of stat() results with TTL and inotify invalidation."""
+
+    def __init__(
+        self,
+        max_entries: int = STAT_CACHE_SIZE,
+        ttl: float = STAT_CACHE_TTL,
+        watched_ttl: float = WATCHED_TTL,
+        max_watched_dirs: int = MAX_WATCHED_DIRS,
+        watch: Optional[bool] = None
+    ):
+        self.max_entries = max(0, max_entries)
+        self.ttl_ns = int(ttl * 1e9)
+        self.watched_ttl_ns = int(watched_ttl * 1e9)
+        self.max_watched_dirs = max_watched_dirs
+        self.watch = inotify_available() if watch is None else watch
+        self._lock = threading.Lock()
+        self._slots = array('q')
+        self._free: List[int] = []
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._key_bytes = 0
+        self._fd: Optional[int] = None
+        self._dir_wds: Dict[str, int] = {}
+        self._wd_dirs: Dict[int, str] = {}
+        self._dir_refs: Dict[str, int] = {}
+
+    def __bool__(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def watched_dirs(self) -> int:
+        return len(self._dir_wds)
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the entries, their index and the watch tables."""
+        with self._lock:
+            return (
+                self._slots.buffer_info()[1] * self._slots.itemsize
+                + self._key_bytes
+                + len(self._entries) * INDEX_ENTRY_BYTES
+                + sys.getsizeof(self._dir_wds) + sys.getsizeof(self._wd_dirs) + sys.getsizeof(self._dir_refs)
+            )
+
+    def lookup(self, paths: Sequence[str]) -> Tuple[List[Optional[Row]], int]:
+        """Return (size, ctime, mtime, atime, mode) per path, stat'ing the paths not cached.
+
+        mode is MISSING for paths that could not be stat'ed. Also returns the
+        number of paths served from the cache. The stat() calls are made
+        without holding the lock, so concurrent searches do not wait on each
+        other's file system access.
+        """
+        rows: List[Optional[Row]] = [None] * len(paths)
+        misses = []
+        with self._lock:
+            self._drain()
+            slots = self._slots
+            now = time.monotonic_ns()
+            entries = self._entries
+            for i, path in enumerate(paths):
+                offset = entries.get(path)
+                if offset is not None and slots[offset + EXPIRES] > now:
+                    entries.move_to_end(path)
+                    rows[i] = (
+                        slots[offset + SIZE], slots[offset + CTIME], slots[offset + MTIME],
+                        slots[offset + ATIME], slots[offset + MODE]
+                    )
+                else:
+                    misses.append(i)
+            # Watch the directories first, so a change made after a path is stat'ed is always reported
+            taken = [0] * len(misses)
+            if self.watch and self.max_entries:
+                for n, i in enumerate(misses):
+                    if self._ref(os.path.dirname(paths[i])):
+                        taken[n] = PARENT_WATCH
+
+        fresh = []
+        for i in misses:
+            try:
+                stat = os.stat(paths[i])
+                row = (stat.st_size, stat.st_ctime_ns, stat.st_mtime_ns, stat.st_atime_ns, stat.st_mode)
+            except (OSError, ValueError):
+                row = (MISSING, MISSING, MISSING, MISSING, MISSING)
+            rows[i] = row
+            fresh.append(row)
+
+        if misses:
+            with self._lock:
+                now = time.monotonic_ns()
+                for i, row, watches in zip(misses, fresh, taken):
+                    self._store(paths[i], row, now, watches)
+                # Events queued since the watches were placed may be newer than the stat, so they
+                # are applied to the entries just stored rather than to the ones before them
+                self._drain()
+        return rows, len(paths) - len(misses)
+
+    def close(self) -> None:
+        """Drop every entry and stop watching."""
+        with self._lock:
+            self._entries.clear()
+            self._slots = array('q')
+            self._free.clear()
+            self._key_bytes = 0
+            self._dir_wds.clear()
+            self._wd_dirs.clear()
+            self._dir_refs.clear()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    def _store(self, path: str, row: Row, now: int, taken: int = 0) -> None:
+        """Store the row of path, handing the entry the watch references in taken."""
+        offset = self._entries.get(path)
+        if offset is None:
+            if not self.max_entries:
+                self._release(path, taken)
+                return
+            while len(self._entries) >= self.max_entries:
+                self._invalidate(next(iter(self._entries)))
+            if not self._free:
+                base = len(self._slots)
+                grow = min(GROWTH_ENTRIES, self.max_entries - base // FIELDS) or 1
+                self._slots.frombytes(bytes(grow * FIELDS * self._slots.itemsize))
+                # Reversed, so slots are handed out in array order
+                self._free.extend(range(base + (grow - 1) * FIELDS, base - 1, -FIELDS))
+            offset = self._free.pop()
+            self._entries[path] = offset
+            self._key_bytes += sys.getsizeof(path)
+            watches = 0
+        else:
+            self._entries.move_to_end(path)
+            watches = self._slots[offset + WATCHES]
+
+        # A reference the entry already holds is not kept twice
+        self._release(path, taken & watches)
+        watches |= taken
+        covered = False
+        if self.watch:
+            is_dir = row[4] != MISSING and (row[4] & 0o170000) == 0o040000
+            if is_dir and not watches & SELF_WATCH:
+                # Placed after the stat, so the entry is covered only once stat'ed again
+                if self._ref(path):
+                    watches |= SELF_WATCH
+            else:
+                covered = bool(watches & PARENT_WATCH)
+
+        slots = self._slots
+        slots[offset + SIZE], slots[offset + CTIME], slots[offset + MTIME], slots[offset + ATIME], slots[offset + MODE] = row
+        slots[offset + EXPIRES] = now + (self.watched_ttl_ns if covered else self.ttl_ns)
+        slots[offset + WATCHES] = watches
+
+    def _invalidate(self, path: str) -> None:
+        offset = self._entries.pop(path, None)
+        if offset is None:
+            return
+        self._key_bytes -= sys.getsizeof(path)
+        self._release(path, self._slots[offset + WATCHES])
+        self._free.append(offset)
+
+    def _release(self, path: str, watches: int) -> None:
+        if watches & PARENT_WATCH:
+            self._unref(os.path.dirname(path))
+        if watches & SELF_WATCH:
+            self._unref(path)
+
+    def _invalidate_tree(self, directory: str) -> None:
+        prefix = directory + os.sep
+        for path in [path for path in self._entries if path == directory or path.startswith(prefix)]:
+            self._invalidate(path)
+
+    def _ref(self, directory: str) -> bool:
+        """Take a reference on a watch of directory, adding it if needed. False if it cannot be watched."""
+        if directory in self._dir_refs:
+            self._dir_refs[directory] += 1
+            return True
+        if len(self._dir_wds) >= self.max_watched_dirs:
+            return False
+        libc = load_libc()
+        if self._fd is None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                self.watch = False
+                return False
+            self._fd = fd
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            if ctypes.get_errno() == errno.ENOSPC:
+                # The user's inotify watch limit is used up; stop trying until entries are released
+                self.max_watched_dirs = len(self._dir_wds)
+            return False
+        self._dir_wds[directory] = wd
+        self._wd_dirs[wd] = directory
+        self._dir_refs[directory] = 1
+        return True
+
+    def _unref(self, directory: str) -> None:
+        refs = self._dir_refs.get(directory)
+        if refs is None:
+            return
+        if refs > 1:
+            self._dir_refs[directory] = refs - 1
+            return
+        del self._dir_refs[directory]
+        wd = self._dir_wds.pop(directory)
+        self._wd_dirs.pop(wd, None)
+        if self._fd is not None:
+            load_libc().inotify_rm_watch(self._fd, wd)
+
+    def _drain(self) -> None:
+        """Apply the inotify events queued since the last lookup."""
+        if self._fd is None:
+            return
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Some changes were lost, so no entry can be trusted
+                    for path in list(self._entries):
+                        self._invalidate(path)
+                    continue
+                directory = self._wd_dirs.get(wd)
+                if directory is None:
+                    continue
+                # A deleted directory is already empty, so its entries went with their own events;
+                # a moved one takes its whole subtree along, which no other watch reports
+                if mask & IN_DELETE_SELF:
+                    self._invalidate(directory)
+                    continue
+                if mask & (IN_MOVE_SELF | IN_IGNORED):
+                    self._invalidate_tree(directory)
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR and mask & IN_MOVED_FROM:
+                    self._invalidate_tree(path)
+                else:
+                    self._invalidate(path)
+                if mask & LISTING_EVENTS:
+                    self._invalidate(directory)
+
+STAT_CACHE = StatCache()
@@ -0,0 +1,161 @@
+"""Standing-query subscriptions that push newly matching paths to the client."""
+
+import asyncio
+import itertools
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from .exclusions import build_filter
+from .matching import compile_query
+from .metrics import METRICS
+from .watchers import CREATED, PollingWatcher, create_watcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SUBSCRIPTIONS = int(os.getenv('EVERYTHING_SEARCH_MAX_SUBSCRIPTIONS', '8'))
+DEFAULT_MAX_PATHS_PER_NOTIFICATION = 100
+
+@dataclass
+class Subscription:
+    """A registered query and the roots watched for new matches."""
+    id: str
+    query: str
+    roots: List[str]
+    matcher: Callable[[str], bool]
+    debounce: float
+    notify: 'NotifyCallback'
+    watcher: object = None
+    pending: Dict[str, None] = field(default_factory=dict)
+    flush_handle: Optional[asyncio.TimerHandle] = None
+    hits: int = 0
+
+# Coroutine delivering (subscription, paths, number of further paths not included)
+NotifyCallback = Callable[[Subscription, List[str], int], Awaitable[None]]
+
+class SubscriptionManager:
+    """Owns active subscriptions, their watchers and debounced notifications.
+
+    New and renamed entries are matched one at a time against the compiled
+    query as the watcher reports them, so the work done is proportional to the
+    number of changes under the roots rather than to the size of the index.
+    """
+
+    def __init__(
+        self,
+        max_subscriptions: int = DEFAULT_MAX_SUBSCRIPTIONS,
+        max_paths_per_notification: int = DEFAULT_MAX_PATHS_PER_NOTIFICATION
+    ):
+        self.max_subscriptions = max_subscriptions
+        self.max_paths_per_notification = max_paths_per_notification
+        self._subscriptions: Dict[str, Subscription] = {}
+        self._ids = itertools.count(1)
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    async def subscribe(
+        self,
+        query: str,
+        roots: List[str],
+        notify: NotifyCallback,
+        match_case: bool = False,
+        match_regex: bool = False,
+        debounce_ms: int = 500,
+        exclude: Optional[List[str]] = None,
+        default_excludes: bool = True
+    ) -> Subscription:
+        """Register a query and start watching its roots.
+
+        Excluded directories are not watched at all, which also keeps trees
+        such as node_modules from using up the inotify watch limit.
+        """
+        if len(self._subscriptions) >= self.max_subscriptions:
+            raise RuntimeError(
+                f"Too many active subscriptions (limit {self.max_subscriptions}); unsubscribe first"
+            )
+        resolved = []
+        for root in roots:
+            root = os.path.abspath(os.path.expanduser(root))
+            if not os.path.isdir(root):
+                raise ValueError(f"Subscription root is not a directory: {root}")
+            resolved.append(root)
+        if not resolved:
+            raise ValueError("At least one root directory is required")
+
+        subscription = Subscription(
+            id=f"sub-{next(self._ids)}",
+            query=query,
+            roots=resolved,
+            matcher=compile_query(query, match_case=match_case, match_regex=match_regex),
+            debounce=debounce_ms / 1000,
+            notify=notify
+        )
+        exclusions = build_filter(exclude, default_excludes, context=[query, *resolved])
+        prune = exclusions.excluded if exclusions else None
+        on_change = lambda path, kind: self._on_change(subscription, path, kind)
+        subscription.watcher = create_watcher(resolved, on_change, prune=prune)
+        # Registered before the watcher starts so that the limit holds while roots are walked
+        self._subscriptions[subscription.id] = subscription
+        try:
+            try:
+                await subscription.watcher.start()
+            except OSError as e:
+                logger.warning("inotify unavailable (%s); falling back to polling", e)
+                subscription.watcher = PollingWatcher(resolved, on_change, prune=prune)
+                await subscription.watcher.start()
+        except BaseException:
+            self.unsubscribe(subscription.id)
+            raise
+        METRICS.increment('subscriptions_created')
+        return subscription
+
+    def unsubscribe(self, subscription_id: str) -> bool:
+        """Stop a subscription. Returns False if it was not active."""
+        subscription = self._subscriptions.pop(subscription_id, None)
+        if subscription is None:
+            return False
+        subscription.watcher.stop()
+        if subscription.flush_handle is not None:
+            subscription.flush_handle.cancel()
+        return True
+
+    def close(self) -> None:
+        """Stop every subscription."""
+        for subscription_id in list(self._subscriptions):
+            self.unsubscribe(subscription_id)
+
+    def _on_change(self, subscription: Subscription, path: str, kind: str) -> None:
+        if kind != CREATED or not subscription.matcher(path):
+            return
+        subscription.pending[path] = None
+        if subscription.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            subscription.flush_handle = loop.call_later(subscription.debounce, self._flush, subscription)
+
+    def _flush(self, subscription: Subscription) -> None:
+        subscription.flush_handle = None
+        if subscription.id not in self._subscriptions or not subscription.pending:
+            return
+        paths = list(subscription.pending)
+        subscription.pending.clear()
+        subscription.hits += len(paths)
+        METRICS.increment('subscription_hits', len(paths))
+        METRICS.increment('subscription_notifications')
+
+        limit = self.max_paths_per_notification
+        task = asyncio.get_running_loop().create_task(
+            self._deliver(subscription, paths[:limit], max(0, len(paths) - limit))
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, subscription: Subscription, paths: List[str], more: int) -> None:
+        try:
+            await subscription.notify(subscription, paths, more)
+        except Exception as e:
+            # The client is gone or rejected the notification; stop watching for it
+            logger.warning("Dropping subscription %s after failed notification: %s", subscription.id, e)
+            self.unsubscribe(subscription.id)
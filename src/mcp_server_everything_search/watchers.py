@@ -0,0 +1,314 @@
+"""Directory tree watchers reporting created, modified and deleted paths.
+
+On Linux the tree is watched with inotify through ctypes, driven by the
+asyncio event loop once the initial walk, done in a worker thread, has
+watched every directory. Elsewhere, or when inotify is unavailable, the tree is
+rescanned periodically and compared with the previous scan.
+
+When inotify cannot report every change, because its event queue overflowed
+or a directory could not be watched within the watch limit, the affected path
+is reported as an overflow.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .platform_search import CURRENT_PLATFORM
+
+logger = logging.getLogger(__name__)
+
+CREATED = 'created'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+# Changes under the path have been or will be missed
+OVERFLOW = 'overflow'
+
+# Callback receiving (path, change kind) for every observed change
+ChangeCallback = Callable[[str, str], None]
+Change = Tuple[str, str]
+
+# Predicate selecting paths that are neither watched nor reported
+PruneCallback = Callable[[str], bool]
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+)
+EVENT_HEADER = struct.Struct('iIII')
+
+DEFAULT_MAX_WATCHES = 8192
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_MAX_POLL_ENTRIES = 200_000
+
+_libc = None
+
+def load_libc():
+    """Return libc with the inotify functions' argument types declared."""
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return _libc
+
+def inotify_available() -> bool:
+    """Whether inotify can be used on this host."""
+    if CURRENT_PLATFORM != 'linux':
+        return False
+    try:
+        return hasattr(load_libc(), 'inotify_init1')
+    except OSError:
+        return False
+
+class InotifyWatcher:
+    """Recursive inotify watch over a set of root directories."""
+
+    def __init__(
+        self,
+        roots: List[str],
+        on_change: ChangeCallback,
+        max_watches: int = DEFAULT_MAX_WATCHES,
+        prune: Optional[PruneCallback] = None
+    ):
+        self.roots = roots
+        self.on_change = on_change
+        self.max_watches = max_watches
+        self.prune = prune
+        self._fd: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._watches: Dict[int, str] = {}
+        self._walk: Optional[asyncio.Future] = None
+        # Directories left unwatched, with everything below them, because the watch limit was reached
+        self.unwatched = 0
+
+    async def start(self) -> None:
+        """Watch the roots and start reading events.
+
+        Adding one watch per directory of a large tree takes a while, so the
+        initial walk runs in a worker thread rather than on the event loop.
+        """
+        libc = load_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        self._loop = asyncio.get_running_loop()
+        self._walk = asyncio.ensure_future(asyncio.to_thread(self._watch_roots))
+        changes = await asyncio.shield(self._walk)
+        if self._fd is None:
+            # Stopped during the walk
+            return
+        self._loop.add_reader(fd, self._read_events)
+        self._report(changes)
+
+    def stop(self) -> None:
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        if self._loop is not None:
+            self._loop.remove_reader(fd)
+        self._watches.clear()
+        if self._walk is not None and not self._walk.done():
+            # The walk may still be adding a watch to fd, so close it once the walk ends
+            self._walk.add_done_callback(lambda _: os.close(fd))
+        else:
+            os.close(fd)
+
+    def _watch_roots(self) -> List[Change]:
+        changes: List[Change] = []
+        for root in self.roots:
+            changes.extend(self._watch_tree(root, report=False))
+        return changes
+
+    def _report(self, changes: List[Change]) -> None:
+        for path, kind in changes:
+            self.on_change(path, kind)
+
+    def _add_watch(self, directory: str) -> bool:
+        fd = self._fd
+        if fd is None:
+            return False
+        wd = load_libc().inotify_add_watch(fd, os.fsencode(directory), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                logger.warning("inotify_add_watch(%s) failed: %s", directory, os.strerror(err))
+            return False
+        self._watches[wd] = directory
+        return True
+
+    def _watch_tree(self, root: str, report: bool) -> List[Change]:
+        """Watch root and its subdirectories, returning the changes to report.
+
+        With report, existing entries are reported as created. This covers
+        entries that appeared inside a new directory before its watch was in
+        place, such as a directory tree moved into a watched root. Directories
+        beyond the watch limit are reported as overflows. Nothing is reported
+        from here, so the walk can run outside the event loop.
+        """
+        changes: List[Change] = []
+        unwatched = self.unwatched
+
+        def watch(directory: str) -> bool:
+            if len(self._watches) >= self.max_watches:
+                self.unwatched += 1
+                changes.append((directory, OVERFLOW))
+                return False
+            return self._add_watch(directory)
+
+        if watch(root):
+            stack = [root]
+            while stack and self._fd is not None:
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if self.prune is not None and self.prune(entry.path):
+                                continue
+                            if report:
+                                changes.append((entry.path, CREATED))
+                            if entry.is_dir(follow_symlinks=False) and watch(entry.path):
+                                stack.append(entry.path)
+                except OSError:
+                    continue
+        if self.unwatched > unwatched:
+            logger.warning(
+                "inotify watch limit (%d) reached; %d directories under %s and their subtrees are not watched",
+                self.max_watches, self.unwatched - unwatched, root
+            )
+        return changes
+
+    def _read_events(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed; some changes were missed")
+                # Which roots lost events is unknown, and new directories among them were not watched
+                for root in self.roots:
+                    self.on_change(root, OVERFLOW)
+                continue
+            directory = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if directory is None:
+                continue
+            if mask & IN_DELETE_SELF:
+                self.on_change(directory, DELETED)
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name))
+            if self.prune is not None and self.prune(path):
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.on_change(path, CREATED)
+                if mask & IN_ISDIR:
+                    self._report(self._watch_tree(path, report=True))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                self.on_change(path, DELETED)
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE):
+                self.on_change(path, MODIFIED)
+
+class PollingWatcher:
+    """Portable watcher that rescans the roots and diffs modification times."""
+
+    def __init__(
+        self,
+        roots: List[str],
+        on_change: ChangeCallback,
+        interval: float = DEFAULT_POLL_INTERVAL,
+        max_entries: int = DEFAULT_MAX_POLL_ENTRIES,
+        prune: Optional[PruneCallback] = None
+    ):
+        self.roots = roots
+        self.on_change = on_change
+        self.interval = interval
+        self.max_entries = max_entries
+        self.prune = prune
+        self._task: Optional[asyncio.Task] = None
+
+    def _scan(self) -> Dict[str, int]:
+        seen: Dict[str, int] = {}
+        stack = list(self.roots)
+        prune = self.prune
+        while stack and len(seen) < self.max_entries:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if prune is not None and prune(entry.path):
+                            continue
+                        try:
+                            seen[entry.path] = entry.stat(follow_symlinks=False).st_mtime_ns
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return seen
+
+    async def _run(self) -> None:
+        previous = await asyncio.to_thread(self._scan)
+        while True:
+            await asyncio.sleep(self.interval)
+            current = await asyncio.to_thread(self._scan)
+            for path, mtime in current.items():
+                before = previous.get(path)
+                if before is None:
+                    self.on_change(path, CREATED)
+                elif before != mtime:
+                    self.on_change(path, MODIFIED)
+            for path in previous.keys() - current.keys():
+                self.on_change(path, DELETED)
+            previous = current
+
+    async def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+def create_watcher(roots: List[str], on_change: ChangeCallback, prune: Optional[PruneCallback] = None):
+    """Return an unstarted watcher for roots, preferring inotify when available.
+
+    Paths for which prune returns true are skipped, and pruned directories
+    are not descended into or watched.
+    """
+    if inotify_available():
+        return InotifyWatcher(roots, on_change, prune=prune)
+    return PollingWatcher(roots, on_change, prune=prune)
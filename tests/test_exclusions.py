@@ -0,0 +1,57 @@
+"""Tests of path exclusions and of default exclusions named by a query."""
+
+import pytest
+
+from mcp_server_everything_search import exclusions
+from mcp_server_everything_search.exclusions import ExclusionFilter, build_filter
+
+@pytest.fixture(autouse=True)
+def defaults(monkeypatch):
+    monkeypatch.setattr(exclusions, 'DEFAULTS', exclusions.DEFAULT_EXCLUDES)
+
+@pytest.mark.parametrize('query', ['.gitignore', 'node_modules_backup', 'targetfile', 'git', 'my-venv'])
+def test_defaults_kept_for_partial_names(query):
+    assert build_filter(context=[query]).patterns == exclusions.DEFAULT_EXCLUDES
+
+@pytest.mark.parametrize('query, dropped', [
+    ('node_modules/react', 'node_modules'),
+    ('report .git', '.git'),
+    ('path:target', 'target'),
+    (r'C:\src\target\debug', 'target'),
+    ('"__pycache__"', '__pycache__'),
+    ('*_modules', 'node_modules'),
+])
+def test_defaults_named_by_query_dropped(query, dropped):
+    patterns = build_filter(context=[query]).patterns
+    assert dropped not in patterns
+    assert len(patterns) == len(exclusions.DEFAULT_EXCLUDES) - 1
+
+def test_subscription_root_drops_default():
+    assert 'node_modules' not in build_filter(context=['react', '/home/me/app/node_modules']).patterns
+
+def test_defaults_off():
+    assert build_filter(['*.log'], use_defaults=False).patterns == ('*.log',)
+
+def test_component_and_prefix():
+    exclusion = ExclusionFilter(['node_modules', '/srv/cache', '*.pyc'], sep='/', ignore_case=False)
+    assert exclusion.keep([
+        '/app/node_modules/react/index.js',
+        '/app/node_modules_backup/index.js',
+        '/srv/cache/a',
+        '/srv/cached/a',
+        '/app/x.pyc',
+        '/app/x.py',
+    ]) == ['/app/node_modules_backup/index.js', '/srv/cached/a', '/app/x.py']
+
+def test_whole_path_glob():
+    exclusion = ExclusionFilter(['*/build/*.o'], sep='/', ignore_case=False)
+    assert exclusion.excluded('/src/build/a/b.o')
+    assert not exclusion.excluded('/src/build/b.c')
+
+def test_everything_terms():
+    exclusion = ExclusionFilter(['node_modules', 'C:/cache', '*/build/*.o'], sep='\\')
+    assert exclusion.everything_terms() == (
+        r'!path:"*\node_modules" !path:"*\node_modules\*" '
+        r'!wfn:path:"C:\cache" !path:"C:\cache\*" '
+        r'!wfn:path:"*\build\*.o"'
+    )
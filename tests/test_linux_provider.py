@@ -0,0 +1,89 @@
+"""Tests of merging locate searches, against the fake locate."""
+
+import os
+
+import pytest
+
+from benchmarks import fake_locate
+from mcp_server_everything_search.exclusions import ExclusionFilter
+from mcp_server_everything_search.metrics import Metrics
+from mcp_server_everything_search.search_interface import LinuxSearchProvider
+from mcp_server_everything_search.stat_cache import StatCache
+
+PATHS = [
+    '/home/me/src/server.py',
+    '/home/me/src/Client.py',
+    '/home/me/node_modules/server/index.js',
+    '/home/me/docs/server.md',
+    '/home/me/notes.txt',
+]
+
+@pytest.fixture
+def metrics(monkeypatch) -> Metrics:
+    metrics = Metrics(enabled=True)
+    monkeypatch.setattr('mcp_server_everything_search.search_interface.METRICS', metrics)
+    return metrics
+
+def _provider(tmp_path, monkeypatch, name: str) -> LinuxSearchProvider:
+    database = tmp_path / 'locate.db'
+    database.write_text(''.join(f"{path}\n" for path in PATHS))
+    monkeypatch.setenv('FAKE_LOCATE_DB', str(database))
+    wrapper = fake_locate.install(str(tmp_path / 'bin'), name)
+    monkeypatch.setenv('PATH', f"{tmp_path / 'bin'}{os.pathsep}{os.environ['PATH']}")
+    provider = LinuxSearchProvider()
+    provider.locate_cmd = wrapper
+    provider.locate_type = 'mlocate' if name == 'locate' else 'plocate'
+    return provider
+
+@pytest.fixture
+def mlocate(tmp_path, monkeypatch) -> LinuxSearchProvider:
+    return _provider(tmp_path, monkeypatch, 'locate')
+
+@pytest.fixture
+def plocate(tmp_path, monkeypatch) -> LinuxSearchProvider:
+    return _provider(tmp_path, monkeypatch, 'plocate')
+
+def test_batch_key(mlocate, plocate):
+    assert mlocate.batch_key(query='a') == mlocate.batch_key(query='b', max_results=5)
+    assert mlocate.batch_key(query='a') != mlocate.batch_key(query='a', match_case=True)
+    # ignore_case is the linux_params spelling of match_case
+    assert mlocate.batch_key(query='a', ignore_case=False) == mlocate.batch_key(query='a', match_case=True)
+    assert mlocate.batch_key(query='a', match_regex=True) is None
+    assert plocate.batch_key(query='a') is None
+
+def test_merged_results_routed_per_query(mlocate, metrics):
+    searches = [
+        dict(query='server'),
+        dict(query='CLIENT'),
+        dict(query='*.md'),
+        dict(query='server', exclusions=ExclusionFilter(['node_modules'], sep='/')),
+        dict(query='server', max_results=1),
+        dict(query='missing'),
+    ]
+    batches = mlocate.search_merged(searches, StatCache(watch=False))
+    assert [batch.paths for batch in batches] == [
+        ['/home/me/src/server.py', '/home/me/node_modules/server/index.js', '/home/me/docs/server.md'],
+        ['/home/me/src/Client.py'],
+        ['/home/me/docs/server.md'],
+        ['/home/me/src/server.py', '/home/me/docs/server.md'],
+        ['/home/me/src/server.py'],
+        [],
+    ]
+    counters = metrics.snapshot()['counters']
+    assert counters['subprocesses_spawned'] == 1
+    assert counters['merged_searches'] == len(searches)
+
+def test_merged_case_sensitive(mlocate):
+    searches = [dict(query='Client', match_case=True), dict(query='client', match_case=True)]
+    assert [batch.paths for batch in mlocate.search_merged(searches, StatCache(watch=False))] == [
+        ['/home/me/src/Client.py'], []
+    ]
+
+def test_plocate_searches_run_separately(plocate, metrics):
+    # plocate would print only the entries matching both patterns
+    batches = plocate.search_merged([dict(query='server'), dict(query='docs')], StatCache(watch=False))
+    assert [batch.paths for batch in batches] == [
+        ['/home/me/src/server.py', '/home/me/node_modules/server/index.js', '/home/me/docs/server.md'],
+        ['/home/me/docs/server.md'],
+    ]
+    assert metrics.snapshot()['counters']['subprocesses_spawned'] == 2
@@ -0,0 +1,136 @@
+"""Tests of the mdfind command lines and of reading them, against the fake mdfind."""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+from mcp.types import CallToolRequest, CallToolRequestParams
+
+from benchmarks import fake_mdfind
+from mcp_server_everything_search import server as server_module
+from mcp_server_everything_search.search_interface import MacSearchProvider, ResultBatch
+
+@pytest.fixture
+def provider() -> MacSearchProvider:
+    return MacSearchProvider()
+
+@pytest.fixture
+def mdfind(tmp_path, monkeypatch):
+    """Put the fake mdfind first on PATH, over a database of 100,000 report files."""
+    fake_mdfind.install(str(tmp_path / 'bin'))
+    database = tmp_path / 'mdfind.db'
+    database.write_text(''.join(f"/Users/me/Documents/report-{i}.txt\n" for i in range(100_000)))
+    log = tmp_path / 'args.jsonl'
+    monkeypatch.setenv('PATH', f"{tmp_path / 'bin'}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('FAKE_MDFIND_DB', str(database))
+    monkeypatch.setenv('FAKE_MDFIND_ARGS_LOG', str(log))
+    return log
+
+def test_name_search(provider):
+    assert provider.build_command('report') == ['mdfind', '-0', '-name', 'report']
+
+def test_scope_and_live(provider):
+    assert provider.build_command('report', search_directory='/Users/me', live_updates=True) == [
+        'mdfind', '-0', '-onlyin', '/Users/me', '-live', '-name', 'report'
+    ]
+
+def test_scope_expands_user(provider):
+    assert provider.build_command('report', search_directory='~')[3] == os.path.expanduser('~')
+
+def test_path_search(provider):
+    assert provider.build_command('Documents/report', match_path=True) == ['mdfind', '-0', 'Documents/report']
+
+def test_filters_become_query_expression(provider):
+    after = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    cmd = provider.build_command('report', min_size=100, max_size=2000, modified_after=after)
+    assert cmd == [
+        'mdfind', '-0',
+        'kMDItemFSName == "*report*"cd && kMDItemFSSize >= 100 && kMDItemFSSize <= 2000'
+        ' && kMDItemFSContentChangeDate >= $time.iso(2024-01-02T03:04:05Z)'
+    ]
+
+def test_filters_keep_glob_and_case(provider):
+    before = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    cmd = provider.build_command('Re"port*.txt', match_case=True, modified_before=before)
+    assert cmd[-1] == (
+        'kMDItemFSName == "Re\\"port*.txt" && kMDItemFSContentChangeDate < $time.iso(2024-01-02T00:00:00Z)'
+    )
+
+def test_literal_query_with_filters(provider):
+    cmd = provider.build_command('kMDItemKind == "PDF"', literal_query=True, max_size=10)
+    assert cmd == ['mdfind', '-0', '-literal', '(kMDItemKind == "PDF") && kMDItemFSSize <= 10']
+
+def test_literal_query_alone(provider):
+    assert provider.build_command('kMDItemKind == "PDF"', literal_query=True) == [
+        'mdfind', '-0', '-literal', 'kMDItemKind == "PDF"'
+    ]
+
+def test_interpret_query(provider):
+    assert provider.build_command('pdfs from last week', interpret_query=True) == [
+        'mdfind', '-0', '-interpret', 'pdfs from last week'
+    ]
+
+@pytest.mark.parametrize('options', [{'interpret_query': True}, {'match_path': True}])
+def test_filters_rejected(provider, options):
+    with pytest.raises(ValueError):
+        provider.build_command('report', min_size=1, **options)
+
+def test_stream_stops_at_max_paths(provider, mdfind):
+    # With -live the fake never exits on its own, so this only returns if the reader kills it
+    start = time.monotonic()
+    returncode, paths, _ = provider._stream_paths(
+        provider.build_command('report', live_updates=True), 5, delimiter=b'\0', timeout=60,
+        is_path=lambda line: line.startswith('/')
+    )
+    assert time.monotonic() - start < 30
+    assert returncode == 0
+    assert paths == [f"/Users/me/Documents/report-{i}.txt" for i in range(5)]
+    assert [json.loads(line) for line in mdfind.read_text().splitlines()] == [
+        ['mdfind', '-0', '-live', '-name', 'report']
+    ]
+
+def test_live_search_skips_progress_messages(provider, mdfind):
+    batch = provider.search_files('report', max_results=5, live_updates=True)
+    assert batch.paths == [f"/Users/me/Documents/report-{i}.txt" for i in range(5)]
+
+def test_stream_reports_failure(provider, mdfind, monkeypatch):
+    monkeypatch.setenv('FAKE_MDFIND_DB', '/nonexistent')
+    returncode, paths, stderr = provider._stream_paths(provider.build_command('report'), 5, delimiter=b'\0')
+    assert returncode != 0
+    assert paths == []
+    assert 'no database' in stderr
+
+class _Recorder:
+    """A provider that records the arguments of each search."""
+
+    def __init__(self):
+        self.searches = []
+
+    def search_files(self, **search) -> ResultBatch:
+        self.searches.append(search)
+        return ResultBatch()
+
+@pytest.mark.anyio
+async def test_mac_params_reach_provider(monkeypatch):
+    monkeypatch.setattr(server_module, 'CURRENT_PLATFORM', 'darwin')
+    recorder = _Recorder()
+    server = server_module.create_server(search_provider=recorder)
+    handler = server.request_handlers[CallToolRequest]
+    await handler(CallToolRequest(
+        method='tools/call',
+        params=CallToolRequestParams(
+            name='search', arguments={
+                'base': {'query': 'report'},
+                'mac_params': json.dumps({'search_directory': '/Users/me', 'min_size': 10})
+            }
+        )
+    ))
+    (search,) = recorder.searches
+    assert search['search_directory'] == '/Users/me'
+    assert search['min_size'] == 10
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
@@ -0,0 +1,75 @@
+"""Tests of locate's regex syntax in the parallel matcher."""
+
+import os
+import re
+
+import pytest
+
+from benchmarks import fake_locate
+from mcp_server_everything_search.matching import posix_to_python
+from mcp_server_everything_search.parallel_match import MatchSpec, ParallelMatcher, SharedCorpus
+from mcp_server_everything_search.search_interface import LinuxSearchProvider
+
+@pytest.mark.parametrize('pattern, extended, path, matched', [
+    (r'\.py$', False, '/src/app.py', True),
+    (r'\.py$', False, '/src/app.pyc', False),
+    ('report+1', False, '/home/report+1.txt', True),
+    ('report+1', False, '/home/reporttt1.txt', False),
+    ('report+1', True, '/home/reporttt1.txt', True),
+    (r'report\+1', False, '/home/reporttt1.txt', True),
+    (r'\(src\|lib\)/a', False, '/lib/a.c', True),
+    ('(src|lib)/a', False, '/(src|lib)/a.c', True),
+    ('(src|lib)/a', True, '/src/a.c', True),
+    (r'x\{2\}', False, '/axxb', True),
+    ('[[:digit:]][[:upper:]]', False, '/a1B', True),
+    ('[[:digit:]][[:upper:]]', False, '/a1b', False),
+    (r'[a\]', False, '/x\\y', True),
+    ('[]x]', False, '/a]', True),
+    ('[^/]*$', False, '/a/b', True),
+    ('a^b$c', False, '/a^b$c', True),
+    ('*.c', False, '/x*.c', True),
+    (r'\<app\>', True, '/src/app.py', True),
+    (r'\<app\>', True, '/src/apps.py', False),
+    (r'\d', False, '/dir', True),
+])
+def test_posix_to_python(pattern, extended, path, matched):
+    assert (re.search(posix_to_python(pattern, extended), path) is not None) == matched
+
+@pytest.mark.parametrize('pattern', ['[[=a=]]', '[[.a.]]', '[[:word:]]', '[abc', 'a\\'])
+def test_untranslatable(pattern):
+    with pytest.raises(ValueError):
+        posix_to_python(pattern)
+
+@pytest.fixture
+def locate_db(tmp_path, monkeypatch):
+    """Put a fake plocate first on PATH, over a database of report files."""
+    fake_locate.install(str(tmp_path / 'bin'), 'plocate')
+    database = tmp_path / 'locate.db'
+    database.write_text(''.join(f"/home/me/report{i}.txt\n" for i in range(30)) + "/home/me/report+1.txt\n")
+    monkeypatch.setenv('PATH', f"{tmp_path / 'bin'}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv('FAKE_LOCATE_DB', str(database))
+    return str(database)
+
+def test_parallel_regex_uses_locate_syntax(locate_db):
+    provider = LinuxSearchProvider(matcher=ParallelMatcher(workers=1))
+    assert provider.locate_type == 'plocate'
+    # In plocate's basic expressions '+' is a literal; as a Python regex this would match 'report1.txt'
+    batch = provider.search_files('report+1', match_regex=True, databases=[locate_db])
+    assert batch.paths == ['/home/me/report+1.txt']
+
+def test_untranslatable_regex_left_to_locate(locate_db):
+    provider = LinuxSearchProvider(matcher=ParallelMatcher(workers=1))
+    assert provider._python_regex('[[=e=]]') is None
+    assert provider._python_regex(r'report\+1') == '(?s)report+1'
+
+def test_small_corpus_matched_in_process():
+    corpus = SharedCorpus.from_paths([f"/data/file{i}" for i in range(100)])
+    matcher = ParallelMatcher(workers=2, min_parallel_bytes=1024 * 1024)
+    try:
+        assert matcher.match(corpus, MatchSpec('file9', match_regex=True), 3) == [
+            '/data/file9', '/data/file90', '/data/file91'
+        ]
+        assert matcher._pool is None
+    finally:
+        matcher.close()
+        corpus.close()
@@ -0,0 +1,57 @@
+"""Tests of the metrics registry and the metrics resource."""
+
+import json
+
+import pytest
+from mcp.types import CallToolRequest, CallToolRequestParams, ReadResourceRequest, ReadResourceRequestParams
+
+from mcp_server_everything_search import server as server_module
+from mcp_server_everything_search.metrics import METRICS_RESOURCE_URI, Metrics
+from mcp_server_everything_search.search_interface import MacSearchProvider
+from mcp_server_everything_search.stat_cache import StatCache
+
+def test_cache_without_lookups_has_no_hit_rate():
+    metrics = Metrics(enabled=True)
+    metrics.increment('stat_cache_hits', 0)
+    metrics.increment('stat_cache_misses', 0)
+    assert metrics.snapshot()['caches'] == {'stat': {'hits': 0, 'misses': 0, 'hit_rate': None}}
+
+def test_cache_hit_rate():
+    metrics = Metrics(enabled=True)
+    metrics.increment('stat_cache_misses', 3)
+    assert metrics.snapshot()['caches']['stat']['hit_rate'] == 0
+    metrics.increment('stat_cache_hits', 1)
+    assert metrics.snapshot()['caches']['stat']['hit_rate'] == 0.25
+
+def test_empty_result_counts_nothing(monkeypatch):
+    metrics = Metrics(enabled=True)
+    monkeypatch.setattr('mcp_server_everything_search.search_interface.METRICS', metrics)
+    MacSearchProvider()._collect_paths([], StatCache(watch=False))
+    assert metrics.snapshot()['counters'] == {}
+
+class _EmptyProvider(MacSearchProvider):
+    """A provider whose searches match nothing."""
+
+    def search_files(self, **search):
+        return self._collect_paths([], StatCache(watch=False))
+
+@pytest.mark.anyio
+async def test_resource_after_empty_search(monkeypatch):
+    metrics = Metrics(enabled=True)
+    monkeypatch.setattr(server_module, 'METRICS', metrics)
+    monkeypatch.setattr('mcp_server_everything_search.search_interface.METRICS', metrics)
+    server = server_module.create_server(search_provider=_EmptyProvider())
+    searched = await server.request_handlers[CallToolRequest](CallToolRequest(
+        method='tools/call', params=CallToolRequestParams(name='search', arguments={'base': 'nothing'})
+    ))
+    assert not searched.root.content[0].text.startswith('Search failed')
+    result = await server.request_handlers[ReadResourceRequest](ReadResourceRequest(
+        method='resources/read', params=ReadResourceRequestParams(uri=METRICS_RESOURCE_URI)
+    ))
+    snapshot = json.loads(result.root.contents[0].text)
+    assert snapshot['enabled']
+    assert snapshot['counters']['results_returned'] == 0
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
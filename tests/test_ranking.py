@@ -0,0 +1,61 @@
+"""Tests of relevance ranking."""
+
+import time
+
+import pytest
+
+from mcp_server_everything_search.ranking import BATCH_SIZE, Ranker, query_needle
+
+@pytest.fixture
+def ranker() -> Ranker:
+    return Ranker('server', penalties={'node_modules': 60.0}, sep='/')
+
+@pytest.mark.parametrize('query, match_regex, needle', [
+    ('*server.py', False, 'server.py'),
+    ('ext:py "report"', False, 'report'),
+    (r'^server_[0-9]+\.py$', True, 'server_'),
+])
+def test_query_needle(query, match_regex, needle):
+    assert query_needle(query, match_regex) == needle
+
+def test_match_kinds_ordered(ranker):
+    paths = [
+        '/a/server/main.py',     # directory match only
+        '/a/myserver.py',        # basename substring
+        '/a/server_utils.py',    # basename prefix
+        '/a/server.py',          # exact name
+    ]
+    assert ranker.top_k(paths, 4) == [3, 2, 1, 0]
+
+def test_depth_and_penalties(ranker):
+    paths = ['/a/b/c/d/server.py', '/node_modules/server.py', '/a/server.py']
+    assert ranker.top_k(paths, 3) == [2, 0, 1]
+
+def test_ties_keep_backend_order(ranker):
+    paths = [f"/d{i}/server.py" for i in range(10)]
+    assert ranker.top_k(paths, 4) == [0, 1, 2, 3]
+
+def test_ties_across_batches(ranker):
+    # A better path in a later batch still enters, while equal ones after the first k do not
+    paths = [f"/d{i}/server.py" for i in range(BATCH_SIZE + 10)] + ['/server.py']
+    assert ranker.top_k(paths, 3) == [len(paths) - 1, 0, 1]
+
+def test_fewer_candidates_than_k(ranker):
+    assert ranker.top_k(['/a/server.py', '/b/other.txt'], 5) == [0, 1]
+
+def test_recency_breaks_ties(ranker):
+    paths = ['/a/server.py', '/b/server.py', '/c/server.py']
+    now = time.time_ns()
+    mtimes = {0: now - 365 * 86400 * 10**9, 1: now, 2: None}
+    asked = []
+
+    def mtime_ns(index):
+        asked.append(index)
+        return mtimes[index]
+
+    assert ranker.top_k(paths, 2, mtime_ns) == [1, 0]
+    assert sorted(asked) == [0, 1, 2]
+
+def test_case_sensitive():
+    ranker = Ranker('Server', match_case=True, penalties={}, sep='/')
+    assert ranker.top_k(['/a/server.py', '/a/Server.py'], 1) == [1]
@@ -0,0 +1,60 @@
+"""Tests of the tree rendering and its byte budget."""
+
+import pytest
+
+from mcp_server_everything_search.rendering import render_tree
+from mcp_server_everything_search.search_interface import ResultBatch
+
+PATHS = (
+    ['/home/me/src/b.py', '/home/me/src/a.py', '/home/me/docs/x.md', '/home/me/src/pkg/c.py']
+    + [f"/home/me/big/f{i:02}.txt" for i in range(20)]
+)
+
+@pytest.fixture
+def results() -> ResultBatch:
+    batch = ResultBatch()
+    for path in PATHS:
+        batch.append(path)
+    return batch
+
+def _size(text: str) -> int:
+    return len(text.encode('utf-8'))
+
+def test_tree_factors_prefixes(results):
+    lines = render_tree(results).splitlines()
+    assert lines[0] == 'Results: 24 in 4 directories'
+    assert lines[1] == '/home/me/'
+    assert lines[-7:] == ['  docs/', '    x.md', '  src/', '    a.py', '    b.py', '    pkg/', '      c.py']
+
+def test_budget_larger_than_tree(results):
+    text = render_tree(results)
+    assert render_tree(results, _size(text)) == text
+
+def test_largest_listing_collapsed_first(results):
+    text = render_tree(results, 150)
+    assert _size(text) <= 150
+    assert '  big/ (20 files)' in text.splitlines()
+    assert 'f00.txt' not in text
+    assert '    x.md' in text.splitlines() and '      c.py' in text.splitlines()
+
+def test_subtrees_collapsed_when_listings_are_not_enough(results):
+    text = render_tree(results, 100)
+    assert _size(text) <= 100
+    assert text.splitlines() == ['Results: 24 in 4 directories', '/home/me/ (24 files in 4 directories)']
+
+def test_budget_below_minimum_keeps_summary(results):
+    assert render_tree(results, 1) == render_tree(results, 100)
+
+def test_budget_counts_bytes():
+    batch = ResultBatch()
+    for i in range(10):
+        batch.append(f"/données/été/rapport-{i}.txt")
+    batch.append('/données/résumé.txt')
+    full = render_tree(batch)
+    # Within the character count but not the byte count of the full tree
+    budget = len(full)
+    assert _size(full) > budget
+    assert _size(render_tree(batch, budget)) <= budget
+
+def test_count_only():
+    assert render_tree(ResultBatch(total=42)) == 'Matches: 42'
@@ -0,0 +1,125 @@
+"""Tests of search classification and scheduling."""
+
+import asyncio
+import threading
+
+import pytest
+
+from mcp_server_everything_search.platform_search import UnifiedSearchQuery, WindowsSpecificParams
+from mcp_server_everything_search.scheduler import CHEAP, HEAVY, NORMAL, Scheduler, SchedulerBusy, classify
+
+@pytest.mark.parametrize('text, priority', [
+    ('report', CHEAP),
+    ('*.py', NORMAL),
+    ('report*.txt', NORMAL),
+    ('a', HEAVY),
+    ('ext:py', NORMAL),
+    ('size:>1gb', NORMAL),
+    ('ext:mp4|mkv|avi size:>1gb', NORMAL),
+    ('report ext:py', CHEAP),
+    ('dm:today *', NORMAL),
+    ('case:Report', CHEAP),
+    ('file:', HEAVY),
+    ('ext:', HEAVY),
+    ('regex:^report', HEAVY),
+    (r'C:\Projects', CHEAP),
+])
+def test_classify_windows(text, priority):
+    assert classify(UnifiedSearchQuery(query=text), 'windows') == priority
+
+def test_colon_is_text_elsewhere():
+    assert classify(UnifiedSearchQuery(query='ext:py'), 'linux') == CHEAP
+
+def test_regex_and_ranked_are_heavy():
+    regex = UnifiedSearchQuery(query='report', windows_params=WindowsSpecificParams(match_regex=True))
+    assert classify(regex, 'windows') == HEAVY
+    assert classify(UnifiedSearchQuery(query='report', rank=True), 'windows') == HEAVY
+
+class _Blocker:
+    """Holds a slot until released, from a worker thread."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.started = threading.Event()
+
+    def __call__(self) -> str:
+        self.started.set()
+        self.event.wait(10)
+        return 'blocker'
+
+async def _occupy(scheduler: Scheduler, blocker: _Blocker) -> asyncio.Task:
+    task = asyncio.ensure_future(scheduler.run('locate', NORMAL, blocker))
+    await asyncio.to_thread(blocker.started.wait, 10)
+    return task
+
+@pytest.mark.anyio
+async def test_waiters_served_by_priority():
+    scheduler = Scheduler(concurrency=1, max_queued=8)
+    blocker = _Blocker()
+    running = await _occupy(scheduler, blocker)
+    order = []
+    waiting = [
+        asyncio.ensure_future(scheduler.run('locate', priority, order.append, name))
+        for priority, name in ((HEAVY, 'heavy'), (NORMAL, 'normal 1'), (CHEAP, 'cheap'), (NORMAL, 'normal 2'))
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.queued('locate') == 4
+    blocker.event.set()
+    await asyncio.gather(running, *waiting)
+    assert order == ['cheap', 'normal 1', 'normal 2', 'heavy']
+    assert not scheduler.busy('locate')
+
+@pytest.mark.anyio
+async def test_full_queue_rejects():
+    scheduler = Scheduler(concurrency=1, max_queued=1)
+    blocker = _Blocker()
+    running = await _occupy(scheduler, blocker)
+    queued = asyncio.ensure_future(scheduler.run('locate', CHEAP, lambda: 'queued'))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerBusy):
+        await scheduler.run('locate', CHEAP, lambda: 'rejected')
+    # Other backends have their own slots and queue
+    assert (await scheduler.run('mdfind', CHEAP, lambda: 'other'))[0] == 'other'
+    blocker.event.set()
+    assert (await queued)[0] == 'queued'
+    await running
+
+@pytest.mark.anyio
+async def test_batch_admission():
+    scheduler = Scheduler(concurrency=1, max_queued=1)
+    # One search starts at once and one can wait
+    scheduler.admit('locate', 2)
+    with pytest.raises(SchedulerBusy):
+        scheduler.admit('locate', 3)
+    blocker = _Blocker()
+    running = await _occupy(scheduler, blocker)
+    queued = asyncio.ensure_future(scheduler.run('locate', CHEAP, lambda: 'queued'))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerBusy):
+        scheduler.admit('locate', 1)
+    # Admitted searches queue beyond the limit
+    admitted = asyncio.ensure_future(scheduler.run('locate', CHEAP, lambda: 'admitted', admitted=True))
+    await asyncio.sleep(0)
+    assert scheduler.queued('locate') == 2
+    blocker.event.set()
+    assert [result for result, _ in await asyncio.gather(queued, admitted)] == ['queued', 'admitted']
+    await running
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_leaves_queue():
+    scheduler = Scheduler(concurrency=1, max_queued=1)
+    blocker = _Blocker()
+    running = await _occupy(scheduler, blocker)
+    waiter = asyncio.ensure_future(scheduler.run('locate', CHEAP, lambda: 'never'))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.queued('locate') == 0
+    blocker.event.set()
+    await running
+    assert not scheduler.busy('locate')
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
@@ -0,0 +1,48 @@
+"""Tests of the status lines ending search responses."""
+
+import pytest
+from mcp.types import CallToolRequest, CallToolRequestParams
+
+from mcp_server_everything_search import server as server_module
+from mcp_server_everything_search.search_interface import MacSearchProvider, ResultBatch
+
+class _EmptyProvider(MacSearchProvider):
+    """A provider whose searches match nothing."""
+
+    def search_files(self, **search) -> ResultBatch:
+        return ResultBatch()
+
+async def _call(server, tool: str, arguments: dict) -> str:
+    result = await server.request_handlers[CallToolRequest](CallToolRequest(
+        method='tools/call', params=CallToolRequestParams(name=tool, arguments=arguments)
+    ))
+    return '\n'.join(item.text for item in result.root.content)
+
+@pytest.fixture
+def linux_server(monkeypatch):
+    monkeypatch.setattr(server_module, 'CURRENT_PLATFORM', 'linux')
+    return server_module.create_server(search_provider=_EmptyProvider())
+
+@pytest.mark.anyio
+async def test_unenforced_staleness_reported(linux_server):
+    text = await _call(linux_server, 'search', {'base': {'query': 'report', 'max_staleness': 60}})
+    assert 'max_staleness not enforced' in text
+
+@pytest.mark.anyio
+async def test_no_staleness_note_without_bound(linux_server):
+    assert 'max_staleness' not in await _call(linux_server, 'search', {'base': 'report'})
+
+@pytest.mark.anyio
+async def test_unenforced_staleness_reported_per_batch_query(linux_server):
+    text = await _call(linux_server, 'search_batch', {'queries': [{'base': {'query': 'a1', 'max_staleness': 0}}, 'b1']})
+    assert text.count('max_staleness not enforced') == 1
+
+@pytest.mark.anyio
+async def test_live_index_has_no_staleness_note(monkeypatch):
+    monkeypatch.setattr(server_module, 'CURRENT_PLATFORM', 'darwin')
+    server = server_module.create_server(search_provider=_EmptyProvider())
+    assert 'max_staleness' not in await _call(server, 'search', {'base': {'query': 'report', 'max_staleness': 60}})
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
@@ -0,0 +1,90 @@
+"""Tests of the slow-query log."""
+
+import json
+import threading
+import time
+
+import pytest
+from mcp.types import CallToolRequest, CallToolRequestParams
+
+from mcp_server_everything_search import server as server_module
+from mcp_server_everything_search.metrics import QueryTrace
+from mcp_server_everything_search.scheduler import Scheduler
+from mcp_server_everything_search.search_interface import MacSearchProvider
+from mcp_server_everything_search.slow_query_log import SlowQueryLog
+
+@pytest.fixture
+def log_path(tmp_path):
+    return tmp_path / 'slow.ndjson'
+
+def _lines(log: SlowQueryLog, path) -> list:
+    log.close()
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+def test_threshold(log_path):
+    log = SlowQueryLog(threshold_ms=100, path=str(log_path))
+    assert not log.record(QueryTrace(query='fast'), 0.05)
+    assert log.record(QueryTrace(query='slow  query'), 0.2)
+    (entry,) = _lines(log, log_path)
+    assert entry['query'] == 'slow query'
+    assert entry['outcome'] == 'ok'
+    assert entry['elapsed_ms'] == 200
+
+def test_failures_logged_whatever_their_duration(log_path):
+    log = SlowQueryLog(threshold_ms=100, path=str(log_path))
+    assert log.record(QueryTrace(query='busy', outcome='rejected', error='queue full'), 0)
+    assert [(entry['outcome'], entry['error']) for entry in _lines(log, log_path)] == [('rejected', 'queue full')]
+
+def test_concurrent_first_records_start_one_writer(log_path, monkeypatch):
+    log = SlowQueryLog(threshold_ms=0, path=str(log_path))
+    create = log._create_logger
+    created = []
+
+    def slow_create():
+        created.append(None)
+        time.sleep(0.05)
+        return create()
+
+    monkeypatch.setattr(log, '_create_logger', slow_create)
+    threads = [threading.Thread(target=log.record, args=(QueryTrace(query=f"q{i}"), 1)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert sorted(entry['query'] for entry in _lines(log, log_path)) == [f"q{i}" for i in range(8)]
+
+class _FailingProvider(MacSearchProvider):
+    def search_files(self, **search):
+        raise RuntimeError("backend gone")
+
+async def _search(server, tool: str, arguments: dict) -> str:
+    result = await server.request_handlers[CallToolRequest](CallToolRequest(
+        method='tools/call', params=CallToolRequestParams(name=tool, arguments=arguments)
+    ))
+    return result.root.content[0].text
+
+@pytest.mark.anyio
+async def test_failed_search_logged(log_path, monkeypatch):
+    log = SlowQueryLog(threshold_ms=60_000, path=str(log_path))
+    monkeypatch.setattr(server_module, 'SLOW_QUERY_LOG', log)
+    server = server_module.create_server(search_provider=_FailingProvider())
+    assert (await _search(server, 'search', {'base': 'report'})).startswith('Search failed')
+    (entry,) = _lines(log, log_path)
+    assert (entry['query'], entry['outcome'], entry['error']) == ('report', 'error', 'backend gone')
+
+@pytest.mark.anyio
+async def test_rejected_batch_logged(log_path, monkeypatch):
+    log = SlowQueryLog(threshold_ms=60_000, path=str(log_path))
+    monkeypatch.setattr(server_module, 'SLOW_QUERY_LOG', log)
+    server = server_module.create_server(
+        search_provider=_FailingProvider(), scheduler=Scheduler(concurrency=1, max_queued=0)
+    )
+    assert (await _search(server, 'search_batch', {'queries': ['a', 'b']})).startswith('Search failed')
+    assert [(entry['query'], entry['outcome']) for entry in _lines(log, log_path)] == [
+        ('a', 'rejected'), ('b', 'rejected')
+    ]
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
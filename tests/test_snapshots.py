@@ -0,0 +1,77 @@
+"""Tests of snapshot diffs and of the change journal."""
+
+from array import array
+
+import pytest
+
+from mcp_server_everything_search.snapshots import ADDED, MODIFIED, REMOVED, ChangeTracker, Snapshot, diff
+
+ROOT = '/srv'
+
+def _snapshot(entries: dict, snapshot_id: int = 1) -> Snapshot:
+    names = sorted(entries)
+    return Snapshot(
+        ROOT, snapshot_id, 0.0, b'\0'.join(name.encode() for name in names), array('q', (entries[n] for n in names))
+    )
+
+def _record(tracker: ChangeTracker, entries: dict, taken_at: float, root: str = ROOT) -> int:
+    names = sorted(entries)
+    paths = b'\0'.join(name.encode() for name in names)
+    return tracker.record(root, paths, array('q', (entries[n] for n in names)), taken_at).snapshot_id
+
+def test_diff():
+    old = _snapshot({'a': 1, 'b': 1, 'c': 1, 'e': 1})
+    new = _snapshot({'b': 2, 'c': 1, 'd': 3, 'f': 4}, 2)
+    assert diff(old, new) == [
+        (REMOVED, '/srv/a', 0), (MODIFIED, '/srv/b', 2), (ADDED, '/srv/d', 3),
+        (REMOVED, '/srv/e', 0), (ADDED, '/srv/f', 4),
+    ]
+
+def test_diff_identical_and_empty():
+    assert diff(_snapshot({'a': 1}), _snapshot({'a': 1}, 2)) == []
+    assert diff(_snapshot({}), _snapshot({'a': 1}, 2)) == [(ADDED, '/srv/a', 1)]
+    assert diff(_snapshot({'a': 1}), _snapshot({}, 2)) == [(REMOVED, '/srv/a', 0)]
+
+def test_changes_since_snapshot_folds():
+    tracker = ChangeTracker()
+    first = _record(tracker, {'keep': 1, 'gone': 1, 'edit': 1}, 10.0)
+    _record(tracker, {'keep': 1, 'edit': 2, 'tmp': 5, 'new': 5}, 20.0)
+    latest = _record(tracker, {'keep': 1, 'edit': 3, 'new': 6, 'gone': 7}, 30.0)
+    changes = tracker.changes_since(snapshot_id=first)
+    # 'tmp' came and went; 'gone' was removed and recreated
+    assert changes.paths == {
+        '/srv/edit': (MODIFIED, 3), '/srv/new': (ADDED, 6), '/srv/gone': (MODIFIED, 7)
+    }
+    assert changes.snapshot_id == latest
+    assert tracker.changes_since(snapshot_id=latest).paths == {}
+
+def test_changes_since_time():
+    tracker = ChangeTracker()
+    _record(tracker, {'a': 1}, 10.0)
+    _record(tracker, {'a': 1, 'b': 15 * 10**9, 'old': 5 * 10**9}, 20.0)
+    # The change set straddles 12.0, so only paths modified from then on, and removals, are kept
+    assert tracker.changes_since(since=12.0).paths == {'/srv/b': (ADDED, 15 * 10**9)}
+    assert tracker.changes_since(since=25.0).paths == {}
+
+def test_changes_since_root_and_partial():
+    tracker = ChangeTracker()
+    first = _record(tracker, {'a': 1}, 10.0)
+    _record(tracker, {'x': 1}, 15.0, root='/other')
+    _record(tracker, {'a': 2}, 20.0)
+    changes = tracker.changes_since(snapshot_id=first, root='/other')
+    assert changes.paths == {}
+    assert changes.partial == {'/other': 15.0}
+    assert tracker.changes_since(snapshot_id=first, root=ROOT).paths == {'/srv/a': (MODIFIED, 2)}
+
+def test_journal_horizon():
+    tracker = ChangeTracker(journal_size=2)
+    first = _record(tracker, {}, 10.0)
+    second = _record(tracker, {'a': 1, 'b': 1}, 20.0)
+    _record(tracker, {'a': 1, 'b': 1, 'c': 1}, 30.0)
+    with pytest.raises(ValueError):
+        tracker.changes_since(snapshot_id=first)
+    assert tracker.changes_since(snapshot_id=second).paths == {'/srv/c': (ADDED, 1)}
+
+def test_exactly_one_point():
+    with pytest.raises(ValueError):
+        ChangeTracker().changes_since()
@@ -0,0 +1,69 @@
+"""Tests of stat cache hits, expiry and inotify invalidation."""
+
+import os
+
+import pytest
+
+from mcp_server_everything_search.stat_cache import MISSING, StatCache
+from mcp_server_everything_search.watchers import inotify_available
+
+@pytest.fixture
+def file(tmp_path):
+    path = tmp_path / 'report.txt'
+    path.write_text('one')
+    return str(path)
+
+def test_hit_after_miss(file):
+    cache = StatCache(watch=False)
+    (row,), hits = cache.lookup([file])
+    assert (row[0], hits) == (3, 0)
+    (again,), hits = cache.lookup([file])
+    assert (again, hits) == (row, 1)
+
+def test_missing_path(tmp_path):
+    (row,), _ = StatCache(watch=False).lookup([str(tmp_path / 'absent')])
+    assert row[4] == MISSING
+
+def test_expired_entry_restated(file):
+    cache = StatCache(ttl=0, watch=False)
+    cache.lookup([file])
+    with open(file, 'a') as f:
+        f.write('two')
+    (row,), hits = cache.lookup([file])
+    assert (row[0], hits) == (6, 0)
+
+@pytest.mark.skipif(not inotify_available(), reason="inotify is not available")
+def test_write_invalidates_watched_entry(file):
+    cache = StatCache(watched_ttl=3600)
+    try:
+        cache.lookup([file])
+        assert cache.watched_dirs == 1
+        with open(file, 'a') as f:
+            f.write('two')
+        (row,), hits = cache.lookup([file])
+        assert (row[0], hits) == (6, 0)
+    finally:
+        cache.close()
+
+@pytest.mark.skipif(not inotify_available(), reason="inotify is not available")
+def test_delete_invalidates_watched_entry(file):
+    cache = StatCache(watched_ttl=3600)
+    try:
+        cache.lookup([file])
+        os.unlink(file)
+        (row,), hits = cache.lookup([file])
+        assert (row[4], hits) == (MISSING, 0)
+    finally:
+        cache.close()
+
+def test_lru_bound(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"f{i}"
+        path.write_text('x')
+        paths.append(str(path))
+    cache = StatCache(max_entries=2, watch=False)
+    cache.lookup(paths)
+    assert len(cache) == 2
+    _, hits = cache.lookup(paths[1:])
+    assert hits == 2
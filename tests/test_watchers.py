@@ -0,0 +1,110 @@
+"""Tests of the inotify watcher's initial walk and watch limit."""
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+from mcp_server_everything_search.subscriptions import SubscriptionManager
+from mcp_server_everything_search.watchers import CREATED, OVERFLOW, InotifyWatcher, inotify_available
+
+pytestmark = pytest.mark.skipif(not inotify_available(), reason="inotify is not available")
+
+@pytest.fixture
+def tree(tmp_path):
+    """A root with five nested directories."""
+    for name in ('a/b', 'c', 'd/e'):
+        (tmp_path / name).mkdir(parents=True)
+    return str(tmp_path)
+
+class _Changes:
+    """Records changes and the threads they were reported on."""
+
+    def __init__(self):
+        self.changes = []
+        self.threads = set()
+
+    def __call__(self, path: str, kind: str) -> None:
+        self.changes.append((path, kind))
+        self.threads.add(threading.current_thread())
+
+@pytest.mark.anyio
+async def test_walk_runs_off_the_event_loop(tree):
+    walked_on = set()
+
+    def prune(path: str) -> bool:
+        walked_on.add(threading.current_thread())
+        return False
+
+    watcher = InotifyWatcher([tree], _Changes(), prune=prune)
+    await watcher.start()
+    try:
+        assert walked_on and threading.current_thread() not in walked_on
+        assert len(watcher._watches) == 6
+    finally:
+        watcher.stop()
+
+@pytest.mark.anyio
+async def test_watch_limit_reported(tree):
+    changes = _Changes()
+    watcher = InotifyWatcher([tree], changes, max_watches=2)
+    await watcher.start()
+    try:
+        # Directories below an unwatched one are not walked, so how many are skipped depends on the order
+        assert watcher.unwatched >= 2
+        assert len(changes.changes) == watcher.unwatched and all(kind == OVERFLOW for _, kind in changes.changes)
+        assert changes.threads == {threading.current_thread()}
+    finally:
+        watcher.stop()
+
+@pytest.mark.anyio
+async def test_events_after_start(tree):
+    changes = _Changes()
+    watcher = InotifyWatcher([tree], changes)
+    await watcher.start()
+    try:
+        path = os.path.join(tree, 'd', 'e', 'new.txt')
+        open(path, 'w').close()
+        for _ in range(100):
+            if (path, CREATED) in changes.changes:
+                break
+            await asyncio.sleep(0.01)
+        assert (path, CREATED) in changes.changes
+    finally:
+        watcher.stop()
+
+@pytest.mark.anyio
+async def test_stop_during_walk(tree):
+    release = threading.Event()
+
+    def prune(path: str) -> bool:
+        release.wait(5)
+        return False
+
+    watcher = InotifyWatcher([tree], _Changes(), prune=prune)
+    starting = asyncio.ensure_future(watcher.start())
+    await asyncio.sleep(0.05)
+    watcher.stop()
+    release.set()
+    await starting
+    assert watcher._fd is None and not watcher._watches
+
+@pytest.mark.anyio
+async def test_failed_start_releases_subscription_slot(tmp_path, monkeypatch):
+    async def fail(self):
+        raise RuntimeError("walk failed")
+
+    monkeypatch.setattr(InotifyWatcher, 'start', fail)
+    manager = SubscriptionManager(max_subscriptions=1)
+
+    async def notify(subscription, paths, more):
+        pass
+
+    with pytest.raises(RuntimeError):
+        await manager.subscribe('report', [str(tmp_path)], notify)
+    assert len(manager) == 0
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'